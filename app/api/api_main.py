@@ -5,8 +5,11 @@
 from app.interfaces.websocket_server import broadcast_message
 from app.core.memory_core import log_message, purge_message_job
 from app.core.muse_initiator import run_thread_summarization
-from app.databases.memory_indexer import build_index, build_memory_index
-from app.api.routers.system_api import config_router, uipolling_router, states_router, time_skip_router
+from app.databases.memory_indexer import build_memory_index, index_write_behind, \
+    update_qdrant_metadata_for_messages
+from app.databases.connection_manager import connections
+from app.databases.qdrant_connector import provision_payload_indexes
+from app.api.routers.system_api import config_router, uipolling_router, states_router, time_skip_router, diagnostics_router
 from app.api.routers.muse_presence_api import profile_router, muse_router
 from app.api.routers.messages_api import router as messages_router
 from app.api.routers.cortex_api import router as cortex_router
@@ -15,9 +18,9 @@
 from app.api.routers.projects_api import router as projects_router
 from app.api.routers.files_api import router as files_router
 from app.api.routers.threads_api import router as threads_router
-from .queues import run_broadcast_queue, run_log_queue, run_index_queue, run_memory_index_queue, run_purge_queue, \
-    broadcast_queue, log_queue, index_queue, index_memory_queue, purge_queue, summarization_queue, \
-    run_summarization_queue
+from .queues import run_broadcast_queue, run_log_queue, run_memory_index_queue, run_purge_queue, \
+    broadcast_queue, log_queue, index_memory_queue, purge_queue, summarization_queue, \
+    run_summarization_queue, run_metadata_queue, metadata_queue
 from app.addon_loader.config import ENABLED_ADDONS
 from app.addon_loader.loader import load_addons
 from app.commands.core_commands import register_core_commands
@@ -42,6 +45,7 @@
 app.include_router(muse_router)
 app.include_router(time_skip_router)
 app.include_router(threads_router)
+app.include_router(diagnostics_router)
 
 app.state.command_registry = command_registry
 print("APP STATE REGISTRY ID:", id(app.state.command_registry))
@@ -66,10 +70,28 @@
 async def startup_event():
     asyncio.create_task(run_broadcast_queue(broadcast_queue, broadcast_message))
     asyncio.create_task(run_log_queue(log_queue, log_message))
-    asyncio.create_task(run_index_queue(index_queue, build_index))
+    # Batched consumer of index_queue
+    index_write_behind.start()
     asyncio.create_task(run_memory_index_queue(index_memory_queue, build_memory_index))
     asyncio.create_task(run_purge_queue(purge_queue, purge_message_job))
     asyncio.create_task(run_summarization_queue(summarization_queue, run_thread_summarization))
+    asyncio.create_task(run_metadata_queue(metadata_queue, update_qdrant_metadata_for_messages))
+    asyncio.create_task(_provision_payload_indexes())
+
+
+async def _provision_payload_indexes():
+    try:
+        created = await asyncio.to_thread(provision_payload_indexes)
+        for collection_name, fields in created.items():
+            if fields:
+                print(f"[Qdrant] Created payload indexes on {collection_name}: {', '.join(fields)}")
+    except Exception as e:
+        print(f"[Qdrant] Payload index provisioning failed: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    connections.close()
 
 
 
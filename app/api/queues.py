@@ -1,13 +1,18 @@
 import asyncio
 from typing import Dict, Any, Callable, Awaitable
 from app.core import utils
+from app.databases.job_queue import DurableJobQueue
 
+# Broadcasts and logging are fire-and-forget and stay in memory
 broadcast_queue = asyncio.Queue()
 log_queue = asyncio.Queue()
-index_queue = asyncio.Queue()
-index_memory_queue = asyncio.Queue()
-purge_queue = asyncio.Queue()
-summarization_queue = asyncio.Queue()
+# Background work survives restarts: jobs live in Mongo until a consumer acks them
+index_queue = DurableJobQueue("index")
+index_memory_queue = DurableJobQueue("index_memory")
+purge_queue = DurableJobQueue("purge")
+summarization_queue = DurableJobQueue("summarization")
+metadata_queue = DurableJobQueue("metadata_sync")
+durable_queues = [index_queue, index_memory_queue, purge_queue, summarization_queue, metadata_queue]
 
 # Typing: adjust as needed for your actual message structure
 Message = Dict[str, Any]
@@ -80,18 +85,21 @@ async def run_log_queue(
             queue.task_done()
 
 async def run_index_queue(
-    queue: asyncio.Queue,
+    queue: DurableJobQueue,
     build_index: Callable[..., Awaitable[None]],
     *,
     logger=None
 ):
     while True:
-        message_id = await queue.get()
+        job = await queue.get()
+        message_id = job.payload
         try:
             await build_index(
                 message_id=message_id,
             )
+            queue.ack(job)
         except Exception as e:
+            outcome = queue.fail(job, e)
             utils.write_system_log(
                 level="error",
                 module="api",
@@ -99,25 +107,27 @@ async def run_index_queue(
                 function="run_index_queue",
                 action="index_failed",
                 error=str(e),
-                message_id=str(message_id)
+                message_id=str(message_id),
+                attempt=job.attempts,
+                outcome=outcome
             )
-            # Optionally: re-queue or alert
-        finally:
-            queue.task_done()
 
 async def run_memory_index_queue(
-    queue: asyncio.Queue,
+    queue: DurableJobQueue,
     build_memory_index: Callable[..., Awaitable[None]],
     *,
     logger=None
 ):
     while True:
-        entry_id = await queue.get()
+        job = await queue.get()
+        entry_id = job.payload
         try:
             await build_memory_index(
                 entry_id=entry_id,
             )
+            queue.ack(job)
         except Exception as e:
+            outcome = queue.fail(job, e)
             utils.write_system_log(
                 level="error",
                 module="api",
@@ -125,25 +135,27 @@ async def run_memory_index_queue(
                 function="run_memory_index_queue",
                 action="index_failed",
                 error=str(e),
-                entry_id=str(entry_id)
+                entry_id=str(entry_id),
+                attempt=job.attempts,
+                outcome=outcome
             )
-            # Optionally: re-queue or alert
-        finally:
-            queue.task_done()
 
 async def run_purge_queue(
-    queue: asyncio.Queue,
+    queue: DurableJobQueue,
     purge_message_job: Callable[..., Awaitable[None]],
     *,
     logger=None
 ):
     while True:
-        message_id = await queue.get()
+        job = await queue.get()
+        message_id = job.payload
         try:
             await purge_message_job(
                 message_id=message_id,
             )
+            queue.ack(job)
         except Exception as e:
+            outcome = queue.fail(job, e)
             utils.write_system_log(
                 level="error",
                 module="api",
@@ -151,24 +163,27 @@ async def run_purge_queue(
                 function="run_purge_queue",
                 action="purge_failed",
                 error=str(e),
-                message_id=str(message_id)
+                message_id=str(message_id),
+                attempt=job.attempts,
+                outcome=outcome
             )
-        finally:
-            queue.task_done()
 
 async def run_summarization_queue(
-    queue: asyncio.Queue,
+    queue: DurableJobQueue,
     run_thread_summarization: Callable[..., Awaitable[None]],
     *,
     logger=None
 ):
     while True:
-        thread_id = await queue.get()
+        job = await queue.get()
+        thread_id = job.payload
         try:
             await run_thread_summarization(
                 thread_id=thread_id,
             )
+            queue.ack(job)
         except Exception as e:
+            outcome = queue.fail(job, e)
             utils.write_system_log(
                 level="error",
                 module="api",
@@ -176,7 +191,37 @@ async def run_summarization_queue(
                 function="run_summarization_queue",
                 action="summarization_failed",
                 error=str(e),
-                thread_id=str(thread_id)
+                thread_id=str(thread_id),
+                attempt=job.attempts,
+                outcome=outcome
+            )
+
+async def run_metadata_queue(
+    queue: DurableJobQueue,
+    update_qdrant_metadata_for_messages: Callable[..., Awaitable[int]],
+    *,
+    logger=None
+):
+    while True:
+        job = await queue.get()
+        message_ids = job.payload.get("message_ids", [])
+        try:
+            updated = await update_qdrant_metadata_for_messages(
+                message_ids,
+                progress=lambda done, total: queue.report_progress(job, done=done, total=total),
+            )
+            queue.report_progress(job, done=len(message_ids), total=len(message_ids), updated=updated)
+            queue.ack(job)
+        except Exception as e:
+            outcome = queue.fail(job, e)
+            utils.write_system_log(
+                level="error",
+                module="api",
+                component="queues",
+                function="run_metadata_queue",
+                action="metadata_sync_failed",
+                error=str(e),
+                message_count=len(message_ids),
+                attempt=job.attempts,
+                outcome=outcome
             )
-        finally:
-            queue.task_done()
\ No newline at end of file
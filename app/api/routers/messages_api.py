@@ -5,11 +5,11 @@
 from dateutil.parser import parse
 from typing import Any
 from bson import ObjectId
+from bson.errors import InvalidId
 from app.core.utils import strip_muse_thoughts, serialize_doc, strip_gm_notes
 from app.databases.mongo_connector import mongo, mongo_system
-from app.databases.memory_indexer import update_qdrant_metadata_for_messages
 from app.config import muse_settings, MONGO_CONVERSATION_COLLECTION, MONGO_STATES_COLLECTION
-from app.api.queues import index_queue, log_queue, purge_queue
+from app.api.queues import index_queue, log_queue, purge_queue, metadata_queue
 from app.core.memory_core import get_excluded_thread_ids, purge_message
 
 
@@ -256,8 +256,8 @@ async def purge_messages(payload: dict = Body(...)) -> dict:
             {"message_id": mid},              # match this one id
             {"$set": {"purge_queued": True}}  # use $set operator
         )
-        ok = await purge_queue.put(mid)
-        results.append({"message_id": mid, "purged": ok})
+        job_id = await purge_queue.put(mid)
+        results.append({"message_id": mid, "purge_job": job_id})
     return {"results": results}
 
 @router.get("/sources")
@@ -406,12 +406,23 @@ async def tag_message(
         {"message_id": {"$in": message_ids}},
         mongo_update
     )
-    # Metadata-only Qdrant update: no re-embedding
-    await update_qdrant_metadata_for_messages(message_ids)
+    # Metadata-only Qdrant update: no re-embedding. Runs in the background;
+    # poll /api/messages/tag/status/{job_id} for progress
+    job_id = await metadata_queue.put({"message_ids": message_ids})
 
     #for message_id in message_ids:
     #    await index_queue.put(message_id)
-    return {"updated": result.modified_count}
+    return {"updated": result.modified_count, "metadata_sync_job": str(job_id) if job_id else None}
+
+@router.get("/tag/status/{job_id}")
+def tag_sync_status(job_id: str):
+    try:
+        status = metadata_queue.job_status(job_id)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail=f"Invalid job id: {job_id}")
+    if status is None:
+        raise HTTPException(status_code=404, detail="Metadata sync job not found")
+    return status
 
 @router.get("/user_tags")
 def get_user_tags(
@@ -4,6 +4,7 @@
 from bson import ObjectId
 from app.config import MONGO_FILES_COLLECTION, MONGO_PROJECTS_COLLECTION, MONGO_MEMORY_COLLECTION, MONGO_CONVERSATION_COLLECTION
 from app.core import projects_core
+from app.core.memory_core import bump_exclusions_version
 from app.core.files_core import modify_file_project_link_core
 from app.core.utils import serialize_doc, ensure_list
 from app.api.queues import index_queue
@@ -99,6 +100,7 @@ def create_project():
 def toggle_project_visibility(key: str):
     try:
         result = projects_core.toggle_visibility({"_id": key})
+        bump_exclusions_version()
         return {"status": "ok", "key": key, "is_hidden": result.is_hidden}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -107,6 +109,7 @@ def toggle_project_visibility(key: str):
 def toggle_project_privacy(key: str):
     try:
         result = projects_core.toggle_privacy({"_id": key})
+        bump_exclusions_version()
         return {"status": "ok", "key": key, "is_private": result.is_private}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -115,6 +118,7 @@ def toggle_project_privacy(key: str):
 def toggle_project_archived(key: str):
     try:
         result = projects_core.toggle_archived({"_id": key})
+        bump_exclusions_version()
         return {"status": "ok", "key": key, "archived": result.archived}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -5,6 +5,12 @@
 from app.core.utils import serialize_doc
 from app.config import muse_config, muse_settings, admin_config
 from app.core.muse_profile import muse_profile
+from app.databases.qdrant_connector import get_query_vector_cache_stats, recent_vectors
+from app.services.embeddings import embedding_batcher
+from app.databases.connection_manager import connections
+from app.core.memory_core import search_latency, search_result_cache
+from app.api.queues import durable_queues
+from app.databases.memory_indexer import index_write_behind
 from app.core.states_core import (
     set_project_states,
     extract_pollable_states,
@@ -234,3 +240,55 @@ async def set_time_skip(message_id: str):
 
 # </editor-fold>
 
+# --------------------------
+# /api/diagnostics
+# --------------------------
+# <editor-fold desc="diagnostics">
+diagnostics_router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
+
+
+@diagnostics_router.get("/embeddings")
+def get_embedding_diagnostics():
+    return {
+        "query_vector_cache": get_query_vector_cache_stats(),
+        "recent_vectors": recent_vectors.stats(),
+        "batcher": dict(embedding_batcher.stats),
+    }
+
+
+@diagnostics_router.get("/search")
+def get_search_diagnostics():
+    return {
+        "collection_latency": search_latency.snapshot(),
+        "result_cache": search_result_cache.stats(),
+    }
+
+
+@diagnostics_router.get("/indexing")
+def get_indexing_diagnostics():
+    return {"write_behind": index_write_behind.snapshot()}
+
+
+@diagnostics_router.get("/queues")
+def get_queue_diagnostics():
+    return {"queues": [q.stats() for q in durable_queues]}
+
+
+@diagnostics_router.post("/queues/{queue_name}/requeue-dead")
+def requeue_dead_jobs(queue_name: str, job_id: str | None = None):
+    for q in durable_queues:
+        if q.name == queue_name:
+            return {"queue": queue_name, "requeued": q.requeue_dead(job_id)}
+    raise HTTPException(status_code=404, detail=f"Unknown queue: {queue_name}")
+
+
+@diagnostics_router.get("/connections")
+def get_connection_diagnostics():
+    health = connections.health_check()
+    return {
+        "healthy": all(h["ok"] for h in health.values()),
+        "health": health,
+        "pools": connections.stats(),
+    }
+
+# </editor-fold>
@@ -4,6 +4,7 @@
 from typing import Dict
 import httpx
 from app.core import threads_core
+from app.core.memory_core import bump_exclusions_version
 from app.config import API_URL
 from app.databases.mongo_connector import mongo
 from app.config import MONGO_MEMORY_COLLECTION
@@ -60,6 +61,8 @@ def edit_thread(key: str, patch_fields: dict):
     try:
         print("PATCH fields received:", patch_fields)
         result = threads_core.edit_thread_fields({"thread_id": key}, patch_fields)
+        if "is_hidden" in patch_fields or "is_private" in patch_fields:
+            bump_exclusions_version()
         return {"status": "ok", "key": key, "thread": result}
     except ValueError as e:
         # Bad input or not found
@@ -87,6 +90,7 @@ async def delete_thread_only(thread_id: str) -> Dict:
 
     # Finally, delete the thread doc itself
     res = threads_core.delete_thread(thread_id)
+    bump_exclusions_version()
 
     return {
         "thread_deleted": res.deleted_count,
@@ -113,6 +117,7 @@ async def delete_thread_and_messages(thread_id: str) -> Dict:
             )
 
     res = threads_core.delete_thread(thread_id)
+    bump_exclusions_version()
 
     return {
         "thread_deleted": res.deleted_count,
@@ -2,7 +2,7 @@
 import os
 import json
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from app.databases.connection_manager import connections
 
 
 # Determine project root
@@ -34,6 +34,14 @@
 MONGO_STATES_COLLECTION = os.getenv("MONGO_STATES_COLLECTION")
 MONGO_LOGS_COLLECTION = os.getenv("MONGO_LOGS_COLLECTION")
 MONGO_USER_SETTINGS_COLLECTION = os.getenv("MONGO_USER_SETTINGS_COLLECTION")
+MONGO_JOBS_COLLECTION = os.getenv("MONGO_JOBS_COLLECTION", "muse_jobs")
+# Durable background job queue (app/databases/job_queue.py)
+JOB_QUEUE_LEASE_SECONDS = float(os.getenv("JOB_QUEUE_LEASE_SECONDS", "300"))
+JOB_QUEUE_MAX_ATTEMPTS = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "5"))
+JOB_QUEUE_BACKOFF_BASE_SECONDS = float(os.getenv("JOB_QUEUE_BACKOFF_BASE_SECONDS", "5"))
+JOB_QUEUE_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_QUEUE_BACKOFF_MAX_SECONDS", "600"))
+JOB_QUEUE_POLL_SECONDS = float(os.getenv("JOB_QUEUE_POLL_SECONDS", "1"))
+JOB_QUEUE_RETENTION_DAYS = float(os.getenv("JOB_QUEUE_RETENTION_DAYS", "7"))
 
 ADMIN_MONGO_URI = os.getenv("ADMIN_MONGO_URI")
 ADMIN_MONGO_DB = os.getenv("ADMIN_MONGO_DB")
@@ -45,19 +53,88 @@
 QDRANT_MEMORY_COLLECTION = os.getenv("QDRANT_MEMORY_COLLECTION")
 QDRANT_ENTITY_COLLECTION = os.getenv("QDRANT_ENTITY_COLLECTION")
 QDRANT_JOURNAL_COLLECTION = os.getenv("QDRANT_JOURNAL_COLLECTION")
+# Storage/quantization profile per collection (see qdrant_connector.COLLECTION_PROFILES)
+QDRANT_CONVERSATION_PROFILE = os.getenv("QDRANT_CONVERSATION_PROFILE", "scalar_ondisk")
+QDRANT_MEMORY_PROFILE = os.getenv("QDRANT_MEMORY_PROFILE", "scalar")
+QDRANT_ENTITY_PROFILE = os.getenv("QDRANT_ENTITY_PROFILE", "scalar")
+QDRANT_JOURNAL_PROFILE = os.getenv("QDRANT_JOURNAL_PROFILE", "scalar")
 
 GRAPHDB_HOST = os.getenv("GRAPHDB_HOST")
 GRAPHDB_PORT = os.getenv("GRAPHDB_PORT")
 
+# Shared connection pools (see app/databases/connection_manager.py)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS")) if os.getenv("MONGO_SOCKET_TIMEOUT_MS") else None
+# How often the driver checks server health in the background
+MONGO_HEARTBEAT_FREQUENCY_MS = int(os.getenv("MONGO_HEARTBEAT_FREQUENCY_MS", "10000"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE")) if os.getenv("QDRANT_POOL_SIZE") else None
+
+connections.configure(
+    mongo_uri=MONGO_URI,
+    mongo_max_pool_size=MONGO_MAX_POOL_SIZE,
+    mongo_min_pool_size=MONGO_MIN_POOL_SIZE,
+    mongo_connect_timeout_ms=MONGO_CONNECT_TIMEOUT_MS,
+    mongo_server_selection_timeout_ms=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    mongo_socket_timeout_ms=MONGO_SOCKET_TIMEOUT_MS,
+    mongo_heartbeat_frequency_ms=MONGO_HEARTBEAT_FREQUENCY_MS,
+    qdrant_host=QDRANT_HOST,
+    qdrant_port=QDRANT_PORT,
+    qdrant_timeout=QDRANT_TIMEOUT,
+    qdrant_pool_size=QDRANT_POOL_SIZE,
+    graphdb_host=GRAPHDB_HOST,
+    graphdb_port=GRAPHDB_PORT,
+)
+
 SENTENCE_TRANSFORMER_ENTITY_MODEL = os.getenv("SENTENCE_TRANSFORMER_ENTITY_MODEL")
 SENTENCE_TRANSFORMER_MODEL = os.getenv("SENTENCE_TRANSFORMER_MODEL")
+# Embedding backend: "torch" (default) or "onnx-int8" (int8 dynamic-quantized ONNX via onnxruntime, CPU only)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", str(PROJECT_ROOT / "models" / "onnx"))
+EMBEDDING_ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")  # arm64 | avx2 | avx512 | avx512_vnni
+# Models load from the local HF cache first; set true to never download one (offline hosts)
+EMBEDDING_LOCAL_FILES_ONLY = os.getenv("EMBEDDING_LOCAL_FILES_ONLY", "false").lower() in ("1", "true", "yes")
+# Shared embedding sidecar (unset = encode in-process)
+EMBEDDING_SIDECAR_SOCKET = os.getenv("EMBEDDING_SIDECAR_SOCKET")
+EMBEDDING_SIDECAR_TIMEOUT = float(os.getenv("EMBEDDING_SIDECAR_TIMEOUT", "30"))
+# Embedding micro-batching: flush after this many requests or this many ms, whichever comes first
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+# Query-vector LRU cache in qdrant_connector.search_collection
+QUERY_VECTOR_CACHE_SIZE = int(os.getenv("QUERY_VECTOR_CACHE_SIZE", "256"))
+QUERY_VECTOR_CACHE_TTL_SECONDS = float(os.getenv("QUERY_VECTOR_CACHE_TTL_SECONDS", "600"))
+# Hybrid (BM25 sparse + dense) search on the conversation collection, fused with RRF in Qdrant
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() in ("1", "true", "yes")
+HYBRID_OVERFETCH = int(os.getenv("HYBRID_OVERFETCH", "3"))  # candidates per result (dense-only uses 5)
+# Rank dense search_indexed_memory candidates in Qdrant with a formula query (needs Qdrant >= 1.14 and a
+# collection marked by migrate_qdrant_timestamps.py; hybrid and unmarked collections rescore client-side)
+QDRANT_FORMULA_SCORING = os.getenv("QDRANT_FORMULA_SCORING", "true").lower() in ("1", "true", "yes")
+SPARSE_BM25_K1 = float(os.getenv("SPARSE_BM25_K1", "1.2"))
+SPARSE_BM25_B = float(os.getenv("SPARSE_BM25_B", "0.75"))
+SPARSE_BM25_AVG_DOC_LEN = float(os.getenv("SPARSE_BM25_AVG_DOC_LEN", "60"))
+# search_indexed_memory result cache; any index write (build_index, metadata sync, purge) invalidates it
+SEARCH_RESULT_CACHE_SIZE = int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "256"))
+SEARCH_RESULT_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_RESULT_CACHE_TTL_SECONDS", "120"))
+# Ring buffer of recently indexed message vectors (episode detection reads it instead of Qdrant)
+RECENT_VECTOR_CACHE_SIZE = int(os.getenv("RECENT_VECTOR_CACHE_SIZE", "512"))
+# Content-addressed on-disk vector store (model name + sha256 of embedded text)
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", str(PROJECT_ROOT / "memory" / "embeddings"))
+# Write-behind indexing of logged messages: index after this many ids or this many ms, whichever comes first
+INDEX_WRITE_BEHIND_MAX_BATCH = int(os.getenv("INDEX_WRITE_BEHIND_MAX_BATCH", "64"))
+INDEX_WRITE_BEHIND_MAX_WAIT_MS = float(os.getenv("INDEX_WRITE_BEHIND_MAX_WAIT_MS", "200"))
+# Change-stream sync daemon (run_change_sync.py): apply after this many events or this many ms
+CHANGE_SYNC_MAX_BATCH = int(os.getenv("CHANGE_SYNC_MAX_BATCH", "128"))
+CHANGE_SYNC_MAX_WAIT_MS = float(os.getenv("CHANGE_SYNC_MAX_WAIT_MS", "500"))
 # Temporary until journal overhaul
 JOURNAL_CATALOG_PATH = os.getenv("JOURNAL_CATALOG_PATH")
 JOURNAL_DIR = os.getenv("JOURNAL_DIR")
 
 class MuseConfig:
     def __init__(self, mongo_uri, db_name, live_collection, default_collection):
-        self.client = MongoClient(mongo_uri)
+        self.client = connections.mongo(mongo_uri)
         self.live = self.client[db_name][live_collection]
         self.defaults = self.client[db_name][default_collection]
 
@@ -202,7 +279,7 @@ def as_grouped(self, include_meta=True):
 
 class AdminConfig:
     def __init__(self, mongo_uri, db_name, collection, doc_id="instance_configs"):
-        client = MongoClient(mongo_uri)
+        client = connections.mongo(mongo_uri)
         self.collection = client[db_name][collection]
         self.doc_id = doc_id
 
@@ -233,7 +310,7 @@ def set(self, section, key, value):
 
 class MuseSettings:
     def __init__(self, mongo_uri, db_name, collection, doc_id="user_settings"):
-        client = MongoClient(mongo_uri)
+        client = connections.mongo(mongo_uri)
         self.collection = client[db_name][collection]
         self.doc_id = doc_id
 
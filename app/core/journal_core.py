@@ -1,8 +1,8 @@
 import os
 import json
-from sentence_transformers import SentenceTransformer
 from app.config import muse_settings, QDRANT_JOURNAL_COLLECTION, SENTENCE_TRANSFORMER_MODEL, JOURNAL_DIR, JOURNAL_CATALOG_PATH
 from app.databases import qdrant_connector
+from app.services.embeddings import encode_stored
 from app.core import utils
 from app.core.time_location_utils import get_formatted_datetime
 
@@ -12,14 +12,12 @@
 
 
 def search_journal(query_vector, top_k=5):
-    client = qdrant_connector.get_qdrant_client()
-    results = client.search(
+    return qdrant_connector.search_collection(
         collection_name=QDRANT_JOURNAL_COLLECTION,
         query_vector=query_vector,
         limit=top_k,
         with_payload=True
     )
-    return results
 
 
 # ----------------------
@@ -54,7 +52,7 @@ def save_journal_catalog(entries):
 # ----------------------
 
 def search_indexed_journal(query, top_k=5, include_private=False):
-    query_vector = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL).encode(query).tolist()
+    query_vector = qdrant_connector.get_query_vector(query).tolist()
     results = []
 
     qdrant_results = search_journal(query_vector, top_k=top_k)
@@ -122,8 +120,11 @@ def create_journal_entry(title, body, mood="reflective", tags=None, entry_type="
 
     # Chunk, embed, index (private and public both included)
     paragraphs = [p for p in body.split("\n\n") if p.strip()]
-    for i, paragraph in enumerate(paragraphs):
-        vector = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL).encode(paragraph).tolist()
+    if not paragraphs:
+        return
+    vectors = encode_stored(paragraphs, model_name=SENTENCE_TRANSFORMER_MODEL)
+    for i, (paragraph, vector) in enumerate(zip(paragraphs, vectors)):
+        vector = vector.tolist()
         metadata = {
             "entry_id": filename,
             "paragraph_index": i,
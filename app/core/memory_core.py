@@ -3,23 +3,35 @@
 import time
 import asyncio
 import re
+import sys
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from dateutil.parser import parse as parse_datetime
 from bson import ObjectId
 from bson.errors import InvalidId
-from sentence_transformers import SentenceTransformer, util
+from qdrant_client.http.exceptions import UnexpectedResponse
+import numpy as np
 from app import config
 from app.config import muse_config, MONGO_URI, MONGO_DB, MONGO_CONVERSATION_COLLECTION, MONGO_PROJECTS_COLLECTION, \
-    MONGO_THREADS_COLLECTION, MONGO_MEMORY_COLLECTION, QDRANT_CONVERSATION_COLLECTION, QDRANT_MEMORY_COLLECTION, SENTENCE_TRANSFORMER_MODEL
+    MONGO_THREADS_COLLECTION, MONGO_MEMORY_COLLECTION, QDRANT_CONVERSATION_COLLECTION, QDRANT_MEMORY_COLLECTION
 from app.core.utils import write_system_log, SOURCES_CHAT, SOURCES_CONTEXT, SOURCES_ALL
 from app.core import utils
 from app.databases.mongo_connector import mongo, mongo_system
+from app.databases.connection_manager import connections
+from app.databases.cache_versions import exclusions_version, index_generation
 from app.services.openai_client import get_openai_autotags
 from app.databases import memory_indexer
 from app.api.queues import index_memory_queue
-from app.databases.qdrant_connector import delete_point, search_collection, delete_qdrant_message
+from app.databases.qdrant_connector import delete_point, search_collection, delete_qdrant_message, \
+    timestamp_range_condition, collection_model, get_query_vector, has_sparse_vectors, get_message_vectors, \
+    supports_formula_queries, timestamps_backfilled
 from app.databases.graphdb_connector import get_graphdb_connector as graphdb
 from app.core.states_core import get_active_time_skip_window
+from app.core.rescoring import rescore_hits, build_score_formula, exclusion_conditions, hit_entry
 
 # </editor-fold>
 
@@ -28,7 +40,6 @@
 # --------------------------
 # <editor-fold desc="🗂 Directory Setup & Constants">
 VALID_ROLES = {"user", "muse", "friend"}
-model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
 
 
 # </editor-fold>
@@ -109,7 +120,8 @@ async def log_message(
 
         mongo.insert_log(MONGO_CONVERSATION_COLLECTION, log_entry)
         if not skip_index:
-            await memory_indexer.build_index(message_id=log_entry["message_id"])
+            # Indexed in the background, batched with other fresh messages
+            memory_indexer.index_write_behind.enqueue(log_entry["message_id"])
     except Exception as e:
         write_system_log(
             level="error",
@@ -157,6 +169,59 @@ def get_message_by_id(message_id: str):
         {"message_id": message_id},
     )
 
+# Fields recall paths need to format a message (see utils.format_context_entry)
+CONTEXT_ENTRY_PROJECTION = {
+    "_id": 1,
+    "message_id": 1,
+    "timestamp": 1,
+    "role": 1,
+    "source": 1,
+    "message": 1,
+    "metadata": 1,
+    "user_tags": 1,
+    "muse_tags": 1,
+    "remembered": 1,
+    "project_id": 1,
+    "project_ids": 1,
+    "thread_ids": 1,
+    "is_hidden": 1,
+    "is_deleted": 1,
+}
+
+def hydrate_messages(message_ids, projection=CONTEXT_ENTRY_PROJECTION) -> list:
+    """
+    Fetch the conversation docs for `message_ids` with one $in query,
+    in the order the ids were given (duplicates collapsed, missing ids
+    dropped). Every doc carries its _id.
+    """
+    ordered = list(dict.fromkeys(mid for mid in message_ids if mid))
+    if not ordered:
+        return []
+    projection = {**projection, "_id": 1, "message_id": 1} if projection else None
+    docs = mongo.find_documents(
+        collection_name=MONGO_CONVERSATION_COLLECTION,
+        query={"message_id": {"$in": ordered}},
+        projection=projection,
+    )
+    by_id = {doc["message_id"]: doc for doc in docs}
+    return [by_id[mid] for mid in ordered if mid in by_id]
+
+def hydrate_hits(hits, projection=CONTEXT_ENTRY_PROJECTION, keep_missing: bool = False) -> list:
+    """
+    Merge the Mongo doc into each ranked search hit (Mongo fields win over
+    the Qdrant payload copy), keeping the hit order. Hits whose message is
+    gone from Mongo are dropped unless keep_missing.
+    """
+    docs = {d["message_id"]: d for d in hydrate_messages([h.get("message_id") for h in hits], projection)}
+    hydrated = []
+    for hit in hits:
+        doc = docs.get(hit.get("message_id"))
+        if doc is not None:
+            hydrated.append({**hit, **doc})
+        elif keep_missing:
+            hydrated.append(hit)
+    return hydrated
+
 def purge_message(message_id: str) -> bool:
     """
     Hard-delete a single message from Qdrant, Memgraph, and Mongo.
@@ -201,7 +266,47 @@ async def purge_message_job(message_id: str) -> None:
 # Memory Vector Indexing
 # --------------------------
 # <editor-fold desc="📚 Memory Vector Indexing">
-def get_excluded_project_ids(public: bool = False) -> set:
+# Hidden/private project and thread ids change rarely but are read several
+# times per chat turn, so they are cached per process behind a shared
+# version counter (see cache_versions). projects_api/threads_api bump it on
+# every visibility change.
+_exclusions_cache: dict = {}
+
+
+def get_exclusions_version(refresh: bool = False) -> int:
+    return exclusions_version.get(refresh)
+
+
+def bump_exclusions_version() -> int:
+    """
+    Call after any change to a project's or thread's is_hidden/is_private
+    (or its deletion). Every process recomputes its excluded sets on the
+    next read.
+    """
+    return exclusions_version.bump()
+
+
+def _cached_exclusions(kind: str, public: bool, load) -> frozenset:
+    # Read the version before loading, so a bump that lands mid-load
+    # leaves the entry stale rather than wrongly current
+    version = get_exclusions_version()
+    cached = _exclusions_cache.get((kind, public))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    ids = frozenset(load(public))
+    _exclusions_cache[(kind, public)] = (version, ids)
+    return ids
+
+
+def get_excluded_project_ids(public: bool = False) -> frozenset:
+    return _cached_exclusions("projects", public, _load_excluded_project_ids)
+
+
+def get_excluded_thread_ids(public: bool = False) -> frozenset:
+    return _cached_exclusions("threads", public, _load_excluded_thread_ids)
+
+
+def _load_excluded_project_ids(public: bool = False) -> set:
     query = {"is_hidden": True}
 
     if public:
@@ -221,7 +326,7 @@ def get_excluded_project_ids(public: bool = False) -> set:
     )
     return {p["_id"] for p in projects}
 
-def get_excluded_thread_ids(public: bool = False) -> set:
+def _load_excluded_thread_ids(public: bool = False) -> set:
     query = {"is_hidden": True}
 
     if public:
@@ -493,37 +598,95 @@ def build_time_clause(now_value):
     selected.reverse()
     return selected
 
-def recency_weight(ts, now=None, half_life_hours=36):
-    if not ts:
-        return 1.0
-    if half_life_hours is None or half_life_hours <= 0:
-        return 1.0
-    if now is None:
-        now = datetime.now(timezone.utc).timestamp()
-
-    if isinstance(ts, datetime):
-        ts = ts.timestamp()
-    elif isinstance(ts, str):
-        try:
-            ts = datetime.fromisoformat(ts)
-            ts = ts.timestamp()
-        except Exception:
-            return 1.0
-
-    age_hours = (now - ts) / 3600
-    return 2 ** (-age_hours / half_life_hours)
-
-def tag_weight(payload, tag_boost=1.2, muse_boost=1.15, remembered_boost=2.0, project_boost=1.25):
-    score = 1.0
-    if payload.get("user_tags"):
-        score *= tag_boost
-    if payload.get("muse_tags"):
-        score *= muse_boost
-    if payload.get("remembered"):
-        score *= remembered_boost
-    if payload.get("project_id"):  # Any non-empty project_id
-        score *= project_boost
-    return score
+_formula_scoring = {"enabled": config.QDRANT_FORMULA_SCORING}
+
+
+class SearchResultCache:
+    """
+    LRU of search_indexed_memory results, keyed by the query vector's hash
+    plus every argument that shapes the ranking. An entry is only served
+    while the index generation it was computed under is still current, and
+    for at most ttl_seconds (recency weights drift with the clock).
+    Results are copied in and out, so callers may mutate what they get.
+    """
+
+    def __init__(self, max_size=config.SEARCH_RESULT_CACHE_SIZE, ttl_seconds=config.SEARCH_RESULT_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query_vector, **params) -> str:
+        digest = hashlib.sha256(np.asarray(query_vector, dtype=np.float32).tobytes())
+        digest.update(json.dumps(params, sort_keys=True, default=_cache_key_default).encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _size_of(results) -> int:
+        size = sys.getsizeof(results)
+        for entry in results:
+            size += sys.getsizeof(entry) + sum(sys.getsizeof(v) for v in entry.values())
+        return size
+
+    def get(self, key, generation: int):
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                results, entry_generation, stored_at, size = item
+                if entry_generation == generation and now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return [dict(e) for e in results]
+                del self._entries[key]
+                self._bytes -= size
+            self.misses += 1
+            return None
+
+    def put(self, key, generation: int, results):
+        if self.max_size <= 0:
+            return
+        results = [dict(e) for e in results]
+        size = self._size_of(results)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[3]
+            self._entries[key] = (results, generation, time.monotonic(), size)
+            self._bytes += size
+            while len(self._entries) > self.max_size:
+                self._bytes -= self._entries.popitem(last=False)[1][3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "approx_bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "index_generation": index_generation.get(),
+        }
+
+
+def _cache_key_default(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(str(v) for v in value)
+    return str(value)
+
+
+search_result_cache = SearchResultCache()
 
 def search_indexed_memory(
     query,
@@ -545,19 +708,55 @@ def search_indexed_memory(
     public: bool = False,
     start_time=None,
     end_time=None,
+    query_vector=None,
+    excluded_ids=None,
+    hybrid=config.HYBRID_SEARCH_ENABLED,
+    use_cache=True,
 ):
     """
     Search indexed memory via Qdrant, with Project Focus support.
+    query_vector and excluded_ids ((project_ids, thread_ids)) let a caller
+    searching several collections embed and read exclusions once.
+    Collections with BM25 sparse vectors are searched hybrid (dense + sparse,
+    RRF-fused), which needs a smaller overfetch for the same recall.
+    Identical requests are answered from search_result_cache until the
+    index changes.
     """
     if projects_in_focus is None:
         projects_in_focus = []
-    #query_vector = model.encode([query])[0]
-    overfetch_k = top_k * 5
+    if query_vector is None:
+        query_vector = get_query_vector(query, model_name=collection_model(collection_name))
+    hybrid = hybrid and has_sparse_vectors(collection_name)
+    overfetch_k = top_k * (config.HYBRID_OVERFETCH if hybrid else 5)
 
     QDRANT_COLLECTION = collection_name
 
-    excluded_project_ids = [str(oid) for oid in get_excluded_project_ids(public=public)]
-    excluded_thread_ids = get_excluded_thread_ids(public=public)
+    if excluded_ids is None:
+        excluded_ids = (get_excluded_project_ids(public=public), get_excluded_thread_ids(public=public))
+
+    cache_key = None
+    if use_cache:
+        # Read the generation first, so a write landing mid-search leaves the entry stale
+        generation = index_generation.get()
+        cache_key = SearchResultCache.make_key(
+            query_vector,
+            # Hybrid ranking also depends on the query's terms
+            query=query if hybrid else None,
+            collection=collection_name, public=public, top_k=top_k, hybrid=hybrid,
+            projects_in_focus=projects_in_focus, blend_ratio=blend_ratio, thread_id=thread_id,
+            bias_author_id=bias_author_id, bias_source=bias_source, score_boost=score_boost,
+            source_boost=source_boost, penalize_muse=penalize_muse, muse_penalty=muse_penalty,
+            recency_half_life=recency_half_life, tag_boost=tag_boost, muse_boost=muse_boost,
+            remembered_boost=remembered_boost, project_boost=project_boost,
+            non_project_penalty=non_project_penalty, thread_boost=thread_boost,
+            start_time=start_time, end_time=end_time, excluded_ids=excluded_ids,
+        )
+        cached = search_result_cache.get(cache_key, generation)
+        if cached is not None:
+            print(f"[Indexed Memory] {len(cached)} results from cache")
+            return cached
+    excluded_project_ids = [str(oid) for oid in excluded_ids[0]]
+    excluded_thread_ids = excluded_ids[1]
     query_filter = {
         "must_not": [
             {"key": "is_hidden", "match": {"value": True}},
@@ -589,13 +788,61 @@ def search_indexed_memory(
         query_filter["must"] = []
 
     if start_time is not None or end_time is not None:
-        range_filter = {"key": "timestamp", "range": {}}
-        if start_time is not None:
-            range_filter["range"]["gte"] = start_time
-        if end_time is not None:
-            range_filter["range"]["lte"] = end_time
+        query_filter["must"].append(timestamp_range_condition(gte=start_time, lte=end_time))
+
+    # Hits whose project_ids / thread_ids are all excluded
+    query_filter["must"].extend(exclusion_conditions(excluded_project_ids, excluded_thread_ids))
+
+    scoring = dict(
+        now=time.time(),
+        projects_in_focus=projects_in_focus,
+        blend_ratio=blend_ratio,
+        thread_id=thread_id,
+        bias_author_id=bias_author_id,
+        bias_source=bias_source,
+        score_boost=score_boost,
+        source_boost=source_boost,
+        penalize_muse=penalize_muse,
+        muse_penalty=muse_penalty,
+        recency_half_life=recency_half_life,
+        tag_boost=tag_boost,
+        muse_boost=muse_boost,
+        remembered_boost=remembered_boost,
+        project_boost=project_boost,
+        non_project_penalty=non_project_penalty,
+        thread_boost=thread_boost,
+    )
 
-        query_filter["must"].append(range_filter)
+    # Formula ranking covers dense searches over backfilled timestamps; hybrid
+    # (RRF rescaled onto the dense range) and legacy points rescore client-side
+    fused = hybrid and bool(query) and has_sparse_vectors(QDRANT_COLLECTION)
+    if _formula_scoring["enabled"] and not fused and timestamps_backfilled(QDRANT_COLLECTION) \
+            and supports_formula_queries():
+        # Qdrant re-ranks the overfetched candidates itself; only top_k payloads come back
+        try:
+            ranked = search_collection(collection_name=QDRANT_COLLECTION,
+                                       search_query=query,
+                                       query_vector=query_vector,
+                                       limit=top_k,
+                                       prefetch_limit=overfetch_k,
+                                       query_filter=query_filter,
+                                       score_formula=build_score_formula(**scoring))
+            results = [hit_entry(hit.payload or {}, hit.score) for hit in ranked]
+            print(
+                f"[Indexed Memory] {len(results)} ranked in Qdrant from {overfetch_k}; top: "
+                + ", ".join(f"{(e.get('message_id') or '')[:6]}={e['score']:.3f}" for e in results[:5])
+            )
+            if cache_key is not None:
+                search_result_cache.put(cache_key, generation, results)
+            return results
+        except UnexpectedResponse as e:
+            # Only a server that doesn't know the formula query type (< 1.14, version
+            # unreadable) switches to client-side scoring; other bad requests are real errors
+            message = str(e).lower()
+            if e.status_code not in (400, 422) or "formula" not in message or "unknown variant" not in message:
+                raise
+            _formula_scoring["enabled"] = False
+            print(f"[Indexed Memory] Formula scoring unsupported by Qdrant, using client-side rescoring: {e}")
 
     #client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
     #search_result = client.search(
@@ -606,136 +853,25 @@ def search_indexed_memory(
     #)
     search_result = search_collection(collection_name=QDRANT_COLLECTION,
                                  search_query=query,
+                                 query_vector=query_vector,
                                  limit=overfetch_k,
-                                 query_filter=query_filter)
-
-    #print("\n[Raw Search Results]")
-    #for i, hit in enumerate(search_result[:50]):
-    #    pid = hit.payload.get("project_id")
-    #    pids = hit.payload.get("project_ids")
-    #    print(f"  Result[{i}] id={hit.payload.get('message_id')[:6]}, proj_id={pid}, proj_ids={pids}")
-
-    results = []
-    now = time.time()
-    for hit in search_result:
-        entry = {
-            "timestamp": hit.payload.get("timestamp"),
-            "message_id": hit.payload.get("message_id"),
-            "role": hit.payload.get("role"),
-            "source": hit.payload.get("source"),
-            "message": hit.payload.get("message"),
-            "metadata": hit.payload.get("metadata", {}),
-            "score": hit.score,
-            "user_tags": hit.payload.get("user_tags"),
-            "muse_tags": hit.payload.get("muse_tags"),
-            "remembered": hit.payload.get("remembered", False),
-            "project_id": hit.payload.get("project_id"),
-            "project_ids": hit.payload.get("project_ids"),
-            "thread_ids": hit.payload.get("thread_ids"),
-        }
-        # Biases
-        if bias_author_id and entry["metadata"].get("author_id") == bias_author_id:
-            entry["score"] += score_boost
-        if bias_source and entry.get("source") == bias_source:
-            entry["score"] += source_boost
-        if penalize_muse and entry.get("role") == "muse":
-            entry["score"] -= muse_penalty
-
-        # Recency & tag weighting
-        entry["score"] *= recency_weight(entry["timestamp"], now, half_life_hours=recency_half_life)
-        entry["score"] *= tag_weight(entry, tag_boost, muse_boost, remembered_boost, project_boost)
-        results.append(entry)
-
-    filtered_results = []
-    for entry in results:
-        pids = entry.get("project_ids")
-        tids = entry.get("thread_ids")
-
-        # Project filter
-        if pids is not None and pids:
-            if all(pid in excluded_project_ids for pid in pids):
-                continue
-
-        # Thread filter
-        if tids is not None and tids:
-            if all(tid in excluded_thread_ids for tid in tids):
-                continue
-
-        filtered_results.append(entry)
-
-    if thread_id:
-        for i, entry in enumerate(filtered_results):
-            tids = entry.get("thread_ids") or []
-            if thread_id in tids:
-                pre_score = entry["score"]
-                entry["score"] *= thread_boost  # e.g. 1.25
-                post_score = entry["score"]
-
-                # Optional tiny debug, mirroring the project blend logging
-                if i < 5:
-                    print(
-                        f"[Thread Focus] entry[{i}] id={entry.get('message_id')[:6]}..., "
-                        f"thread_match=True, "
-                        f"thread_id={thread_id}, "
-                        f"tids={tids}, "
-                        f"pre={pre_score:.3f}, post={post_score:.3f}"
-                    )
-
-    # Project focus blending: only if 10-99% (not hard filter)
-    if projects_in_focus and 0.0 < blend_ratio < 1.0:
-        # Optional: print blend context
-        #print(f"\n[Project Focus Blend] projects_in_focus={projects_in_focus}, blend_ratio={blend_ratio}")
-        for i, entry in enumerate(filtered_results):
-            project_ids = entry.get("project_ids") or []
-            in_focus = (
-                    (entry.get("project_id") in projects_in_focus)
-                    or any(pid in projects_in_focus for pid in project_ids)
-            )
-            pre_score = entry["score"]
-            if in_focus:
-                entry["score"] *= 1 + (blend_ratio * project_boost)
-            else:
-                entry["score"] *= 1 - (blend_ratio * non_project_penalty)
-            post_score = entry["score"]
-
-            # Print a compact summary for first few entries
-            if i < 5:  # Avoid log spam
-                print(
-                    f"  Entry[{i}] id={entry.get('message_id')[:6]}..., "
-                    f"in_focus={in_focus}, "
-                    f"proj_id={entry.get('project_id')}, "
-                    f"proj_ids={project_ids}, "
-                    f"pre={pre_score:.3f}, post={post_score:.3f}"
-                )
-        #print(f"[Project Focus Blend] Sampled {min(len(filtered_results), 5)} of {len(filtered_results)} entries.")
+                                 query_filter=query_filter,
+                                 hybrid=hybrid)
 
-    # At 100% focus, optionally post-filter any stragglers (such as project_ids files) for complete purity:
-    if projects_in_focus and blend_ratio == 1.0:
-        before = len(filtered_results)
-        filtered_results = [
-            entry for entry in filtered_results
-            if (
-                    (entry.get("project_id") in projects_in_focus)
-                    or any(pid in projects_in_focus for pid in entry.get("project_ids", []))
-            )
-        ]
-        after = len(filtered_results)
-        print(f"[Hard Project Filter] {after}/{before} entries match projects_in_focus={projects_in_focus}")
-        # Optionally print a sample of result IDs
-        print("  IDs:", [entry.get("message_id")[:6] for entry in filtered_results[:5]])
-
-
-    sorted_results = sorted(filtered_results, key=lambda x: x["score"], reverse=True)
-    print("[Final Results] Top entries after blending/filtering:")
-    for i, entry in enumerate(sorted_results[:5]):
-        print(
-            f"  Rank {i + 1}: id={entry.get('message_id')[:6]}..., "
-            f"score={entry['score']:.3f}, "
-            f"proj_id={entry.get('project_id')}, "
-            f"proj_ids={entry.get('project_ids')}"
-        )
-
-    return sorted_results[:top_k]
+    results = rescore_hits(
+        search_result,
+        top_k,
+        excluded_project_ids=excluded_project_ids,
+        excluded_thread_ids=excluded_thread_ids,
+        **scoring,
+    )
+    print(
+        f"[Indexed Memory] {len(results)}/{len(search_result)} candidates kept; top: "
+        + ", ".join(f"{(e.get('message_id') or '')[:6]}={e['score']:.3f}" for e in results[:5])
+    )
+    if cache_key is not None:
+        search_result_cache.put(cache_key, generation, results)
+    return results
 
 def search_memory_semantic(query, project_ids=None, start_time=None, end_time=None, limit=5, public=False):
     from zoneinfo import ZoneInfo
@@ -773,18 +909,14 @@ def search_memory_semantic(query, project_ids=None, start_time=None, end_time=No
 
     results = search_indexed_memory(**kwargs)
 
+    docs = {d["message_id"]: d for d in hydrate_messages(r.get("message_id") for r in results)}
     hydrated = []
 
     for r in results:
-        mid = r.get("message_id")
-        if not mid:
-            continue
-
-        doc = get_message_by_id(mid)
+        doc = docs.get(r.get("message_id"))
         if not doc:
             continue
 
-
         doc["_semantic_score"] = r.get("score")
         doc["_semantic_meta"] = r
 
@@ -809,11 +941,12 @@ def get_semantic_episode_context(
 
     Logic:
     - Fetch last N recent messages from Mongo (existing helper).
-    - Fetch their vectors from Qdrant (by message_id).
+    - Fetch their vectors from the recent-vector buffer, retrieving any
+      missing ones from `collection_name` by point id.
     - Sort messages by timestamp ascending.
-    - Walk from newest backwards, comparing each message's vector
-      to the one immediately before it (episode continuity).
-    - Stop when similarity drops below threshold.
+    - Compare each message's vector to the one immediately before it
+      (episode continuity), all pairs at once.
+    - The episode starts after the newest pair below threshold.
     - Return the contiguous tail slice that forms the episode.
     - Accepts an anchor_message_id to start the backward search from there.
     """
@@ -835,67 +968,68 @@ def get_semantic_episode_context(
 
     message_ids = [m["message_id"] for m in recent]
 
-    # 2) Fetch vectors from Qdrant
-    query_filter = {
-        "must": [
-    	    {"key": "message_id", "match": {"any": message_ids}}
-    	]
-    }
-
-    response = search_collection(collection_name="muse_memory",
-                 search_query=None,
-                 limit=len(message_ids),
-                 query_filter=query_filter,
-                 with_payload=True,
-                 with_vectors=True)
-
-    id_to_vec: dict[str, list[float]] = {}
-
-
-    for hit in response:
-        payload = hit.payload
-        mid = hit.payload.get("message_id")
-        vec = hit.vector
-        if mid is None or vec is None:
-            continue
-        id_to_vec[str(mid)] = vec
-
+    # 2) Vectors from the recent-vector buffer, the rest retrieved by point id
+    id_to_vec = get_message_vectors(message_ids, collection=collection_name)
 
     # If we somehow have no vectors, just fall back to the raw recent list
     if not id_to_vec:
         return recent
 
-    # 3) Walk backwards, find where the episode "breaks"
+    # 3) Cosine similarity of every neighbouring pair in one pass; a missing
+    # vector counts as a break. The episode starts after the newest break.
+    dim = len(next(iter(id_to_vec.values())))
+    vectors = np.zeros((len(recent), dim), dtype=np.float32)
+    present = np.zeros(len(recent), dtype=bool)
+    for i, mid in enumerate(message_ids):
+        vec = id_to_vec.get(mid)
+        if vec is not None:
+            vectors[i] = vec
+            present[i] = True
+    norms = np.linalg.norm(vectors, axis=1)
+    vectors /= np.where(norms > 0, norms, 1.0)[:, None]
+    neighbour_sims = np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+    breaks = np.flatnonzero((neighbour_sims < similarity_threshold) | ~(present[:-1] & present[1:]))
+    episode_start_idx = int(breaks[-1]) + 1 if breaks.size else 0
 
-    # Start from the newest message and walk backward until similarity breaks.
-    # We'll track an index where the contiguous episode starts.
-    episode_start_idx = len(recent) - 1  # default: just the last message
+    # 4) Return the tail slice that forms the episode
+    return recent[episode_start_idx:]
 
-    # Work with indices i and i-1
-    for i in range(len(recent) - 1, 0, -1):
-        curr = recent[i]
-        prev = recent[i - 1]
+class SearchLatencyStats:
+    """
+    Rolling per-collection latency for search_indexed_memories.
+    """
 
-        curr_vec = id_to_vec.get(curr["message_id"])
-        prev_vec = id_to_vec.get(prev["message_id"])
+    def __init__(self, window: int = 256):
+        self.window = window
+        self._samples: dict = {}
+        self._counts: dict = {}
+        self._lock = threading.Lock()
+
+    def record(self, collection: str, ms: float):
+        with self._lock:
+            self._samples.setdefault(collection, deque(maxlen=self.window)).append(ms)
+            self._counts[collection] = self._counts.get(collection, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = {c: (v[-1], sorted(v)) for c, v in self._samples.items()}
+            counts = dict(self._counts)
+        return {
+            c: {
+                "count": counts[c],
+                "last_ms": round(last, 2),
+                "mean_ms": round(sum(v) / len(v), 2),
+                "p95_ms": round(v[min(len(v) - 1, int(len(v) * 0.95))], 2),
+                "max_ms": round(v[-1], 2),
+            }
+            for c, (last, v) in samples.items()
+        }
 
-        # If either vector is missing, treat it as a break
-        if curr_vec is None or prev_vec is None:
-            episode_start_idx = i
-            break
 
-        sim = util.cos_sim(prev_vec, curr_vec).item()
+search_latency = SearchLatencyStats()
+SEARCH_FANOUT_WORKERS = 8
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_FANOUT_WORKERS, thread_name_prefix="memory-search")
 
-        if sim < similarity_threshold:
-            # Episode starts at the current message (i)
-            episode_start_idx = i
-            break
-        else:
-            # Still in the same episode; move the start back one more
-            episode_start_idx = i - 1
-
-    # 4) Return the tail slice that forms the episode
-    return recent[episode_start_idx:]
 
 def search_indexed_memories(
     query,
@@ -905,36 +1039,53 @@ def search_indexed_memories(
 ):
     """
     Search multiple Qdrant collections, blend and score results by source.
+    The query is embedded once per model and exclusions are read once; the
+    collections are then searched concurrently.
     """
-    results_by_collection = {}
-    for collection, weight in collections_weights.items():
-        res = search_indexed_memory(
-            query=query,
-            collection_name=collection,
-            top_k=int(top_k * 2),  # Overfetch for dedupe later
-            **kwargs
-        )
-        # Annotate each result with its source and weight for later blending
-        for r in res:
-            r["_collection"] = collection
-            r["_weight"] = weight
-        results_by_collection[collection] = res
+    if not collections_weights:
+        return []
+    public = kwargs.get("public", False)
+    kwargs.setdefault("excluded_ids", (get_excluded_project_ids(public=public), get_excluded_thread_ids(public=public)))
+    vectors = {}
+    for collection in collections_weights:
+        model_name = collection_model(collection)
+        if model_name not in vectors:
+            vectors[model_name] = get_query_vector(query, model_name=model_name)
+
+    def run(collection):
+        start = time.perf_counter()
+        try:
+            return search_indexed_memory(
+                query=query,
+                collection_name=collection,
+                top_k=int(top_k * 2),  # Overfetch for dedupe later
+                query_vector=vectors[collection_model(collection)],
+                **kwargs
+            )
+        finally:
+            search_latency.record(collection, (time.perf_counter() - start) * 1000)
+
+    if len(collections_weights) == 1:
+        results_by_collection = {c: run(c) for c in collections_weights}
+    else:
+        futures = {c: _search_pool.submit(run, c) for c in collections_weights}
+        results_by_collection = {c: f.result() for c, f in futures.items()}
 
-    # Merge, dedupe by message_id, blend scores
+    # Merge, weight and dedupe by message_id in one pass,
+    # keeping the copy with the highest weighted score
     merged = {}
     for collection, results in results_by_collection.items():
+        weight = collections_weights[collection]
         for r in results:
-            mid = r["message_id"]
-            # If duplicate, keep the one with highest weighted score
-            weighted_score = r["score"] * r["_weight"]
-            if mid not in merged or weighted_score > merged[mid]["_blended_score"]:
+            weighted_score = r["score"] * weight
+            best = merged.get(r["message_id"])
+            if best is None or weighted_score > best["_blended_score"]:
+                r["_collection"] = collection
+                r["_weight"] = weight
                 r["_blended_score"] = weighted_score
-                merged[mid] = r
+                merged[r["message_id"]] = r
 
-    # Sort all merged by blended score
-    deduped_sorted = sorted(merged.values(), key=lambda x: x["_blended_score"], reverse=True)
-    # Return only top_k
-    return deduped_sorted[:top_k]
+    return heapq.nlargest(top_k, merged.values(), key=lambda x: x["_blended_score"])
 
 
 # </editor-fold>
@@ -946,7 +1097,7 @@ def search_indexed_memories(
 # --------------------------
 # <editor-fold desc="🧠 MuseCortex Backends (Mongo + Local)">
 try:
-    from pymongo import MongoClient, ReturnDocument
+    from pymongo import ReturnDocument
     MONGO_ENABLED = True
 except ImportError:
     MONGO_ENABLED = False
@@ -994,7 +1145,7 @@ def update_doc(self, doc_id, updated_fields):
 class MongoCortexClient(MuseCortexInterface):
     def __init__(self):
         uri = MONGO_URI
-        self.client = MongoClient(uri)
+        self.client = connections.mongo(uri)
         self.db = self.client[MONGO_DB]
         self.collection = self.db[MONGO_MEMORY_COLLECTION]
 
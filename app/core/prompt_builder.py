@@ -9,7 +9,7 @@
 from bson import ObjectId
 from app.core import memory_core, journal_core, discovery_core, utils
 from app.databases import graphdb_connector
-from sentence_transformers import SentenceTransformer
+from app.services.embeddings import embed_texts
 from app.databases.mongo_connector import mongo, mongo_system
 from app.databases.qdrant_connector import search_collection
 from app.core.text_filters import get_text_filter_config, filter_text
@@ -790,7 +790,11 @@ def add_prompt_context(self,
         seen_ids = set(e["message_id"] for e in recent_entries)
         seen_ids |= set(message_ids_to_exclude or [])
 
-        deduped_semantic = [e for e in blended_semantic if e["message_id"] not in seen_ids]
+        # One query for the Mongo copy (and _id) of every surviving hit, rank kept
+        deduped_semantic = memory_core.hydrate_hits(
+            [e for e in blended_semantic if e["message_id"] not in seen_ids],
+            keep_missing=True,
+        )
         # Final assembly
 
         project_lookup = utils.build_project_lookup()
@@ -812,9 +816,6 @@ def add_prompt_context(self,
             semantic_header = {"role": "system",
                                "text": "[Semantic Recall]\nThe following messages are resurfaced from older conversation history and are not necessarily contiguous with the recent thread. Their timestamps and metadata remain authoritative."}
             semantic_message_parts.append(semantic_header)
-            semantic_ids = [e.get("message_id") for e in deduped_semantic if e.get("message_id")]
-            objectid_lookup = utils.get_objectids_for_message_ids(semantic_ids)  # {message_id: "67f..."}
-
             formatted_semantic_entries = []
             for e in deduped_semantic:
                 formatted_entry = utils.format_context_entry(
@@ -822,7 +823,7 @@ def add_prompt_context(self,
                     project_lookup=project_lookup,
                     proj_code_intensity=proj_code_intensity,
                     purpose="RELEVANT",
-                    search_memory_id=objectid_lookup.get(e.get("message_id")),
+                    search_memory_id=str(e["_id"]) if e.get("_id") else None,
                 )
                 formatted_semantic_entries.append(formatted_entry)
                 semantic_message_parts.append({
@@ -894,9 +895,6 @@ def add_prompt_context(self,
             }
             extended_history_message_parts.append(extended_header)
 
-            extended_ids = [e.get("message_id") for e in extended_entries if e.get("message_id")]
-            objectid_lookup = utils.get_objectids_for_message_ids(extended_ids)
-
             dominant_project_id = self.infer_dominant_project_id(
                 extended_entries,
                 min_count=2,
@@ -915,7 +913,7 @@ def add_prompt_context(self,
                     project_lookup=project_lookup,
                     proj_code_intensity=proj_code_intensity,
                     purpose="RECENT",
-                    search_memory_id=objectid_lookup.get(e.get("message_id")),
+                    search_memory_id=str(e["_id"]) if e.get("_id") else None,
                 )
                 extended_history_message_parts.append({
                     "role": utils.normalize_role(e.get("role")),
@@ -1022,11 +1020,13 @@ def add_discovery_snippets(self, query="*", max_items=5):
         if not snippets:
             return
 
-        query_vec = np.array(SentenceTransformer(SENTENCE_TRANSFORMER_MODEL).encode([query])[0], dtype="float32")
+        vectors = embed_texts([query] + list(snippets), model_name=SENTENCE_TRANSFORMER_MODEL)
+        query_vec = np.array(vectors[0], dtype="float32")
+        snippet_vecs = vectors[1:]
         entries = []
 
-        for snippet in snippets:
-            vec = np.array(SentenceTransformer(SENTENCE_TRANSFORMER_MODEL).encode([snippet])[0], dtype="float32")
+        for snippet, vec in zip(snippets, snippet_vecs):
+            vec = np.array(vec, dtype="float32")
             similarity = np.dot(vec, query_vec) / (np.linalg.norm(vec) * np.linalg.norm(query_vec))
             entries.append((similarity, snippet))
 
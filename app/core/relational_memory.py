@@ -3,15 +3,20 @@
 from pathlib import Path
 from datetime import datetime
 from pymongo import ASCENDING
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
 from app.config import muse_config, MONGO_CONVERSATION_COLLECTION, QDRANT_CONVERSATION_COLLECTION, QDRANT_ENTITY_COLLECTION, SENTENCE_TRANSFORMER_ENTITY_MODEL
 from app.core.utils import serialize_doc
 from app.databases.mongo_connector import mongo
 from app.databases.graphdb_connector import GraphDBConnector
-from app.databases.qdrant_connector import ensure_qdrant_collection, search_collection, upsert_embedding
+from app.databases.qdrant_connector import ensure_qdrant_collection, search_collection, upsert_embedding, \
+    timestamp_range_condition
+from app.services.embeddings import embedding_registry, embedding_batcher, embedding_dimension
 from app.services.openai_client import get_openai_custom_response, mnemosyne_openai_client
 from app.core.text_filters import get_text_filter_config, filter_text
-from app.core.memory_core import get_semantic_episode_context
+from app.core.memory_core import get_semantic_episode_context, hydrate_messages
+
+# Small, fast model used only for drift detection in the Mnemosyne buffer
+BUFFER_DRIFT_MODEL = "sentence-transformers/paraphrase-MiniLM-L3-v2"
 
 
 # === Core Relational Memory Class ===
@@ -27,7 +32,6 @@ class RelationalMemory:
     def __init__(self):
         self.graph = GraphDBConnector()
         self.mongo = mongo
-        self.embedder = SentenceTransformer(SENTENCE_TRANSFORMER_ENTITY_MODEL)
         ensure_qdrant_collection(
             vector_size=384,
             collection_name=QDRANT_ENTITY_COLLECTION
@@ -254,14 +258,14 @@ def semantic_recall(self, embedding, top_k=10, depth=2):
         return expanded
 
     def recall_from_message(self, message_text, top_k=10, depth=2):
-        embedding = self.embedder.encode(message_text)
+        embedding = embedding_batcher.encode(message_text, model_name=SENTENCE_TRANSFORMER_ENTITY_MODEL)
         expanded = self.semantic_recall(embedding, top_k=top_k, depth=depth)
         return expanded
 
     def debug_recall_from_message(self, message_text, top_k=10, depth=2):
         expanded = self.recall_from_message(message_text, top_k=top_k, depth=depth)
 
-        print(f"[Embed] {len(self.embedder.encode(message_text))}-dim vector generated for input text.\n")
+        print(f"[Embed] {embedding_dimension(SENTENCE_TRANSFORMER_ENTITY_MODEL)}-dim vector generated for input text.\n")
         print(f"[Recall] Querying Qdrant for top {top_k} entities...")
         print(f"Expanded: {expanded}")
 
@@ -458,13 +462,11 @@ def similarity_test(self, start_date, end_date):
         collection = self.mongo.db[MONGO_CONVERSATION_COLLECTION]
         log_collection = self.mongo.db["similarity_tests"]
 
-        model = SentenceTransformer("sentence-transformers/paraphrase-MiniLM-L3-v2", local_files_only=True)
-
         messages = self.get_messages_for_indexing(collection, date_range=[start_date, end_date])
         print(f"Found {len(messages)} messages between {start_date} and {end_date}")
 
         texts = [m.get("message", "") for m in messages]
-        embeddings = model.encode(texts, convert_to_tensor=True, show_progress_bar=True)
+        embeddings = embedding_registry.encode_batch(texts, model_name=BUFFER_DRIFT_MODEL, convert_to_tensor=True, show_progress_bar=True)
 
         for i in range(len(messages) - 1):
             score = util.cos_sim(embeddings[i], embeddings[i + 1]).item()
@@ -539,15 +541,7 @@ def test_recall_vs_qdrant_for_message(self,
 
         # Qdrant slice
         time_filter = {
-            "must": [
-                {
-                    "key": "timestamp",
-                    "range": {
-                        "gte": start_ts,
-                        "lte": end_ts,
-                    },
-                }
-            ]
+            "must": [timestamp_range_condition(gte=start_ts, lte=end_ts)]
         }
 
         qd_results = search_collection(
@@ -585,16 +579,10 @@ def to_json_safe(obj):
 
         def fetch_messages(ids):
             msgs = []
-            for mid in ids:
-                message_query = {"message_id": mid}
-                m = mongo.find_one_document(collection_name=MONGO_CONVERSATION_COLLECTION,
-                                                 query=message_query
-                                                 )
-                if not m:
-                    continue
+            for m in hydrate_messages(ids, projection={"timestamp": 1, "role": 1, "message": 1}):
                 msgs.append(
                     {
-                        "message_id": mid,
+                        "message_id": m["message_id"],
                         "timestamp": m.get("timestamp"),
                         "role": m.get("role"),
                         "content": m.get("message"),
@@ -781,11 +769,20 @@ def reconcile_entities_with_qdrant(self, entities):
             return []
 
         collection_name = QDRANT_ENTITY_COLLECTION
-        vector_size = self.embedder.get_sentence_embedding_dimension()
+        vector_size = embedding_dimension(SENTENCE_TRANSFORMER_ENTITY_MODEL)
         ensure_qdrant_collection(vector_size, collection_name)
 
         normalized_entities = []
 
+        # Embed every surface name up front so they share one forward pass
+        surface_names = list({
+            (e.get("entity_name") or "").strip() for e in entities
+        } - {""})
+        surface_vectors = dict(zip(
+            surface_names,
+            embedding_batcher.encode_many(surface_names, model_name=SENTENCE_TRANSFORMER_ENTITY_MODEL),
+        ))
+
         for e in entities:
             surface_name = (e.get("entity_name") or "").strip()
             if not surface_name:
@@ -798,7 +795,7 @@ def reconcile_entities_with_qdrant(self, entities):
             normalized_name = re.sub(r"[^a-z0-9]+", "", surface_name.lower())
 
             # embed the *surface* (semantic) name
-            vector = self.embedder.encode(surface_name)
+            vector = surface_vectors[surface_name]
             query_filter = {
                 "must": [
                     {"key": "entity_type", "match": {"value": ent_type}}
@@ -916,8 +913,6 @@ def index_messages_with_buffer(self, messages=None, start_date=None, end_date=No
         if not messages:
             return
 
-        model = SentenceTransformer("sentence-transformers/paraphrase-MiniLM-L3-v2", local_files_only=True)
-
         # Seed previous_emb from the existing buffer, if any
         active_doc = buffer_col.find_one({"flushed": False}, {"messages": 1}) or {"messages": []}
         existing_messages = active_doc.get("messages", [])
@@ -931,7 +926,7 @@ def index_messages_with_buffer(self, messages=None, start_date=None, end_date=No
             text = msg.get("message", "")
             cfg = get_text_filter_config("MNEMOSYNE", "EMBEDDING", "DEFAULT")
             filtered = filter_text(text, cfg)
-            emb = model.encode(filtered, convert_to_tensor=True, show_progress_bar=False)
+            emb = torch.tensor(embedding_batcher.encode(filtered, model_name=BUFFER_DRIFT_MODEL))
 
             msg_record = {
                 "message_id": msg["message_id"],
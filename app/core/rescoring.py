@@ -0,0 +1,242 @@
+# app/core/rescoring.py
+"""
+Rescoring for search_indexed_memory.
+
+The rules (and their order) are the ones search_indexed_memory always used:
+  score + author/source bias - muse penalty
+        * recency (half-life on timestamp_epoch) * tag/remembered/project weights
+  drop hits whose project_ids / thread_ids are all excluded
+        * thread boost, * project-focus blend, or the hard project filter at 100%
+
+build_score_formula expresses them as a Qdrant formula query (with
+exclusion_conditions in the filter), so Qdrant ranks dense candidates itself
+and only top_k payloads cross the wire. It needs timestamp_epoch on every
+point (qdrant_connector.timestamps_backfilled); hybrid searches always use
+rescore_hits, since fused RRF scores are rescaled before the boosts.
+
+rescore_hits applies the same rules client-side for those cases and for
+servers without formula queries (Qdrant < 1.14): the payload fields of the overfetched
+candidates are pulled into NumPy columns once, every weight is an array
+operation, and dicts are built only for the final top_k.
+"""
+import time
+from typing import Iterable, List, Optional, Sequence
+import numpy as np
+from qdrant_client.http import models as qmodels
+from app.databases.qdrant_connector import normalize_timestamp
+
+
+def _epoch(payload: dict) -> float:
+    epoch = payload.get("timestamp_epoch")
+    if epoch is not None:
+        return epoch
+    # Points indexed before timestamps were normalized only carry the string
+    return normalize_timestamp(payload.get("timestamp"))[1] or np.nan
+
+
+def hit_entry(payload: dict, score: float) -> dict:
+    return {
+        "timestamp": payload.get("timestamp"),
+        "message_id": payload.get("message_id"),
+        "role": payload.get("role"),
+        "source": payload.get("source"),
+        "message": payload.get("message"),
+        "metadata": payload.get("metadata", {}),
+        "score": score,
+        "user_tags": payload.get("user_tags"),
+        "muse_tags": payload.get("muse_tags"),
+        "remembered": payload.get("remembered", False),
+        "project_id": payload.get("project_id"),
+        "project_ids": payload.get("project_ids"),
+        "thread_ids": payload.get("thread_ids"),
+    }
+
+
+def _match(key: str, value) -> qmodels.FieldCondition:
+    return qmodels.FieldCondition(key=key, match=qmodels.MatchValue(value=value))
+
+
+def _not_empty(key: str) -> qmodels.Filter:
+    return qmodels.Filter(must_not=[qmodels.IsEmptyCondition(is_empty=qmodels.PayloadField(key=key))])
+
+
+def _weight(condition, when_true: float, when_false: float = 1.0):
+    # when_false + (when_true - when_false) * condition, where a condition scores 1 or 0
+    return qmodels.SumExpression(sum=[when_false, qmodels.MultExpression(mult=[when_true - when_false, condition])])
+
+
+def exclusion_conditions(excluded_project_ids: Iterable[str] = (), excluded_thread_ids: Iterable[str] = ()) -> List[dict]:
+    """
+    Filter clauses (for "must") that drop hits whose project_ids / thread_ids
+    are all excluded: keep a hit if the list is empty or has one id outside the set.
+    """
+    clauses = []
+    for key, excluded in (("project_ids", excluded_project_ids), ("thread_ids", excluded_thread_ids)):
+        excluded = [str(x) for x in excluded or ()]
+        if excluded:
+            clauses.append({"should": [
+                {"is_empty": {"key": key}},
+                {"key": key, "match": {"except": excluded}},
+            ]})
+    return clauses
+
+
+def build_score_formula(
+    *,
+    now: Optional[float] = None,
+    projects_in_focus: Iterable[str] = (),
+    blend_ratio: float = 1.0,
+    thread_id: Optional[str] = None,
+    bias_author_id=None,
+    bias_source=None,
+    score_boost: float = 0.1,
+    source_boost: float = 0.1,
+    penalize_muse: bool = False,
+    muse_penalty: float = 0.05,
+    recency_half_life: Optional[float] = 48,
+    tag_boost: float = 1.2,
+    muse_boost: float = 1.15,
+    remembered_boost: float = 2.0,
+    project_boost: float = 1.25,
+    non_project_penalty: float = 0.2,
+    thread_boost: float = 1.25,
+) -> qmodels.FormulaQuery:
+    """
+    rescore_hits' rules as a Qdrant formula over the prefetched "$score".
+    Recency is 2^((timestamp_epoch - now) / half_life), the same weight
+    rescore_hits gives, including above 1 for timestamps in the future;
+    points without timestamp_epoch default to "now" and keep weight 1.
+    """
+    now = time.time() if now is None else now
+    focus = [str(p) for p in projects_in_focus or ()]
+
+    base = ["$score"]
+    if bias_author_id:
+        base.append(qmodels.MultExpression(mult=[score_boost, _match("author_id", bias_author_id)]))
+    if bias_source:
+        base.append(qmodels.MultExpression(mult=[source_boost, _match("source", bias_source)]))
+    if penalize_muse:
+        base.append(qmodels.MultExpression(mult=[-muse_penalty, _match("role", "muse")]))
+    factors = [qmodels.SumExpression(sum=base) if len(base) > 1 else "$score"]
+
+    if recency_half_life and recency_half_life > 0:
+        # Not exp_decay: that decays on |timestamp - now|, so future timestamps would lose weight
+        half_lives = qmodels.DivExpression(div=qmodels.DivParams(
+            left=qmodels.SumExpression(sum=["timestamp_epoch", -now]), right=recency_half_life * 3600.0,
+        ))
+        factors.append(qmodels.PowExpression(pow=qmodels.PowParams(base=2.0, exponent=half_lives)))
+
+    factors += [
+        _weight(_not_empty("user_tags"), tag_boost),
+        _weight(_not_empty("muse_tags"), muse_boost),
+        _weight(_match("remembered", True), remembered_boost),
+        _weight(_not_empty("project_id"), project_boost),
+    ]
+    if thread_id:
+        factors.append(_weight(_match("thread_ids", thread_id), thread_boost))
+    if focus and 0.0 < blend_ratio < 1.0:
+        in_focus = qmodels.Filter(should=[
+            qmodels.FieldCondition(key="project_id", match=qmodels.MatchAny(any=focus)),
+            qmodels.FieldCondition(key="project_ids", match=qmodels.MatchAny(any=focus)),
+        ])
+        factors.append(_weight(in_focus, 1 + blend_ratio * project_boost, 1 - blend_ratio * non_project_penalty))
+
+    return qmodels.FormulaQuery(
+        formula=qmodels.MultExpression(mult=factors),
+        defaults={"timestamp_epoch": now},
+    )
+
+
+def rescore_hits(
+    hits: Sequence,
+    top_k: int,
+    *,
+    now: Optional[float] = None,
+    projects_in_focus: Iterable[str] = (),
+    blend_ratio: float = 1.0,
+    thread_id: Optional[str] = None,
+    excluded_project_ids: Iterable[str] = (),
+    excluded_thread_ids: Iterable[str] = (),
+    bias_author_id=None,
+    bias_source=None,
+    score_boost: float = 0.1,
+    source_boost: float = 0.1,
+    penalize_muse: bool = False,
+    muse_penalty: float = 0.05,
+    recency_half_life: Optional[float] = 48,
+    tag_boost: float = 1.2,
+    muse_boost: float = 1.15,
+    remembered_boost: float = 2.0,
+    project_boost: float = 1.25,
+    non_project_penalty: float = 0.2,
+    thread_boost: float = 1.25,
+) -> List[dict]:
+    """
+    Returns the best top_k hits as entry dicts, highest score first.
+    """
+    n = len(hits)
+    if n == 0 or top_k <= 0:
+        return []
+    now = time.time() if now is None else now
+    payloads = [h.payload or {} for h in hits]
+    focus = set(projects_in_focus or ())
+    excluded_projects = set(excluded_project_ids or ())
+    excluded_threads = set(excluded_thread_ids or ())
+
+    # One pass over the payloads pulls out every column the rules need
+    use_recency = bool(recency_half_life and recency_half_life > 0)
+    rows = []
+    for h, p in zip(hits, payloads):
+        thread_ids = p.get("thread_ids") or ()
+        project_ids = p.get("project_ids") or ()
+        rows.append((
+            h.score,
+            _epoch(p) if use_recency else np.nan,
+            bool(bias_author_id) and (p.get("author_id") or (p.get("metadata") or {}).get("author_id")) == bias_author_id,
+            bool(bias_source) and p.get("source") == bias_source,
+            penalize_muse and p.get("role") == "muse",
+            bool(p.get("user_tags")),
+            bool(p.get("muse_tags")),
+            bool(p.get("remembered")),
+            bool(p.get("project_id")),
+            bool(project_ids) and excluded_projects.issuperset(project_ids),
+            bool(thread_ids) and excluded_threads.issuperset(thread_ids),
+            thread_id in thread_ids,
+            p.get("project_id") in focus or not focus.isdisjoint(project_ids),
+        ))
+    cols = np.array(rows, dtype=np.float64)
+    scores = cols[:, 0].copy()
+    epochs = cols[:, 1]
+    (by_author, by_source, is_muse, tagged, muse_tagged, remembered, has_project,
+     projects_excluded, threads_excluded, in_thread, in_focus) = (cols[:, j] > 0 for j in range(2, 13))
+
+    # Additive biases
+    scores += score_boost * by_author + source_boost * by_source - muse_penalty * is_muse
+
+    # Recency: 2^(-age/half_life); hits without a usable timestamp keep weight 1
+    if use_recency:
+        age_hours = (now - epochs) / 3600.0
+        scores *= np.where(np.isnan(epochs), 1.0, np.exp2(-age_hours / recency_half_life))
+
+    # Tag / remembered / project weights
+    scores *= np.where(tagged, tag_boost, 1.0) * np.where(muse_tagged, muse_boost, 1.0) \
+        * np.where(remembered, remembered_boost, 1.0) * np.where(has_project, project_boost, 1.0)
+
+    # Exclusions the Qdrant filter can't express (all of a hit's projects/threads excluded)
+    keep = ~(projects_excluded | threads_excluded)
+
+    scores *= np.where(in_thread, thread_boost, 1.0)
+
+    if focus:
+        if blend_ratio == 1.0:
+            keep &= in_focus
+        elif 0.0 < blend_ratio < 1.0:
+            scores *= np.where(in_focus, 1 + blend_ratio * project_boost, 1 - blend_ratio * non_project_penalty)
+
+    candidates = np.flatnonzero(keep)
+    if candidates.size == 0:
+        return []
+    # Stable, so ties keep Qdrant's order
+    order = candidates[np.argsort(-scores[candidates], kind="stable")][:top_k]
+
+    return [hit_entry(payloads[i], float(scores[i])) for i in order]
@@ -247,22 +247,6 @@ def prompt_threads_helper(thread_id=None):
 
     return thread_title, thread_meta
 
-def get_objectids_for_message_ids(message_ids):
-    if not message_ids:
-        return {}
-
-    docs = mongo.find_documents(
-        collection_name=MONGO_CONVERSATION_COLLECTION,
-        query={"message_id": {"$in": message_ids}},
-        projection={"_id": 1, "message_id": 1},
-    )
-
-    return {
-        doc["message_id"]: str(doc["_id"])
-        for doc in docs
-        if doc.get("message_id") and doc.get("_id")
-    }
-
 def normalize_role(role: str) -> str:
     """
     Map roles from Mongo to the role for sending to the model.
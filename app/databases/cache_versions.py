@@ -0,0 +1,55 @@
+# app/databases/cache_versions.py
+"""
+Shared version counters for per-process caches.
+
+Each counter is a doc in muse_cache_versions (system DB). Writers bump it
+with $inc; readers re-read it at most every ttl_seconds, so caches in other
+processes notice a change within that window for one _id lookup. The
+bumping process sees its own bump immediately.
+
+  exclusions_version  hidden/private projects and threads changed
+  index_generation    Qdrant points were written, re-flagged or purged
+"""
+import threading
+import time
+from pymongo import ReturnDocument
+from app.config import MONGO_SYSTEM_DB
+from app.databases.connection_manager import connections
+
+CACHE_VERSIONS_COLLECTION = "muse_cache_versions"
+
+
+class SharedVersion:
+    def __init__(self, key: str, ttl_seconds: float = 1.0):
+        self.key = key
+        self.ttl_seconds = ttl_seconds
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _coll(self):
+        return connections.mongo_db(MONGO_SYSTEM_DB)[CACHE_VERSIONS_COLLECTION]
+
+    def get(self, refresh: bool = False) -> int:
+        now = time.monotonic()
+        if not refresh and self._version is not None and now - self._checked < self.ttl_seconds:
+            return self._version
+        doc = self._coll().find_one({"_id": self.key}, {"version": 1})
+        with self._lock:
+            self._version, self._checked = (doc or {}).get("version", 0), now
+        return self._version
+
+    def bump(self) -> int:
+        doc = self._coll().find_one_and_update(
+            {"_id": self.key},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        with self._lock:
+            self._version, self._checked = doc["version"], time.monotonic()
+        return doc["version"]
+
+
+exclusions_version = SharedVersion("excluded_scopes")
+index_generation = SharedVersion("index_generation")
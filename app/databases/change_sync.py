@@ -0,0 +1,283 @@
+# app/databases/change_sync.py
+"""
+Change-stream driven Qdrant sync (optional daemon).
+
+Tails one MongoDB change stream covering the conversation and memory
+collections and mirrors what happened into Qdrant, in batches:
+
+  conversation insert / text change  -> embed + upsert, stamp indexed_on
+  conversation flag/tag/project edit -> payload-only update
+  conversation hard delete           -> delete point (needs pre-images, see below)
+  memory layer edits                 -> embed + upsert stale entries,
+                                        delete points for removed entries
+
+Our own indexed_on / graphed_on stamps also show up in the stream; they
+touch no synced field, so they are ignored and the daemon never feeds on
+itself.
+
+The resume token is saved after every applied batch, so a restart picks up
+exactly where the last run stopped. If the token has fallen off the oplog,
+the daemon starts a fresh stream and runs the normal stale sweep
+(build_index / build_memory_index) to close the gap.
+
+Change streams need a replica set. A single-node one is enough:
+  mongod --replSet rs0 ...  then  rs.initiate()
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Set
+from pymongo.errors import OperationFailure, PyMongoError
+from app.config import MONGO_DB, MONGO_SYSTEM_DB, MONGO_CONVERSATION_COLLECTION, MONGO_MEMORY_COLLECTION, \
+    QDRANT_CONVERSATION_COLLECTION, QDRANT_MEMORY_COLLECTION, CHANGE_SYNC_MAX_BATCH, CHANGE_SYNC_MAX_WAIT_MS
+from app.core import utils
+from app.databases import qdrant_connector, memory_indexer
+from app.databases.connection_manager import connections
+
+SYNC_STATE_COLLECTION = "muse_sync_state"
+SYNC_STATE_ID = "qdrant_change_sync"
+TOKEN_IDLE_SAVE_SECONDS = 10
+
+# A change to any of these means the vector itself may be stale
+EMBED_FIELDS = {"message"}
+# A change to any of these only needs the payload refreshed
+PAYLOAD_FIELDS = {
+    "timestamp", "role", "source", "metadata", "user_tags", "is_private", "is_hidden",
+    "is_deleted", "project_id", "thread_ids", "remembered",
+}
+# Same exclusions as MemoryLayerManager: these layers are never semantically indexed
+NON_INDEXED_LAYERS = {"inner_monologue", "reminders", "scene_facts"}
+MEMORY_LAYER_TYPES = {"layer", "project_layer"}
+
+# Errors meaning the resume token is no longer in the oplog
+HISTORY_LOST_CODES = {136, 280, 286}
+
+
+def _top_level_fields(change) -> Set[str]:
+    desc = change.get("updateDescription") or {}
+    fields = set(desc.get("updatedFields", {}).keys()) | set(desc.get("removedFields", []))
+    return {f.split(".", 1)[0] for f in fields}
+
+
+class ChangeSyncDaemon:
+    def __init__(self, max_batch: int = CHANGE_SYNC_MAX_BATCH, max_wait_ms: float = CHANGE_SYNC_MAX_WAIT_MS):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.db = connections.mongo_db(MONGO_DB)
+        self.conversations = self.db[MONGO_CONVERSATION_COLLECTION]
+        self.memory = self.db[MONGO_MEMORY_COLLECTION]
+        self.state = connections.mongo_db(MONGO_SYSTEM_DB)[SYNC_STATE_COLLECTION]
+        # layer _id -> entry ids we last saw, so removed entries can be deleted from Qdrant
+        self._layer_entries: Dict[object, Set[str]] = {}
+        self.stats = {"events": 0, "batches": 0, "embedded": 0, "payload_updates": 0, "deleted": 0, "ignored": 0}
+
+    # --------------------------
+    # Resume token
+    # --------------------------
+    def load_token(self):
+        doc = self.state.find_one({"_id": SYNC_STATE_ID})
+        return doc.get("resume_token") if doc else None
+
+    def save_token(self, token):
+        if token is None:
+            return
+        self.state.update_one(
+            {"_id": SYNC_STATE_ID},
+            {"$set": {"resume_token": token, "updated_on": datetime.now(timezone.utc), "stats": dict(self.stats)}},
+            upsert=True,
+        )
+
+    # --------------------------
+    # Setup
+    # --------------------------
+    def enable_pre_images(self):
+        """
+        Hard deletes only carry the _id; pre-images let us recover the message_id.
+        Needs MongoDB 6.0+. Without them, hard deletes are skipped (purge_message
+        removes the Qdrant point itself anyway).
+        """
+        try:
+            self.db.command({"collMod": MONGO_CONVERSATION_COLLECTION, "changeStreamPreAndPostImages": {"enabled": True}})
+        except PyMongoError as e:
+            print(f"[ChangeSync] Could not enable pre-images on {MONGO_CONVERSATION_COLLECTION} ({e}); "
+                  f"hard deletes will not be mirrored")
+
+    def load_layer_entries(self):
+        for doc in self.memory.find({"type": {"$in": list(MEMORY_LAYER_TYPES)}}, {"entries.id": 1}):
+            self._layer_entries[doc["_id"]] = {e.get("id") for e in doc.get("entries", []) if e.get("id")}
+
+    def open_stream(self, resume_token=None):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": [MONGO_CONVERSATION_COLLECTION, MONGO_MEMORY_COLLECTION]},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        return self.db.watch(
+            pipeline,
+            full_document="updateLookup",
+            full_document_before_change="whenAvailable",
+            resume_after=resume_token,
+            max_await_time_ms=max(1, int(self.max_wait * 1000)),
+            batch_size=self.max_batch,
+        )
+
+    async def catch_up(self):
+        print("[ChangeSync] Running stale sweep to cover changes outside the stream")
+        await memory_indexer.build_index()
+        await memory_indexer.build_memory_index()
+
+    # --------------------------
+    # Applying a batch
+    # --------------------------
+    async def apply(self, changes: List[dict]):
+        conv_upserts: Dict[object, dict] = {}
+        conv_payloads: Dict[object, dict] = {}
+        conv_deletes: Set[str] = set()
+        layers: Dict[object, dict] = {}
+        removed_layers: Set[object] = set()
+
+        for change in changes:
+            coll = change["ns"]["coll"]
+            op = change["operationType"]
+            doc_id = change["documentKey"]["_id"]
+            doc = change.get("fullDocument")
+
+            if coll == MONGO_CONVERSATION_COLLECTION:
+                if op == "delete":
+                    before = change.get("fullDocumentBeforeChange") or {}
+                    conv_upserts.pop(doc_id, None)
+                    conv_payloads.pop(doc_id, None)
+                    if before.get("message_id"):
+                        conv_deletes.add(before["message_id"])
+                    else:
+                        self.stats["ignored"] += 1
+                    continue
+                if not doc or not doc.get("message_id"):
+                    # Document already gone (updateLookup raced a delete) or not indexable
+                    self.stats["ignored"] += 1
+                    continue
+                fields = _top_level_fields(change)
+                if op in ("insert", "replace") or fields & EMBED_FIELDS:
+                    conv_upserts[doc_id] = doc
+                    conv_payloads.pop(doc_id, None)
+                elif fields & PAYLOAD_FIELDS:
+                    if doc_id in conv_upserts:
+                        conv_upserts[doc_id] = doc
+                    else:
+                        conv_payloads[doc_id] = doc
+                else:
+                    self.stats["ignored"] += 1
+            else:
+                if op == "delete":
+                    layers.pop(doc_id, None)
+                    removed_layers.add(doc_id)
+                elif doc and doc.get("type") in MEMORY_LAYER_TYPES and doc.get("id") not in NON_INDEXED_LAYERS:
+                    layers[doc_id] = doc
+                    removed_layers.discard(doc_id)
+                else:
+                    self.stats["ignored"] += 1
+
+        if conv_upserts:
+            # Same path as build_index: batched encode, BATCH_SIZE upserts, one bulk_write for indexed_on
+            self.stats["embedded"] += await memory_indexer._index_message_page(
+                self.conversations, list(conv_upserts.values()), dryrun=False
+            )
+
+        if conv_payloads:
+            qdrant_connector.update_payload_for_messages([
+                {"message_id": d["message_id"], "payload": qdrant_connector.build_message_payload(d)}
+                for d in conv_payloads.values()
+            ])
+            self.stats["payload_updates"] += len(conv_payloads)
+
+        memory_deletes: Set[str] = set()
+        for layer_doc_id, doc in layers.items():
+            entries = doc.get("entries", [])
+            current = {e.get("id") for e in entries if e.get("id")}
+            memory_deletes |= self._layer_entries.get(layer_doc_id, set()) - current
+            self._layer_entries[layer_doc_id] = current
+
+            stale_entries = []
+            for e in entries:
+                if not e.get("id") or not e.get("text"):
+                    continue
+                indexed_on, updated_on = e.get("indexed_on"), e.get("updated_on")
+                if indexed_on is None or (updated_on is not None and updated_on > indexed_on):
+                    stale_entries.append({**e, "layer_id": doc["id"], "project_id": doc.get("project_id")})
+            if stale_entries:
+                self.stats["embedded"] += await memory_indexer._index_memory_page(
+                    self.memory, stale_entries, dryrun=False
+                )
+        for layer_doc_id in removed_layers:
+            memory_deletes |= self._layer_entries.pop(layer_doc_id, set())
+
+        for collection_name, ids in ((QDRANT_CONVERSATION_COLLECTION, conv_deletes),
+                                     (QDRANT_MEMORY_COLLECTION, memory_deletes)):
+            if not ids:
+                continue
+            qdrant_connector.delete_points([qdrant_connector.message_id_to_uuid(i) for i in ids], collection_name)
+            self.stats["deleted"] += len(ids)
+
+    # --------------------------
+    # Main loop
+    # --------------------------
+    async def run(self):
+        self.enable_pre_images()
+        self.load_layer_entries()
+        token = self.load_token()
+
+        while True:
+            try:
+                with self.open_stream(token) as stream:
+                    if token is None:
+                        # Stream is open, so nothing written from here on is missed
+                        self.save_token(stream.resume_token)
+                        await self.catch_up()
+                    print(f"[ChangeSync] Watching {MONGO_DB}.{MONGO_CONVERSATION_COLLECTION} and "
+                          f"{MONGO_DB}.{MONGO_MEMORY_COLLECTION}")
+                    await self._consume(stream)
+            except OperationFailure as e:
+                if e.code in HISTORY_LOST_CODES:
+                    print(f"[ChangeSync] Resume token is no longer in the oplog ({e}); starting over")
+                    utils.write_system_log(level="warn", module="databases", component="change_sync",
+                                           function="run", action="history_lost", error=str(e))
+                    token = None
+                    continue
+                raise
+            except PyMongoError as e:
+                # Network blip or primary step-down: resume from the last saved token
+                print(f"[ChangeSync] Stream error ({e}); resuming in 5s")
+                await asyncio.sleep(5)
+                token = self.load_token()
+
+    async def _consume(self, stream):
+        batch: List[dict] = []
+        first_at = None
+        saved_at = time.monotonic()
+        while stream.alive:
+            change = stream.try_next()
+            if change is not None:
+                if not batch:
+                    first_at = time.perf_counter()
+                batch.append(change)
+                if len(batch) < self.max_batch and time.perf_counter() - first_at < self.max_wait:
+                    continue
+
+            if batch:
+                started = time.perf_counter()
+                await self.apply(batch)
+                self.stats["events"] += len(batch)
+                self.stats["batches"] += 1
+                cluster_time = batch[-1].get("clusterTime")
+                lag = time.time() - cluster_time.time if cluster_time is not None else None
+                print(
+                    f"[ChangeSync] Applied {len(batch)} events in {(time.perf_counter() - started) * 1000:.0f}ms"
+                    + (f" (lag {lag:.1f}s)" if lag is not None else "")
+                    + f" totals={self.stats}"
+                )
+                batch = []
+                self.save_token(stream.resume_token)
+                saved_at = time.monotonic()
+            elif time.monotonic() - saved_at >= TOKEN_IDLE_SAVE_SECONDS:
+                # The token advances even on empty polls, so a quiet stream still has a fresh resume point
+                self.save_token(stream.resume_token)
+                saved_at = time.monotonic()
@@ -0,0 +1,206 @@
+# app/databases/connection_manager.py
+"""
+One place that hands out database clients.
+
+MongoClient and QdrantClient each carry their own connection pool and are
+thread-safe, so every module shares one client per URI / host:port.
+Memgraph (gqlalchemy) connections are not thread-safe, so those are shared
+per thread instead.
+
+This module deliberately imports nothing from app.config: config.py itself
+needs Mongo clients, so it calls connections.configure(...) with the
+settings and defaults instead.
+"""
+import atexit
+import threading
+import time
+from typing import Dict, Tuple
+from pymongo import MongoClient
+from qdrant_client import QdrantClient
+
+
+class ConnectionManager:
+    def __init__(self):
+        self.settings = {
+            # pymongo's own default, which MongoClient(None) used before
+            "mongo_uri": "mongodb://localhost:27017",
+            "mongo_max_pool_size": 50,
+            "mongo_min_pool_size": 0,
+            "mongo_max_idle_time_ms": None,
+            "mongo_connect_timeout_ms": 5000,
+            "mongo_server_selection_timeout_ms": 10000,
+            "mongo_socket_timeout_ms": None,
+            "mongo_heartbeat_frequency_ms": 10000,
+            "qdrant_host": None,
+            "qdrant_port": 6333,
+            "qdrant_timeout": 30,
+            "qdrant_pool_size": None,
+            "graphdb_host": None,
+            "graphdb_port": 7687,
+        }
+        self._mongo: Dict[str, MongoClient] = {}
+        self._qdrant: Dict[Tuple[str, int], QdrantClient] = {}
+        self._memgraph_local = threading.local()
+        self._memgraph_all = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def configure(self, **settings):
+        unknown = set(settings) - set(self.settings)
+        if unknown:
+            raise ValueError(f"Unknown connection settings: {sorted(unknown)}")
+        self.settings.update({k: v for k, v in settings.items() if v is not None})
+
+    # --------------------------
+    # Clients
+    # --------------------------
+    def mongo(self, uri: str | None = None) -> MongoClient:
+        uri = uri or self.settings["mongo_uri"]
+        client = self._mongo.get(uri)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._mongo.get(uri)
+            if client is None:
+                s = self.settings
+                options = {
+                    "maxPoolSize": s["mongo_max_pool_size"],
+                    "minPoolSize": s["mongo_min_pool_size"],
+                    "connectTimeoutMS": s["mongo_connect_timeout_ms"],
+                    "serverSelectionTimeoutMS": s["mongo_server_selection_timeout_ms"],
+                    "socketTimeoutMS": s["mongo_socket_timeout_ms"],
+                    "heartbeatFrequencyMS": s["mongo_heartbeat_frequency_ms"],
+                }
+                if s["mongo_max_idle_time_ms"] is not None:
+                    options["maxIdleTimeMS"] = s["mongo_max_idle_time_ms"]
+                # MongoClient connects in the background, so this never blocks
+                client = MongoClient(uri, **options)
+                self._mongo[uri] = client
+                self._closed = False
+        return client
+
+    def mongo_db(self, db_name: str, uri: str | None = None):
+        return self.mongo(uri)[db_name]
+
+    def qdrant(self, host: str | None = None, port: int | str | None = None) -> QdrantClient:
+        host = host or self.settings["qdrant_host"]
+        port = int(port or self.settings["qdrant_port"])
+        key = (host, port)
+        client = self._qdrant.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._qdrant.get(key)
+            if client is None:
+                client = QdrantClient(
+                    host=host,
+                    port=port,
+                    timeout=self.settings["qdrant_timeout"],
+                    pool_size=self.settings["qdrant_pool_size"],
+                )
+                self._qdrant[key] = client
+                self._closed = False
+        return client
+
+    def memgraph(self, host: str | None = None, port: int | str | None = None):
+        from gqlalchemy import Memgraph
+
+        host = host or self.settings["graphdb_host"]
+        port = int(port or self.settings["graphdb_port"])
+        clients = getattr(self._memgraph_local, "clients", None)
+        if clients is None:
+            clients = self._memgraph_local.clients = {}
+        mg = clients.get((host, port))
+        if mg is None:
+            mg = Memgraph(host, port)
+            clients[(host, port)] = mg
+            with self._lock:
+                self._memgraph_all.append(mg)
+                self._closed = False
+        return mg
+
+    # --------------------------
+    # Health / lifecycle
+    # --------------------------
+    def health_check(self) -> dict:
+        """
+        Ping every client handed out so far. Returns {name: {"ok", "latency_ms", "error"}}.
+        """
+        def timed(fn):
+            start = time.perf_counter()
+            try:
+                fn()
+                return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+            except Exception as e:
+                return {"ok": False, "latency_ms": None, "error": str(e)}
+
+        report = {}
+        for uri, client in list(self._mongo.items()):
+            # Strip credentials from the label
+            label = uri.split("@")[-1]
+            report[f"mongo:{label}"] = timed(lambda c=client: c.admin.command("ping"))
+        for (host, port), client in list(self._qdrant.items()):
+            report[f"qdrant:{host}:{port}"] = timed(client.get_collections)
+        if self.settings["graphdb_host"]:
+            report[f"memgraph:{self.settings['graphdb_host']}:{self.settings['graphdb_port']}"] = timed(
+                lambda: self.memgraph().execute("RETURN 1;")
+            )
+        return report
+
+    def stats(self) -> dict:
+        return {
+            "mongo_clients": len(self._mongo),
+            "qdrant_clients": len(self._qdrant),
+            "memgraph_connections": len(self._memgraph_all),
+            "mongo_max_pool_size": self.settings["mongo_max_pool_size"],
+            "qdrant_pool_size": self.settings["qdrant_pool_size"],
+        }
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            for client in self._mongo.values():
+                try:
+                    client.close()
+                except Exception as e:
+                    print(f"[Connections] Error closing Mongo client: {e}")
+            for client in self._qdrant.values():
+                try:
+                    client.close()
+                except Exception as e:
+                    print(f"[Connections] Error closing Qdrant client: {e}")
+            for mg in self._memgraph_all:
+                conn = getattr(mg, "_cached_connection", None)
+                # gqlalchemy wraps the raw mgclient connection; close whichever exposes close()
+                close = getattr(conn, "close", None) or getattr(getattr(conn, "_connection", None), "close", None)
+                if close is not None:
+                    try:
+                        close()
+                    except Exception as e:
+                        print(f"[Connections] Error closing Memgraph connection: {e}")
+            self._mongo.clear()
+            self._qdrant.clear()
+            self._memgraph_all.clear()
+            self._memgraph_local = threading.local()
+            self._closed = True
+
+
+connections = ConnectionManager()
+atexit.register(connections.close)
+
+
+def get_mongo_client(uri: str | None = None) -> MongoClient:
+    return connections.mongo(uri)
+
+
+def get_mongo_db(db_name: str, uri: str | None = None):
+    return connections.mongo_db(db_name, uri)
+
+
+def get_qdrant(host: str | None = None, port: int | str | None = None) -> QdrantClient:
+    return connections.qdrant(host, port)
+
+
+def get_memgraph(host: str | None = None, port: int | str | None = None):
+    return connections.memgraph(host, port)
@@ -0,0 +1,290 @@
+# app/databases/consistency_audit.py
+"""
+Cross-store consistency audit for conversation messages.
+
+Pulls the message ids and visibility flags (is_deleted / is_hidden /
+is_private) from all three stores in bulk, as streams sorted by message_id:
+
+  Mongo     find() with a projection, sorted server-side
+  Qdrant    scroll() over payload only (no vectors), sorted client-side
+  Memgraph  one MATCH (m:Message) ... ORDER BY m.message_id
+
+The three streams are walked with a single sorted merge, so the audit is
+O(n) after sorting and never issues per-message lookups.
+
+Drift it finds, and what repair() does about it:
+  qdrant.missing        in Mongo, no point           -> build_index(message_ids=...)
+  qdrant.orphaned       point, no Mongo message      -> delete points
+  qdrant.flag_mismatch  flags differ                 -> set_payload, grouped by flag values
+  memgraph.orphaned     Message node, no Mongo doc   -> DETACH DELETE
+  memgraph.flag_mismatch                             -> SET flags via UNWIND
+Messages that are in Mongo but not in Memgraph are only counted
+(not_graphed): graphing them takes a Mnemosyne pass, not a repair.
+"""
+import heapq
+import time
+from itertools import groupby
+from typing import Dict, Iterable, List, Tuple
+from qdrant_client.http import models as qmodels
+from app.config import MONGO_DB, MONGO_CONVERSATION_COLLECTION, QDRANT_CONVERSATION_COLLECTION
+from app.databases import qdrant_connector, memory_indexer
+from app.databases.connection_manager import connections
+from app.databases.cache_versions import index_generation
+
+FLAGS = ("is_deleted", "is_hidden", "is_private")
+SCROLL_PAGE = 5000
+REPAIR_BATCH = 1000
+SAMPLE_LIMIT = 20
+TARGET_MESSAGES_PER_MINUTE = 100_000
+
+SOURCE_MONGO, SOURCE_QDRANT, SOURCE_MEMGRAPH = 0, 1, 2
+
+
+def _flags(record) -> Tuple[bool, bool, bool]:
+    return tuple(bool(record.get(f)) for f in FLAGS)
+
+
+# --------------------------
+# Bulk readers (each returns [(message_id, flags, extra)] sorted by message_id)
+# --------------------------
+def read_mongo() -> List[tuple]:
+    coll = connections.mongo_db(MONGO_DB)[MONGO_CONVERSATION_COLLECTION]
+    projection = {"_id": 0, "message_id": 1, **{f: 1 for f in FLAGS}}
+    cursor = coll.find(
+        {"message_id": {"$exists": True}}, projection, sort=[("message_id", 1)], allow_disk_use=True
+    ).batch_size(10000)
+    return [(doc["message_id"], _flags(doc), None) for doc in cursor]
+
+
+def read_qdrant(collection: str = QDRANT_CONVERSATION_COLLECTION) -> Tuple[List[tuple], List]:
+    """
+    Returns (rows sorted by message_id, point ids that carry no message_id).
+    """
+    rows, unkeyed = [], []
+    offset = None
+    while True:
+        points, offset = qdrant_connector.qdrant.scroll(
+            collection_name=collection,
+            limit=SCROLL_PAGE,
+            offset=offset,
+            with_payload=qmodels.PayloadSelectorInclude(include=["message_id", *FLAGS]),
+            with_vectors=False,
+        )
+        for p in points:
+            payload = p.payload or {}
+            mid = payload.get("message_id")
+            if mid:
+                rows.append((mid, _flags(payload), p.id))
+            else:
+                unkeyed.append(p.id)
+        if offset is None:
+            break
+    rows.sort(key=lambda r: r[0])
+    return rows, unkeyed
+
+
+def read_memgraph() -> List[tuple]:
+    mg = connections.memgraph()
+    results = mg.execute_and_fetch(
+        "MATCH (m:Message) WHERE m.message_id IS NOT NULL "
+        "RETURN m.message_id AS message_id, m.is_deleted AS is_deleted, "
+        "m.is_hidden AS is_hidden, m.is_private AS is_private "
+        "ORDER BY message_id"
+    )
+    return [(r["message_id"], _flags(r), None) for r in results]
+
+
+def _tagged(rows: Iterable[tuple], source: int):
+    for message_id, flags, extra in rows:
+        yield message_id, source, flags, extra
+
+
+# --------------------------
+# Audit
+# --------------------------
+def audit(include_memgraph: bool = True) -> dict:
+    started = time.perf_counter()
+    timings = {}
+
+    t0 = time.perf_counter()
+    mongo_rows = read_mongo()
+    timings["mongo_read_s"] = round(time.perf_counter() - t0, 3)
+
+    t0 = time.perf_counter()
+    qdrant_rows, unkeyed_points = read_qdrant()
+    timings["qdrant_read_s"] = round(time.perf_counter() - t0, 3)
+
+    memgraph_rows, memgraph_error = [], None
+    if include_memgraph:
+        t0 = time.perf_counter()
+        try:
+            memgraph_rows = read_memgraph()
+        except Exception as e:
+            memgraph_error = str(e)
+        timings["memgraph_read_s"] = round(time.perf_counter() - t0, 3)
+
+    drift = {
+        "qdrant_missing": [],            # message_ids
+        "qdrant_orphaned": [],           # point ids
+        "qdrant_flag_mismatch": [],      # (point_id, mongo flags)
+        "memgraph_orphaned": [],         # message_ids
+        "memgraph_flag_mismatch": [],    # (message_id, mongo flags)
+    }
+    duplicates = 0
+    not_graphed = 0
+
+    t0 = time.perf_counter()
+    merged = heapq.merge(
+        _tagged(mongo_rows, SOURCE_MONGO),
+        _tagged(qdrant_rows, SOURCE_QDRANT),
+        _tagged(memgraph_rows, SOURCE_MEMGRAPH),
+        key=lambda r: (r[0], r[1]),
+    )
+    for message_id, group in groupby(merged, key=lambda r: r[0]):
+        by_source: Dict[int, tuple] = {}
+        for _, source, flags, extra in group:
+            if source in by_source:
+                duplicates += 1
+                if source == SOURCE_QDRANT:
+                    # Several points for one message (legacy random ids): keep the uuid5 one
+                    keep_id = qdrant_connector.message_id_to_uuid(message_id)
+                    if str(extra) != keep_id:
+                        drift["qdrant_orphaned"].append(extra)
+                        continue
+                    drift["qdrant_orphaned"].append(by_source[source][1])
+            by_source[source] = (flags, extra)
+
+        mongo = by_source.get(SOURCE_MONGO)
+        point = by_source.get(SOURCE_QDRANT)
+        node = by_source.get(SOURCE_MEMGRAPH)
+
+        if mongo is None:
+            if point is not None:
+                drift["qdrant_orphaned"].append(point[1])
+            if node is not None:
+                drift["memgraph_orphaned"].append(message_id)
+            continue
+
+        if point is None:
+            drift["qdrant_missing"].append(message_id)
+        elif point[0] != mongo[0]:
+            drift["qdrant_flag_mismatch"].append((point[1], mongo[0]))
+
+        if node is None:
+            not_graphed += 1
+        elif node[0] != mongo[0]:
+            drift["memgraph_flag_mismatch"].append((message_id, mongo[0]))
+    drift["qdrant_orphaned"].extend(unkeyed_points)
+    timings["merge_s"] = round(time.perf_counter() - t0, 3)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "counts": {
+            "mongo": len(mongo_rows),
+            "qdrant": len(qdrant_rows) + len(unkeyed_points),
+            "memgraph": len(memgraph_rows) if include_memgraph and not memgraph_error else None,
+        },
+        "qdrant": {
+            "missing": len(drift["qdrant_missing"]),
+            "orphaned": len(drift["qdrant_orphaned"]),
+            "unkeyed_points": len(unkeyed_points),
+            "flag_mismatch": len(drift["qdrant_flag_mismatch"]),
+        },
+        "memgraph": {
+            "orphaned": len(drift["memgraph_orphaned"]),
+            "flag_mismatch": len(drift["memgraph_flag_mismatch"]),
+            "not_graphed": not_graphed,
+            "error": memgraph_error,
+        } if include_memgraph else None,
+        "duplicates": duplicates,
+        "samples": {k: [v if not isinstance(v, tuple) else v[0] for v in vals[:SAMPLE_LIMIT]] for k, vals in drift.items()},
+        "timings": timings,
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_minute": round(len(mongo_rows) / elapsed * 60) if elapsed > 0 else None,
+        "target_messages_per_minute": TARGET_MESSAGES_PER_MINUTE,
+    }
+    return {"report": report, "drift": drift}
+
+
+# --------------------------
+# Repair
+# --------------------------
+def _chunks(items: list, size: int = REPAIR_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def repair(drift: dict, include_memgraph: bool = True, batch_size: int = REPAIR_BATCH) -> dict:
+    qdrant = qdrant_connector.qdrant
+    repaired = {k: 0 for k in drift}
+
+    for batch in _chunks(drift["qdrant_missing"], batch_size):
+        await memory_indexer.build_index(message_ids=batch)
+        repaired["qdrant_missing"] += len(batch)
+
+    for batch in _chunks(drift["qdrant_orphaned"], batch_size):
+        qdrant_connector.delete_points(batch, QDRANT_CONVERSATION_COLLECTION)
+        repaired["qdrant_orphaned"] += len(batch)
+
+    # Most mismatches share a handful of flag combinations: one set_payload per combination and batch
+    by_flags: Dict[tuple, list] = {}
+    for point_id, flags in drift["qdrant_flag_mismatch"]:
+        by_flags.setdefault(flags, []).append(point_id)
+    for flags, point_ids in by_flags.items():
+        payload = dict(zip(FLAGS, flags))
+        for batch in _chunks(point_ids, batch_size):
+            qdrant.batch_update_points(
+                collection_name=QDRANT_CONVERSATION_COLLECTION,
+                update_operations=[qmodels.SetPayloadOperation(
+                    set_payload=qmodels.SetPayload(payload=payload, points=batch)
+                )],
+            )
+            repaired["qdrant_flag_mismatch"] += len(batch)
+    if by_flags:
+        index_generation.bump()
+
+    if include_memgraph:
+        mg = connections.memgraph()
+        for batch in _chunks(drift["memgraph_orphaned"], batch_size):
+            mg.execute(
+                "UNWIND $ids AS id MATCH (m:Message {message_id: id}) DETACH DELETE m",
+                {"ids": batch},
+            )
+            repaired["memgraph_orphaned"] += len(batch)
+        rows = [{"id": mid, **dict(zip(FLAGS, flags))} for mid, flags in drift["memgraph_flag_mismatch"]]
+        for batch in _chunks(rows, batch_size):
+            mg.execute(
+                "UNWIND $rows AS r MATCH (m:Message {message_id: r.id}) "
+                "SET m.is_deleted = r.is_deleted, m.is_hidden = r.is_hidden, m.is_private = r.is_private",
+                {"rows": batch},
+            )
+            repaired["memgraph_flag_mismatch"] += len(batch)
+
+    return repaired
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"Messages: mongo={report['counts']['mongo']} qdrant={report['counts']['qdrant']} "
+        f"memgraph={report['counts']['memgraph']}",
+        f"Qdrant:   missing={report['qdrant']['missing']} orphaned={report['qdrant']['orphaned']} "
+        f"(unkeyed {report['qdrant']['unkeyed_points']}) flag_mismatch={report['qdrant']['flag_mismatch']}",
+    ]
+    mg = report.get("memgraph")
+    if mg:
+        if mg["error"]:
+            lines.append(f"Memgraph: unavailable ({mg['error']})")
+        else:
+            lines.append(
+                f"Memgraph: orphaned={mg['orphaned']} flag_mismatch={mg['flag_mismatch']} "
+                f"not_graphed={mg['not_graphed']}"
+            )
+    if report["duplicates"]:
+        lines.append(f"Duplicate ids across a store: {report['duplicates']}")
+    rate = report["messages_per_minute"]
+    verdict = "ok" if rate and rate >= report["target_messages_per_minute"] else "BELOW TARGET"
+    lines.append(
+        f"Audited in {report['elapsed_s']}s ({rate} messages/min, target "
+        f"{report['target_messages_per_minute']}: {verdict})  {report['timings']}"
+    )
+    return "\n".join(lines)
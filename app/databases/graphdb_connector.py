@@ -1,7 +1,7 @@
 # graphdb_connector.py
 
-from gqlalchemy import Memgraph
 from app.config import GRAPHDB_HOST, GRAPHDB_PORT
+from app.databases.connection_manager import connections
 from app.core.utils import write_system_log
 
 host = GRAPHDB_HOST
@@ -16,7 +16,8 @@ def __init__(self, host=host, port=port):
 
     def _connect(self):
         try:
-            self.mg = Memgraph(self.host, self.port)
+            # One Memgraph connection per thread, shared by every connector instance
+            self.mg = connections.memgraph(self.host, self.port)
             # Light ping to confirm connectivity
             self.mg.execute("RETURN 1;")
             write_system_log(
@@ -0,0 +1,437 @@
+# app/databases/job_queue.py
+"""
+Durable job queue backed by a Mongo collection.
+
+Each job is one document:
+  queue, payload, dedupe_key, status, attempts, max_attempts,
+  enqueued_at, run_after, lease_until, leased_by, completed_at, last_error
+
+Status flow:
+  pending -> leased -> done
+                    -> pending (retry, after an exponential backoff)
+                    -> dead    (out of attempts; kept for inspection)
+
+A worker claims a job by atomically flipping it to "leased" with a
+lease_until deadline. If the worker dies, the lease runs out and the job
+becomes claimable again, so nothing is lost on restart; a job whose lease
+runs out on its last attempt is dead-lettered instead, so a job that keeps
+crashing its worker is not retried forever. Identical pending
+jobs collapse into one through a partial unique index on
+(queue, dedupe_key).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import statistics
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from app.config import MONGO_SYSTEM_DB, MONGO_JOBS_COLLECTION, JOB_QUEUE_LEASE_SECONDS, JOB_QUEUE_MAX_ATTEMPTS, \
+    JOB_QUEUE_BACKOFF_BASE_SECONDS, JOB_QUEUE_BACKOFF_MAX_SECONDS, JOB_QUEUE_POLL_SECONDS, JOB_QUEUE_RETENTION_DAYS
+from app.databases.connection_manager import connections
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_indexes_ready = set()
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # pymongo hands back naive datetimes unless the client is tz_aware
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def jobs_collection():
+    coll = connections.mongo_db(MONGO_SYSTEM_DB)[MONGO_JOBS_COLLECTION]
+    if coll.full_name not in _indexes_ready:
+        coll.create_index([("queue", ASCENDING), ("status", ASCENDING), ("run_after", ASCENDING)])
+        coll.create_index([("status", ASCENDING), ("lease_until", ASCENDING)])
+        coll.create_index(
+            [("queue", ASCENDING), ("dedupe_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"status": STATUS_PENDING},
+            name="pending_dedupe",
+        )
+        # Finished jobs age out; dead letters have no completed_at and stay
+        coll.create_index("completed_at", expireAfterSeconds=int(JOB_QUEUE_RETENTION_DAYS * 86400))
+        _indexes_ready.add(coll.full_name)
+    return coll
+
+
+def make_dedupe_key(payload: Any) -> str:
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Job:
+    __slots__ = ("id", "queue", "payload", "attempts", "max_attempts", "enqueued_at")
+
+    def __init__(self, doc: dict):
+        self.id = doc["_id"]
+        self.queue = doc["queue"]
+        self.payload = doc["payload"]
+        self.attempts = doc.get("attempts", 0)
+        self.max_attempts = doc.get("max_attempts", JOB_QUEUE_MAX_ATTEMPTS)
+        self.enqueued_at = _as_utc(doc["enqueued_at"])
+
+    def __repr__(self):
+        return f"Job({self.queue}, {self.id}, attempt {self.attempts}/{self.max_attempts})"
+
+
+class DurableJobQueue:
+    """
+    Named queue over the shared jobs collection. put() is safe to call from
+    any process; get() competes with every other consumer of the same queue.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        lease_seconds: float = JOB_QUEUE_LEASE_SECONDS,
+        max_attempts: int = JOB_QUEUE_MAX_ATTEMPTS,
+        backoff_base_seconds: float = JOB_QUEUE_BACKOFF_BASE_SECONDS,
+        backoff_max_seconds: float = JOB_QUEUE_BACKOFF_MAX_SECONDS,
+        poll_seconds: float = JOB_QUEUE_POLL_SECONDS,
+    ):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.poll_seconds = poll_seconds
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lags = deque(maxlen=500)
+        self.counters = {"enqueued": 0, "deduped": 0, "completed": 0, "retried": 0, "dead": 0}
+
+    def _event(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    # --------------------------
+    # Producer side
+    # --------------------------
+    def _insert(self, payload: Any, dedupe_key: str | None, delay_seconds: float) -> Optional[str]:
+        coll = jobs_collection()
+        dedupe_key = dedupe_key or make_dedupe_key(payload)
+        now = _now()
+        try:
+            result = coll.update_one(
+                {"queue": self.name, "dedupe_key": dedupe_key, "status": STATUS_PENDING},
+                {"$setOnInsert": {
+                    "queue": self.name,
+                    "payload": payload,
+                    "dedupe_key": dedupe_key,
+                    "status": STATUS_PENDING,
+                    "attempts": 0,
+                    "max_attempts": self.max_attempts,
+                    "enqueued_at": now,
+                    "run_after": now + timedelta(seconds=delay_seconds),
+                }},
+                upsert=True,
+            )
+            job_id = result.upserted_id
+        except DuplicateKeyError:
+            # Another producer inserted the same job between our match and insert
+            job_id = None
+
+        if job_id is None:
+            self.counters["deduped"] += 1
+            existing = coll.find_one(
+                {"queue": self.name, "dedupe_key": dedupe_key, "status": STATUS_PENDING}, {"_id": 1}
+            )
+            job_id = existing["_id"] if existing else None
+        else:
+            self.counters["enqueued"] += 1
+        return str(job_id) if job_id is not None else None
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def put_nowait(self, payload: Any, *, dedupe_key: str | None = None, delay_seconds: float = 0) -> Optional[str]:
+        """
+        Enqueue a job, or return the id of the identical job already pending.
+        The id comes back as a string, ready for a JSON response or job_status().
+        Blocks on the Mongo write; from a coroutine, await put() instead.
+        """
+        job_id = self._insert(payload, dedupe_key, delay_seconds)
+        self._wake()
+        return job_id
+
+    async def put(self, payload: Any, *, dedupe_key: str | None = None, delay_seconds: float = 0) -> Optional[str]:
+        # The write runs in a thread so a route enqueueing work doesn't stall the loop;
+        # the wakeup is set back on the loop, since asyncio.Event isn't thread-safe
+        job_id = await asyncio.to_thread(self._insert, payload, dedupe_key, delay_seconds)
+        self._wake()
+        return job_id
+
+    # --------------------------
+    # Consumer side
+    # --------------------------
+    def _bury_expired(self, now: datetime) -> int:
+        """
+        Dead-letter leased jobs whose lease ran out on their last attempt.
+        Their worker died (or hung) without reaching fail(), so nothing else
+        would stop them being re-claimed forever.
+        """
+        result = jobs_collection().update_many(
+            {
+                "queue": self.name,
+                "status": STATUS_LEASED,
+                "lease_until": {"$lt": now},
+                "$expr": {"$gte": ["$attempts", "$max_attempts"]},
+            },
+            {"$set": {"status": STATUS_DEAD, "dead_at": now, "last_error": "lease expired on final attempt"},
+             "$unset": {"lease_until": ""}},
+        )
+        self.counters["dead"] += result.modified_count
+        return result.modified_count
+
+    def claim(self) -> Optional[Job]:
+        """
+        Lease the oldest runnable job, including ones whose previous lease
+        expired with attempts to spare.
+        """
+        now = _now()
+        self._bury_expired(now)
+        doc = jobs_collection().find_one_and_update(
+            {
+                "queue": self.name,
+                "$or": [
+                    {"status": STATUS_PENDING, "run_after": {"$lte": now}},
+                    {"status": STATUS_LEASED, "lease_until": {"$lt": now},
+                     "$expr": {"$lt": ["$attempts", "$max_attempts"]}},
+                ],
+            },
+            {
+                "$set": {
+                    "status": STATUS_LEASED,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "leased_by": WORKER_ID,
+                    "leased_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_after", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return Job(doc) if doc else None
+
+    def claim_many(self, limit: int) -> List[Job]:
+        """
+        Lease up to `limit` runnable jobs in one call, oldest first.
+        """
+        jobs = []
+        while len(jobs) < limit:
+            job = self.claim()
+            if job is None:
+                break
+            jobs.append(job)
+        return jobs
+
+    async def get(self) -> Job:
+        """
+        Wait for the next job. Wakes immediately on a local put(), otherwise polls.
+        """
+        event = self._event()
+        while True:
+            event.clear()
+            try:
+                job = await asyncio.to_thread(self.claim)
+            except PyMongoError as e:
+                # Keep the consumer alive through a Mongo blip; the job stays in the collection
+                print(f"[JobQueue:{self.name}] Claim failed ({e}); retrying in {self.poll_seconds}s")
+                job = None
+            if job is not None:
+                return job
+            try:
+                await asyncio.wait_for(event.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def get_batch(self, limit: int, max_wait: float) -> List[Job]:
+        """
+        Wait for the next job, then keep claiming for up to `max_wait` seconds
+        (or until `limit` jobs are held). Claims run in a thread, and the wait
+        between them wakes on a local put() rather than polling.
+        """
+        batch = [await self.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_wait
+        event = self._event()
+        while len(batch) < limit:
+            event.clear()
+            try:
+                batch.extend(await asyncio.to_thread(self.claim_many, limit - len(batch)))
+            except PyMongoError as e:
+                # Run what we already hold; the rest stays in the collection
+                print(f"[JobQueue:{self.name}] Claim failed ({e}); closing batch of {len(batch)}")
+                break
+            remaining = deadline - loop.time()
+            if len(batch) >= limit or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+        return batch
+
+    def extend_lease(self, job: Job, seconds: float | None = None):
+        jobs_collection().update_one(
+            self._owned(job),
+            {"$set": {"lease_until": _now() + timedelta(seconds=seconds or self.lease_seconds)}},
+        )
+
+    def report_progress(self, job: Job, **progress):
+        """
+        Record how far a long-running job has got, for status polling.
+        """
+        jobs_collection().update_one(
+            self._owned(job),
+            {"$set": {"progress": {**progress, "updated_at": _now()}}},
+        )
+
+    @staticmethod
+    def _owned(job: Job) -> dict:
+        # A worker whose lease expired (and whose job was re-claimed) must not
+        # overwrite the newer attempt's outcome
+        return {"_id": job.id, "status": STATUS_LEASED, "attempts": job.attempts}
+
+    def ack(self, job: Job):
+        now = _now()
+        jobs_collection().update_one(
+            self._owned(job),
+            {"$set": {"status": STATUS_DONE, "completed_at": now}, "$unset": {"lease_until": ""}},
+        )
+        self.counters["completed"] += 1
+        self._lags.append((now - job.enqueued_at).total_seconds())
+
+    def fail(self, job: Job, error: Exception | str):
+        """
+        Schedule a retry with exponential backoff, or dead-letter the job once
+        it has used up its attempts.
+        """
+        coll = jobs_collection()
+        now = _now()
+        if job.attempts >= job.max_attempts:
+            coll.update_one(
+                self._owned(job),
+                {"$set": {"status": STATUS_DEAD, "dead_at": now, "last_error": str(error)},
+                 "$unset": {"lease_until": ""}},
+            )
+            self.counters["dead"] += 1
+            return STATUS_DEAD
+
+        backoff = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** (job.attempts - 1)))
+        try:
+            coll.update_one(
+                self._owned(job),
+                {"$set": {"status": STATUS_PENDING, "run_after": now + timedelta(seconds=backoff),
+                          "last_error": str(error)},
+                 "$unset": {"lease_until": ""}},
+            )
+        except DuplicateKeyError:
+            # An identical job was queued while this one ran; that one covers the retry
+            coll.update_one(
+                self._owned(job),
+                {"$set": {"status": STATUS_DONE, "completed_at": now, "last_error": str(error), "superseded": True},
+                 "$unset": {"lease_until": ""}},
+            )
+            return STATUS_DONE
+        self.counters["retried"] += 1
+        return STATUS_PENDING
+
+    # --------------------------
+    # Admin / metrics
+    # --------------------------
+    def requeue_dead(self, job_id=None) -> int:
+        """
+        Give dead-lettered jobs a fresh set of attempts. Returns how many were requeued.
+        """
+        coll = jobs_collection()
+        query = {"queue": self.name, "status": STATUS_DEAD}
+        if job_id is not None:
+            query["_id"] = ObjectId(job_id) if isinstance(job_id, str) else job_id
+
+        requeued = 0
+        for doc in coll.find(query, {"_id": 1}):
+            try:
+                coll.update_one(
+                    {"_id": doc["_id"], "status": STATUS_DEAD},
+                    {"$set": {"status": STATUS_PENDING, "attempts": 0, "run_after": _now()}, "$unset": {"dead_at": ""}},
+                )
+                requeued += 1
+            except DuplicateKeyError:
+                # Same job is already pending again; nothing to revive
+                continue
+        if requeued:
+            self._wake()
+        return requeued
+
+    def job_status(self, job_id) -> Optional[Dict[str, Any]]:
+        doc = jobs_collection().find_one(
+            {"_id": ObjectId(job_id) if isinstance(job_id, str) else job_id, "queue": self.name},
+            {"payload": 0},
+        )
+        if doc is None:
+            return None
+        return {
+            "job_id": str(doc["_id"]),
+            "queue": doc["queue"],
+            "status": doc["status"],
+            "attempts": doc.get("attempts", 0),
+            "progress": doc.get("progress"),
+            "last_error": doc.get("last_error"),
+            "enqueued_at": doc.get("enqueued_at"),
+            "completed_at": doc.get("completed_at"),
+        }
+
+    def qsize(self) -> int:
+        return jobs_collection().count_documents({"queue": self.name, "status": STATUS_PENDING})
+
+    def stats(self) -> Dict[str, Any]:
+        coll = jobs_collection()
+        counts = {
+            row["_id"]: row["n"]
+            for row in coll.aggregate([
+                {"$match": {"queue": self.name}},
+                {"$group": {"_id": "$status", "n": {"$sum": 1}}},
+            ])
+        }
+        oldest = coll.find_one(
+            {"queue": self.name, "status": STATUS_PENDING}, {"enqueued_at": 1}, sort=[("enqueued_at", ASCENDING)]
+        )
+        lags = sorted(self._lags)
+        return {
+            "queue": self.name,
+            "pending": counts.get(STATUS_PENDING, 0),
+            "leased": counts.get(STATUS_LEASED, 0),
+            "done": counts.get(STATUS_DONE, 0),
+            "dead": counts.get(STATUS_DEAD, 0),
+            "oldest_pending_age_seconds": (
+                (_now() - _as_utc(oldest["enqueued_at"])).total_seconds() if oldest else 0.0
+            ),
+            # Enqueue -> completion, over the last completions seen by this process
+            "lag_seconds": {
+                "samples": len(lags),
+                "p50": statistics.median(lags) if lags else None,
+                "p95": lags[max(0, int(len(lags) * 0.95) - 1)] if lags else None,
+                "max": lags[-1] if lags else None,
+            },
+            "counters": dict(self.counters),
+        }
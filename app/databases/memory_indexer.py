@@ -1,13 +1,20 @@
 
 # app/databases/memory_indexer.py
-from typing import List
+from typing import Callable, List, Optional
 from datetime import datetime, timezone
+from collections import deque
+from itertools import islice
+import asyncio
 import hashlib
-import pymongo
-from sentence_transformers import SentenceTransformer
-from app.config import muse_config, MONGO_URI, MONGO_DB, MONGO_CONVERSATION_COLLECTION, MONGO_MEMORY_COLLECTION, QDRANT_MEMORY_COLLECTION, SENTENCE_TRANSFORMER_MODEL
+import time
+from pymongo import UpdateOne
+from app.config import muse_config, MONGO_URI, MONGO_DB, MONGO_CONVERSATION_COLLECTION, MONGO_MEMORY_COLLECTION, QDRANT_MEMORY_COLLECTION, SENTENCE_TRANSFORMER_MODEL, \
+    QDRANT_CONVERSATION_COLLECTION, INDEX_WRITE_BEHIND_MAX_BATCH, INDEX_WRITE_BEHIND_MAX_WAIT_MS
 from app.core import utils
 from app.databases import qdrant_connector, graphdb_connector
+from app.databases.connection_manager import connections
+from app.api.queues import index_queue
+from app.services.embeddings import encode_stored_many_async
 
 def assign_message_id(msg, filename=None, index=None):
     # Convert timestamp to ISO string if it's a datetime
@@ -26,19 +33,107 @@ def assign_message_id(msg, filename=None, index=None):
 
 
 
-async def build_index(dryrun=False, message_id=None):
+# Only the fields the Qdrant payload needs; message docs can carry large auto_tags etc.
+MESSAGE_INDEX_PROJECTION = {
+    "_id": 1,
+    "message_id": 1,
+    "timestamp": 1,
+    "role": 1,
+    "source": 1,
+    "message": 1,
+    "metadata.author_id": 1,
+    "metadata.author_name": 1,
+    "metadata.server": 1,
+    "metadata.channel": 1,
+    "metadata.modality_hint": 1,
+    "user_tags": 1,
+    "is_private": 1,
+    "is_hidden": 1,
+    "is_deleted": 1,
+    "project_id": 1,
+    "thread_ids": 1,
+    "remembered": 1,
+}
+
+
+def _report_progress(label, processed, total, started):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    of_total = f"/{total}" if total is not None else ""
+    print(f"[{label}] {processed}{of_total} processed ({processed / elapsed:.1f} docs/s)")
+
+
+def _iter_message_pages(coll, mongo_query, page_size):
+    """
+    Yield pages of message docs in _id order. Each page is its own query
+    (keyed on the last _id seen), so long runs never hold a cursor open
+    while we encode and upsert.
+    """
+    last_id = None
+    while True:
+        page_query = mongo_query if last_id is None else {"$and": [mongo_query, {"_id": {"$gt": last_id}}]}
+        page = list(coll.find(page_query, MESSAGE_INDEX_PROJECTION).sort("_id", 1).limit(page_size))
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]["_id"]
+
+
+async def _index_message_page(coll, page, dryrun):
+    docs = []
+    for doc in page:
+        if not doc.get("message_id"):
+            print(f"Skipping message without message_id: {doc.get('_id')}")
+            continue
+        docs.append(doc)
+    if not docs or dryrun:
+        return len(docs)
+
+    # ---- Qdrant update ----
+    texts = [doc.get("message") or "" for doc in docs]
+    collection = QDRANT_CONVERSATION_COLLECTION
+    vectors = await encode_stored_many_async(texts, model_name=qdrant_connector.collection_model(collection))
+    qdrant_connector.upsert_messages(docs, vectors, collection=collection)
+
+    # Dual-write while an embedding model migration is open
+    shadow = qdrant_connector.shadow_target(collection)
+    if shadow is not None:
+        shadow_collection, shadow_model = shadow
+        shadow_vectors = await encode_stored_many_async(texts, model_name=shadow_model)
+        qdrant_connector.upsert_messages(docs, shadow_vectors, collection=shadow_collection)
+
+    # ---- Mark as indexed ----
+    now = datetime.now(timezone.utc)
+    coll.bulk_write(
+        [UpdateOne({"_id": doc["_id"]}, {"$set": {"indexed_on": now}}) for doc in docs],
+        ordered=False,
+    )
+    return len(docs)
+
+
+async def build_index(dryrun=False, message_id=None, reindex_all=False, page_size=qdrant_connector.BATCH_SIZE,
+                      message_ids=None):
     """
     Indexes messages from Mongo to Qdrant.
     - If message_id is given, only update that message.
+    - If message_ids is given, update just those (used by the write-behind indexer).
     - If not, updates all messages that are new or changed.
+    - reindex_all re-upserts every message (e.g. after losing the Qdrant volume).
+    Works a page at a time: one encode, one Qdrant upsert and one Mongo bulk_write per page.
+    Vectors come from the on-disk embedding store when the text was seen before.
     """
-    client = pymongo.MongoClient(MONGO_URI)
+    client = connections.mongo(MONGO_URI)
     coll = client[MONGO_DB][MONGO_CONVERSATION_COLLECTION]
     #mg = graphdb_connector.get_graphdb_connector().mg
 
     # Build the query
     if message_id:
         mongo_query = {"message_id": message_id}
+    elif message_ids:
+        mongo_query = {"message_id": {"$in": list(message_ids)}}
+    elif reindex_all:
+        mongo_query = {}
     else:
         mongo_query = {
             "$or": [
@@ -55,136 +150,253 @@ async def build_index(dryrun=False, message_id=None):
     updated_qdrant = 0
     updated_graphdb = 0
 
-    print(f"Starting indexing... (message_id={message_id or 'ALL/NEW'})")
-    model = SentenceTransformer(
-        SENTENCE_TRANSFORMER_MODEL,
-        local_files_only=True
-    )
-    for doc in coll.find(mongo_query):
-        msg_id = doc.get("message_id")
-        if not msg_id:
-            print(f"Skipping message without message_id: {doc.get('_id')}")
-            continue
-
-        # ---- Qdrant update ----
-        qdrant_entry = dict(doc)
-        if not dryrun:
-            text = qdrant_entry["message"]  # Get the message text
-            vector = model.encode([text])[0]  # Generate the embedding vector
-            qdrant_connector.upsert_single(qdrant_entry, vector)  # Upsert to Qdrant
-        updated_qdrant += 1
-
-        # ---- Mark as indexed ----
-        if not dryrun:
-            coll.update_one(
-                {"_id": doc["_id"]},
-                {"$set": {"indexed_on": datetime.now(timezone.utc)}}
-            )
-        total += 1
+    target = message_id or (f"{len(message_ids)} ids" if message_ids else "ALL/NEW")
+    print(f"Starting indexing... (message_id={target})")
+    expected = None if (message_id or message_ids) else coll.count_documents(mongo_query)
+    started = time.perf_counter()
+    for page in _iter_message_pages(coll, mongo_query, page_size):
+        updated_qdrant += await _index_message_page(coll, page, dryrun)
+        total += len(page)
+        if expected is not None:
+            _report_progress("build_index", total, expected, started)
 
     utils.write_system_log(level="debug", module="databases", component="graphdb", function="build_index", action="index_complete",
-                     processed=total, qdrant_indexed=updated_qdrant, graphd_indexed=updated_graphdb, dryrun=dryrun, message_id=message_id)
+                     processed=total, qdrant_indexed=updated_qdrant, graphd_indexed=updated_graphdb, dryrun=dryrun, message_id=message_id or target)
 
     print(f"Indexing complete. Processed {total}. Qdrant updated: {updated_qdrant}. GraphDB updated: {updated_graphdb}.")
 
 
-async def build_memory_index(dryrun=False, entry_id=None):
+class IndexWriteBehind:
+    """
+    Write-behind indexing for freshly logged messages.
+
+    log_message stores the message and hands its id to enqueue(), which
+    puts an index job on the durable index_queue and returns at once. A
+    worker task on the caller's event loop claims jobs for up to
+    `max_wait_ms` (or until `max_batch` are claimed) and indexes the whole
+    batch with one build_index call.
+
+    Nothing is lost if indexing fails or the process dies: a failed batch is
+    retried job by job through the queue's backoff and dead-letter path, and
+    jobs leased by a dead worker are re-claimed once their lease runs out.
+    Other producers of index_queue (file imports, project moves) are
+    batched the same way.
+    """
+
+    def __init__(self, queue, max_batch: int = INDEX_WRITE_BEHIND_MAX_BATCH, max_wait_ms: float = INDEX_WRITE_BEHIND_MAX_WAIT_MS):
+        self.queue = queue
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._task: asyncio.Task | None = None
+        self._loop = None
+        self._waits = deque(maxlen=1000)
+        self.stats = {"enqueued": 0, "indexed": 0, "failed": 0, "batches": 0, "max_batch": 0}
+
+    def start(self):
+        """
+        Start the worker on the running loop (idempotent). Call at startup so
+        jobs left over from a previous run are picked up without a new enqueue().
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._task = loop.create_task(self._run())
+
+    def enqueue(self, message_id: str):
+        self.start()
+        self.queue.put_nowait(message_id)
+        self.stats["enqueued"] += 1
+
+    async def _run(self):
+        while True:
+            batch = await self.queue.get_batch(self.max_batch, self.max_wait)
+            await self._index_batch(batch)
+
+    async def _index_batch(self, batch):
+        try:
+            await build_index(message_ids=list(dict.fromkeys(job.payload for job in batch)))
+        except Exception as e:
+            utils.write_system_log(level="error", module="databases", component="qdrant", function="IndexWriteBehind",
+                                   action="batch_failed", error=str(e), batch_size=len(batch))
+            # Index one by one, so a single bad message can't dead-letter the rest with it
+            for job in batch:
+                await self._index_one(job)
+            return
+
+        for job in batch:
+            await asyncio.to_thread(self.queue.ack, job)
+        self._record(batch)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+
+    async def _index_one(self, job):
+        try:
+            await build_index(message_id=job.payload)
+        except Exception as e:
+            outcome = await asyncio.to_thread(self.queue.fail, job, e)
+            self.stats["failed"] += 1
+            utils.write_system_log(level="error", module="databases", component="qdrant", function="IndexWriteBehind",
+                                   action="index_failed", error=str(e), message_id=str(job.payload),
+                                   attempt=job.attempts, outcome=outcome)
+            return
+        await asyncio.to_thread(self.queue.ack, job)
+        self._record([job])
+
+    def _record(self, jobs):
+        # Time-to-searchable: from the job being queued to the point being in Qdrant
+        done = datetime.now(timezone.utc)
+        waits_ms = [(done - job.enqueued_at).total_seconds() * 1000 for job in jobs]
+        self._waits.extend(waits_ms)
+        self.stats["indexed"] += len(jobs)
+        utils.write_system_log(level="debug", module="databases", component="qdrant", function="IndexWriteBehind",
+                               action="batch_indexed", batch_size=len(jobs),
+                               max_wait_ms=round(max(waits_ms), 1), avg_wait_ms=round(sum(waits_ms) / len(waits_ms), 1))
+
+    def time_to_searchable(self):
+        waits = sorted(self._waits)
+        if not waits:
+            return {"samples": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+        return {
+            "samples": len(waits),
+            "p50_ms": round(waits[len(waits) // 2], 1),
+            "p95_ms": round(waits[max(0, int(len(waits) * 0.95) - 1)], 1),
+            "max_ms": round(waits[-1], 1),
+        }
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            "pending": self.queue.qsize(),
+            "max_batch_size": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "time_to_searchable": self.time_to_searchable(),
+        }
+
+
+index_write_behind = IndexWriteBehind(index_queue)
+
+
+# Flattens one unwound layer entry into the shape _index_memory_page expects
+MEMORY_ENTRY_PROJECTION = {
+    "_id": 0,
+    "layer_id": "$id",
+    "project_id": "$project_id",
+    "entry_id": "$entries.id",
+    "text": "$entries.text",
+    "is_deleted": "$entries.is_deleted",
+    "is_pinned": "$entries.is_pinned",
+    "updated_on": "$entries.updated_on",
+    "created_on": "$entries.created_on",
+    "indexed_on": "$entries.indexed_on"
+}
+
+
+async def _index_memory_page(coll, page, dryrun):
+    entries = []
+    for entry in page:
+        mem_id = entry.get("entry_id") or entry.get("id")
+        if not mem_id:
+            continue
+        if not dryrun and not entry.get("text"):
+            continue
+        entries.append((mem_id, entry))
+    if not entries or dryrun:
+        return len(entries)
+
+    # Generate embeddings for the whole page at once
+    vectors = await encode_stored_many_async([e["text"] for _, e in entries], model_name=SENTENCE_TRANSFORMER_MODEL)
+
+    # Metadata with layer_id included
+    metadatas = [
+        {
+            "entry_id": mem_id,
+            "layer_id": entry.get("layer_id"),
+            "project_id": qdrant_connector.safe_str(entry.get("project_id")),
+            "is_deleted": entry.get("is_deleted"),
+            "is_pinned": entry.get("is_pinned"),
+            "updated_on": entry.get("updated_on"),
+            "created_on": entry.get("created_on"),
+            "text": entry.get("text"),
+        }
+        for mem_id, entry in entries
+    ]
+    point_ids = [qdrant_connector.message_id_to_uuid(mem_id) for mem_id, _ in entries]
+    qdrant_connector.upsert_embeddings(vectors, metadatas, point_ids, collection=QDRANT_MEMORY_COLLECTION)
+
+    # Update nested entry timestamps
+    now = datetime.now(timezone.utc)
+    coll.bulk_write(
+        [
+            UpdateOne(
+                {"id": entry["layer_id"], "entries.id": mem_id},
+                {"$set": {"entries.$.indexed_on": now}},
+            )
+            for mem_id, entry in entries
+        ],
+        ordered=False,
+    )
+    return len(entries)
+
+
+async def build_memory_index(dryrun=False, entry_id=None, reindex_all=False, page_size=qdrant_connector.BATCH_SIZE):
     """
     Indexes memory entries from Mongo to Qdrant.
     - If entry_id is given, only update that entry.
     - If not, updates all entries that are new or changed.
+    - reindex_all re-upserts every entry (e.g. after losing the Qdrant volume).
+    Entries are encoded, upserted and stamped a page at a time.
     """
-    client = pymongo.MongoClient(MONGO_URI)
+    client = connections.mongo(MONGO_URI)
     coll = client[MONGO_DB][MONGO_MEMORY_COLLECTION]  # your memory layer collection
     total = 0
     updated_qdrant = 0
 
     # Build the query
     if entry_id:
-        # Direct lookup: find the root doc and filter its entries in Python
-        doc = coll.find_one({"entries.id": entry_id, "type": {"$in": ["layer", "project_layer"]}})
+        # Direct lookup: fetch only the matching entry from its root doc
+        doc = coll.find_one(
+            {"entries.id": entry_id, "type": {"$in": ["layer", "project_layer"]}},
+            {"id": 1, "project_id": 1, "entries": {"$elemMatch": {"id": entry_id}}},
+        )
         if not doc:
             return
 
         # Pull the matching entry/entries
-        entries = [e for e in doc["entries"] if e["id"] == entry_id]
+        entries = [e for e in doc.get("entries", []) if e["id"] == entry_id]
 
         # Enrich them so they match what the aggregation pipeline would emit
         for e in entries:
             e["layer_id"] = doc["id"]  # carry down the layer ID
             e["project_id"] = doc.get("project_id")  # carry down project ID if present
+        entries = iter(entries)
     else:
         # Aggregation pipeline for all entries needing reindex
+        stale_match = {} if reindex_all else {
+            "$or": [
+                {"entries.indexed_on": {"$exists": False}},
+                {"$expr": {"$gt": ["$entries.updated_on", "$entries.indexed_on"]}}
+            ]
+        }
         pipeline = [
             {"$match": {"type": {"$in": ["layer", "project_layer"]}}},
+            {"$project": {"id": 1, "project_id": 1, "entries": 1}},
             {"$unwind": "$entries"},
-            {"$match": {
-                "$or": [
-                    {"entries.indexed_on": {"$exists": False}},
-                    {"$expr": {"$gt": ["$entries.updated_on", "$entries.indexed_on"]}}
-                ]
-            }},
-            {"$project": {
-                "layer_id": "$id",
-                "project_id": "$project_id",
-                "entry_id": "$entries.id",
-                "text": "$entries.text",
-                "is_deleted": "$entries.is_deleted",
-                "is_pinned": "$entries.is_pinned",
-                "updated_on": "$entries.updated_on",
-                "created_on": "$entries.created_on",
-                "indexed_on": "$entries.indexed_on"
-            }}
+            {"$match": stale_match},
+            {"$project": MEMORY_ENTRY_PROJECTION}
         ]
-        entries = coll.aggregate(pipeline)
+        entries = coll.aggregate(pipeline, batchSize=page_size)
 
     print(f"Starting memory indexing... (entry_id={entry_id or 'ALL/NEW'})")
 
-    model = SentenceTransformer(
-        SENTENCE_TRANSFORMER_MODEL,
-        local_files_only=True
-    )
-    for entry in entries:
-        mem_id = entry.get("entry_id") or entry.get("id")
-        if not mem_id:
-            continue
-
-        if not dryrun:
-            text = entry.get("text")
-            if not text:
-                continue
-
-            # Generate embedding
-            vector = model.encode([text])[0]
-
-            # Metadata with layer_id included
-            metadata = {
-                "entry_id": mem_id,
-                "layer_id": entry.get("layer_id"),
-                "project_id": qdrant_connector.safe_str(entry.get("project_id")),
-                "is_deleted": entry.get("is_deleted"),
-                "is_pinned": entry.get("is_pinned"),
-                "updated_on": entry.get("updated_on"),
-                "created_on": entry.get("created_on"),
-                "text": text,
-            }
-            point_id = qdrant_connector.message_id_to_uuid(mem_id)
-            qdrant_connector.upsert_embedding(
-                vector=vector,
-                metadata=metadata,
-                collection=QDRANT_MEMORY_COLLECTION,
-                point_id=point_id
-            )
-
-        updated_qdrant += 1
-
-        if not dryrun:
-            # Update nested entry timestamp
-            coll.update_one(
-                {"id": entry["layer_id"], "entries.id": mem_id},
-                {"$set": {"entries.$.indexed_on": datetime.now(timezone.utc)}}
-            )
-        total += 1
+    started = time.perf_counter()
+    while True:
+        page = list(islice(entries, page_size))
+        if not page:
+            break
+        updated_qdrant += await _index_memory_page(coll, page, dryrun)
+        total += len(page)
+        if not entry_id:
+            _report_progress("build_memory_index", total, None, started)
 
     utils.write_system_log(
         level="debug", module="databases", component="qdrant", function="build_memory_index",
@@ -194,45 +406,30 @@ async def build_memory_index(dryrun=False, entry_id=None):
 
     print(f"Memory indexing complete. Processed {total}. Qdrant updated: {updated_qdrant}.")
 
-async def update_qdrant_metadata_for_messages(message_ids: List[str]):
-    """
-    For the given message_ids:
-    - Read current metadata fields from Mongo
-    - Update payload in Qdrant (no re-embedding)
-    - Bump indexed_on in Mongo
-    """
-    if not message_ids:
-        return 0
-
-    client = pymongo.MongoClient(MONGO_URI)
-    coll = client[MONGO_DB][MONGO_CONVERSATION_COLLECTION]
-
-    cursor = coll.find(
-        {"message_id": {"$in": message_ids}},
-        {
-            "_id": 0,
-            "message_id": 1,
-            "user_tags": 1,
-            "is_private": 1,
-            "is_hidden": 1,
-            "is_deleted": 1,
-            "project_id": 1,
-            "remembered": 1,
-            "thread_ids": 1,
-            # include anything else you want mirrored into Qdrant payload
-        },
-    )
-
-    docs = list(cursor)
+METADATA_PROJECTION = {
+    "_id": 0,
+    "message_id": 1,
+    "user_tags": 1,
+    "is_private": 1,
+    "is_hidden": 1,
+    "is_deleted": 1,
+    "project_id": 1,
+    "remembered": 1,
+    "thread_ids": 1,
+    # include anything else you want mirrored into Qdrant payload
+}
+
+
+def _sync_metadata_page(coll, message_ids: List[str]) -> int:
+    docs = list(coll.find({"message_id": {"$in": message_ids}}, METADATA_PROJECTION))
     if not docs:
         return 0
 
     updates = []
     for doc in docs:
-        msg_id = doc["message_id"]
-
+        # message_id is already on the point; leaving it out lets messages
+        # that end up with the same tags/flags share one payload operation
         payload = {
-            "message_id": msg_id,
             "user_tags": doc.get("user_tags", []),
             "is_private": doc.get("is_private", False),
             "is_hidden": doc.get("is_hidden", False),
@@ -241,21 +438,46 @@ async def update_qdrant_metadata_for_messages(message_ids: List[str]):
             "remembered": doc.get("remembered", False),
             "thread_ids": doc.get("thread_ids", []),
         }
+        updates.append({"message_id": doc["message_id"], "payload": payload})
 
-        updates.append({
-            "message_id": msg_id,
-            "payload": payload,
-        })
-
-    # Qdrant: payload-only update
+    # Qdrant: payload-only update, grouped by payload
     qdrant_connector.update_payload_for_messages(updates)
 
     # Mongo: bump indexed_on
-    now = datetime.now(timezone.utc)
     coll.update_many(
-        {"message_id": {"$in": message_ids}},
-        {"$set": {"indexed_on": now}},
+        {"message_id": {"$in": [u["message_id"] for u in updates]}},
+        {"$set": {"indexed_on": datetime.now(timezone.utc)}},
     )
-    print(f"Metadata Indexed for: {message_ids}")
+    return len(updates)
+
+
+async def update_qdrant_metadata_for_messages(
+    message_ids: List[str],
+    page_size: int = qdrant_connector.BATCH_SIZE * 4,
+    progress: Optional[Callable[[int, int], None]] = None,
+):
+    """
+    For the given message_ids:
+    - Read current metadata fields from Mongo
+    - Update payload in Qdrant (no re-embedding)
+    - Bump indexed_on in Mongo
+    Works through the ids a page at a time off the event loop, calling
+    progress(done, total) after each page.
+    """
+    if not message_ids:
+        return 0
+
+    client = connections.mongo(MONGO_URI)
+    coll = client[MONGO_DB][MONGO_CONVERSATION_COLLECTION]
 
-    return len(updates)
\ No newline at end of file
+    total = len(message_ids)
+    updated = 0
+    started = time.perf_counter()
+    for i in range(0, total, page_size):
+        page = message_ids[i:i + page_size]
+        updated += await asyncio.to_thread(_sync_metadata_page, coll, page)
+        if progress is not None:
+            progress(min(i + page_size, total), total)
+
+    print(f"Metadata indexed for {updated}/{total} messages in {time.perf_counter() - started:.2f}s")
+    return updated
\ No newline at end of file
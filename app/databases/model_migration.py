@@ -0,0 +1,212 @@
+# app/databases/model_migration.py
+"""
+Zero-downtime embedding model migration for the conversation collection.
+
+QDRANT_CONVERSATION_COLLECTION is served through a Qdrant alias of the same
+name, over one physical collection per model ("<alias>__<model>__<stamp>").
+Every reader and writer keeps using the alias name; flipping the alias is
+one atomic update_collection_aliases call.
+
+  start     create the new collection (new dimension if needed); from now on
+            the indexer writes every message to both collections
+  backfill  embed all existing messages with the new model into it (resumable)
+  flip      point the alias at the new collection; writes keep reaching the
+            old one, so rollback loses nothing
+  rollback  point the alias back at the old collection
+  finish    stop dual-writing (optionally drop the old collection)
+  abort     drop the new collection before flipping
+
+The state doc lives in muse_model_migrations (see
+qdrant_connector.get_model_migration); every process picks up a change
+within MIGRATION_STATE_TTL_SECONDS. Query vectors are embedded with whichever
+model the alias currently serves, so search needs no restart.
+
+A deployment that predates aliases has a physical collection under the alias
+name. The first flip has to delete it before the alias can take the name
+(flip --drop-legacy); that first flip cannot be rolled back.
+"""
+import re
+import time
+from datetime import datetime, timezone
+from qdrant_client.http import models as qmodels
+from app.config import MONGO_URI, MONGO_DB, MONGO_SYSTEM_DB, MONGO_CONVERSATION_COLLECTION, QDRANT_CONVERSATION_COLLECTION
+from app.databases import qdrant_connector, memory_indexer
+from app.databases.connection_manager import connections
+from app.services.embeddings import embedding_dimension, encode_stored_many_async
+
+ACTIVE_STATUSES = {"building", "ready", "flipped"}
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _state_coll():
+    return connections.mongo_db(MONGO_SYSTEM_DB)[qdrant_connector.MODEL_MIGRATIONS_COLLECTION]
+
+
+def _state(alias: str) -> dict:
+    return qdrant_connector.get_model_migration(alias, refresh=True)
+
+
+def _set_state(alias: str, **fields):
+    _state_coll().update_one({"_id": alias}, {"$set": {**fields, "updated_on": _now()}})
+    qdrant_connector.get_model_migration(alias, refresh=True)
+
+
+def _require(alias: str, *statuses) -> dict:
+    state = _state(alias)
+    if not state or state["status"] not in statuses:
+        current = state["status"] if state else "none"
+        raise ValueError(f"Migration for {alias} is '{current}'; this step needs one of: {', '.join(statuses)}")
+    return state
+
+
+def _collection_name(alias: str, model_name: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", model_name.split("/")[-1]).strip("_").lower()
+    return f"{alias}__{slug}__{_now().strftime('%Y%m%d%H%M')}"
+
+
+def start(new_model: str, alias: str = QDRANT_CONVERSATION_COLLECTION) -> dict:
+    state = _state(alias)
+    if state and state["status"] in ACTIVE_STATUSES:
+        raise ValueError(f"A migration for {alias} is already {state['status']} (to {state['new_model']})")
+
+    old_model = qdrant_connector.collection_model(alias)
+    # Same model is allowed once, to rebuild a collection that predates the BM25 sparse vector
+    if new_model == old_model and qdrant_connector.has_sparse_vectors(alias):
+        raise ValueError(f"{alias} is already embedded with {new_model}")
+    target = qdrant_connector.resolve_alias(alias)
+    legacy = target is None
+    old_collection = target or alias
+    new_collection = _collection_name(alias, new_model)
+
+    # The physical name has no profile or index spec of its own; it serves the alias
+    qdrant_connector.ensure_qdrant_collection(
+        embedding_dimension(new_model), new_collection,
+        profile_name=qdrant_connector.COLLECTION_PROFILE_ASSIGNMENTS.get(alias),
+    )
+    qdrant_connector.ensure_payload_indexes(new_collection, indexes_from=alias)
+    doc = {
+        "_id": alias,
+        "status": "building",
+        "old_model": old_model,
+        "old_collection": old_collection,
+        "new_model": new_model,
+        "new_collection": new_collection,
+        "legacy": legacy,
+        "backfill_last_id": None,
+        "backfilled": 0,
+        "started_on": _now(),
+        "updated_on": _now(),
+    }
+    _state_coll().replace_one({"_id": alias}, doc, upsert=True)
+    qdrant_connector.get_model_migration(alias, refresh=True)
+    return doc
+
+
+async def backfill(alias: str = QDRANT_CONVERSATION_COLLECTION, page_size: int = qdrant_connector.BATCH_SIZE) -> int:
+    """
+    Embed every conversation message with the new model into the new
+    collection. Progress is saved per page, so an interrupted backfill resumes.
+    Messages logged meanwhile are dual-written by the indexer already.
+    """
+    state = _require(alias, "building", "ready")
+    coll = connections.mongo(MONGO_URI)[MONGO_DB][MONGO_CONVERSATION_COLLECTION]
+    query = {"_id": {"$gt": state["backfill_last_id"]}} if state.get("backfill_last_id") else {}
+    total = coll.count_documents(query)
+    done = 0
+    started = time.perf_counter()
+
+    for page in memory_indexer._iter_message_pages(coll, query, page_size):
+        docs = [d for d in page if d.get("message_id")]
+        if docs:
+            vectors = await encode_stored_many_async(
+                [d.get("message") or "" for d in docs], model_name=state["new_model"]
+            )
+            qdrant_connector.upsert_messages(docs, vectors, collection=state["new_collection"])
+        done += len(page)
+        _state_coll().update_one(
+            {"_id": alias},
+            {"$set": {"backfill_last_id": page[-1]["_id"], "updated_on": _now()}, "$inc": {"backfilled": len(docs)}},
+        )
+        memory_indexer._report_progress("backfill", done, total, started)
+
+    _set_state(alias, status="ready", backfilled_on=_now())
+    return done
+
+
+def flip(alias: str = QDRANT_CONVERSATION_COLLECTION, drop_legacy: bool = False, force: bool = False) -> dict:
+    state = _require(alias, "ready", "building") if force else _require(alias, "ready")
+    new_collection = state["new_collection"]
+
+    if qdrant_connector.resolve_alias(alias) is None and alias in qdrant_connector.existing_collection_names():
+        # Pre-alias deployment: a physical collection holds the alias name
+        if not drop_legacy:
+            raise ValueError(
+                f"{alias} is a physical collection, not an alias. Flipping deletes it, so rollback "
+                f"will not be possible for this migration; re-run with drop_legacy to proceed."
+            )
+        qdrant_connector.drop_collection(alias)
+        qdrant_connector.qdrant.update_collection_aliases(change_aliases_operations=[
+            qmodels.CreateAliasOperation(create_alias=qmodels.CreateAlias(
+                collection_name=new_collection, alias_name=alias
+            )),
+        ])
+        _set_state(alias, status="flipped", flipped_on=_now(), legacy_dropped=True)
+    else:
+        _swap_alias(alias, new_collection)
+        _set_state(alias, status="flipped", flipped_on=_now())
+    return _state(alias)
+
+
+def rollback(alias: str = QDRANT_CONVERSATION_COLLECTION) -> dict:
+    state = _require(alias, "flipped")
+    if state.get("legacy_dropped"):
+        raise ValueError(f"The previous collection behind {alias} was deleted on flip; nothing to roll back to")
+    _swap_alias(alias, state["old_collection"])
+    # Back to serving the old model with the new one shadowed, ready to flip again
+    _set_state(alias, status="ready", rolled_back_on=_now())
+    return _state(alias)
+
+
+def finish(alias: str = QDRANT_CONVERSATION_COLLECTION, drop_old: bool = False) -> dict:
+    state = _require(alias, "flipped")
+    _set_state(alias, status="done", finished_on=_now())
+    if drop_old and not state.get("legacy_dropped"):
+        qdrant_connector.drop_collection(state["old_collection"])
+    return _state(alias)
+
+
+def abort(alias: str = QDRANT_CONVERSATION_COLLECTION) -> dict:
+    state = _require(alias, "building", "ready")
+    _set_state(alias, status="aborted", aborted_on=_now())
+    qdrant_connector.drop_collection(state["new_collection"])
+    return _state(alias)
+
+
+def status(alias: str = QDRANT_CONVERSATION_COLLECTION) -> dict:
+    state = _state(alias) or {"_id": alias, "status": "none"}
+    state = dict(state)
+    state["alias_target"] = qdrant_connector.resolve_alias(alias)
+    state["serving_model"] = qdrant_connector.collection_model(alias)
+    existing = qdrant_connector.existing_collection_names()
+    for key in ("old_collection", "new_collection"):
+        name = state.get(key)
+        if key == "old_collection" and state.get("legacy_dropped"):
+            continue
+        if name and name in existing:
+            state[f"{key}_points"] = qdrant_connector.qdrant.count(name).count
+    return state
+
+
+def _swap_alias(alias: str, collection_name: str):
+    # Delete + create in one request: Qdrant applies alias operations atomically
+    operations = []
+    if qdrant_connector.resolve_alias(alias) is not None:
+        operations.append(qmodels.DeleteAliasOperation(delete_alias=qmodels.DeleteAlias(alias_name=alias)))
+    operations.append(qmodels.CreateAliasOperation(create_alias=qmodels.CreateAlias(
+        collection_name=collection_name, alias_name=alias
+    )))
+    qdrant_connector.qdrant.update_collection_aliases(change_aliases_operations=operations)
+
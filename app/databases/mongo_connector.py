@@ -1,16 +1,18 @@
 # app/databases/mongo_connector.py
 from typing import Optional, Dict, Any
-from pymongo import MongoClient, ASCENDING, ReturnDocument
+from pymongo import ASCENDING, ReturnDocument
 from pymongo.database import Database
 from pymongo.collection import Collection
 from datetime import datetime
 from app.config import MONGO_URI, MONGO_DB, MONGO_SYSTEM_DB
+from app.databases.connection_manager import connections
 
 
 
 class MongoConnector:
     def __init__(self, uri, db_name=MONGO_DB):
-        self.client = MongoClient(uri)
+        # Shared client: mongo and mongo_system ride on the same pool
+        self.client = connections.mongo(uri)
         self.db = self.client[db_name]
         # Example: self.db['muse_log']
 
@@ -1,24 +1,528 @@
 from typing import Sequence, List, Dict, Any
-from qdrant_client import QdrantClient
+from collections import OrderedDict
+import hashlib, json, re, threading, time
 from qdrant_client.http import models as qmodels
 from qdrant_client import models as rest
-from sentence_transformers import SentenceTransformer
 import uuid, bson
-from app.config import muse_config, QDRANT_HOST, QDRANT_PORT, QDRANT_CONVERSATION_COLLECTION, SENTENCE_TRANSFORMER_MODEL
+from datetime import datetime, timezone
+from dateutil import parser as date_parser
+from app.config import muse_config, QDRANT_HOST, QDRANT_PORT, QDRANT_CONVERSATION_COLLECTION, SENTENCE_TRANSFORMER_MODEL, \
+    QUERY_VECTOR_CACHE_SIZE, QUERY_VECTOR_CACHE_TTL_SECONDS, QDRANT_MEMORY_COLLECTION, QDRANT_ENTITY_COLLECTION, \
+    QDRANT_JOURNAL_COLLECTION, QDRANT_CONVERSATION_PROFILE, QDRANT_MEMORY_PROFILE, QDRANT_ENTITY_PROFILE, \
+    QDRANT_JOURNAL_PROFILE, MONGO_SYSTEM_DB, RECENT_VECTOR_CACHE_SIZE
+from app.services.embeddings import embedding_batcher
+from app.services.sparse_vectors import SPARSE_VECTOR_NAME, encode_document, encode_query
+from app.databases.connection_manager import connections
+from app.databases.cache_versions import index_generation
 
 BATCH_SIZE = 128  # or 256 if the entries are tiny
-model = SentenceTransformer(SENTENCE_TRANSFORMER_MODEL)
+PAYLOAD_OPS_PER_REQUEST = 64
 
-# Qdrant client connection
-qdrant = QdrantClient(
-    host=QDRANT_HOST,  # Replace with actual host if remote
-    port=int(QDRANT_PORT)
-)
+# Qdrant client connection (shared pool, see connection_manager)
+qdrant = connections.qdrant(QDRANT_HOST, QDRANT_PORT)
 
 
 def get_qdrant_client():
     return qdrant
 
+
+# --------------------------
+# Collection profiles
+# --------------------------
+# Each profile decides how a collection stores and searches its vectors:
+#   quantization: None | "scalar" (int8) | "binary"
+#   on_disk:      keep original float32 vectors on disk (mmap); quantized copies stay in RAM
+#   hnsw:         m / ef_construct for the graph; hnsw_ef for search
+#   oversampling: how many extra quantized candidates to rescore with the originals
+COLLECTION_PROFILES = {
+    "plain": {
+        "quantization": None, "on_disk": False,
+        "hnsw": {"m": 16, "ef_construct": 100}, "hnsw_ef": None, "oversampling": None,
+    },
+    "scalar": {
+        "quantization": "scalar", "on_disk": False,
+        "hnsw": {"m": 16, "ef_construct": 100}, "hnsw_ef": 64, "oversampling": 2.0,
+    },
+    "scalar_ondisk": {
+        "quantization": "scalar", "on_disk": True,
+        "hnsw": {"m": 16, "ef_construct": 128}, "hnsw_ef": 96, "oversampling": 2.0,
+    },
+    "binary_ondisk": {
+        "quantization": "binary", "on_disk": True,
+        "hnsw": {"m": 16, "ef_construct": 128}, "hnsw_ef": 128, "oversampling": 3.0,
+    },
+}
+
+COLLECTION_PROFILE_ASSIGNMENTS = {
+    QDRANT_CONVERSATION_COLLECTION: QDRANT_CONVERSATION_PROFILE,
+    QDRANT_MEMORY_COLLECTION: QDRANT_MEMORY_PROFILE,
+    QDRANT_ENTITY_COLLECTION: QDRANT_ENTITY_PROFILE,
+    QDRANT_JOURNAL_COLLECTION: QDRANT_JOURNAL_PROFILE,
+}
+
+
+def get_collection_profile(collection_name: str, profile_name: str | None = None) -> dict:
+    profile_name = profile_name or COLLECTION_PROFILE_ASSIGNMENTS.get(collection_name, "plain")
+    if profile_name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown Qdrant collection profile: {profile_name!r}")
+    return COLLECTION_PROFILES[profile_name]
+
+
+def _quantization_config(profile: dict):
+    if profile["quantization"] == "scalar":
+        return qmodels.ScalarQuantization(
+            scalar=qmodels.ScalarQuantizationConfig(
+                type=qmodels.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+    if profile["quantization"] == "binary":
+        return qmodels.BinaryQuantization(
+            binary=qmodels.BinaryQuantizationConfig(always_ram=True)
+        )
+    return None
+
+
+def get_search_params(collection_name: str):
+    profile = get_collection_profile(collection_name)
+    quantization = None
+    if profile["quantization"]:
+        quantization = qmodels.QuantizationSearchParams(
+            rescore=True, oversampling=profile["oversampling"]
+        )
+    if quantization is None and profile["hnsw_ef"] is None:
+        return None
+    return qmodels.SearchParams(hnsw_ef=profile["hnsw_ef"], quantization=quantization)
+
+
+def apply_collection_profile(collection_name: str, profile_name: str | None = None):
+    """
+    Bring an existing collection in line with its profile. Qdrant rebuilds
+    quantized vectors and moves storage in the background; search keeps working.
+    """
+    profile = get_collection_profile(collection_name, profile_name)
+    quantization = _quantization_config(profile) or qmodels.Disabled.DISABLED
+    qdrant.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": qmodels.VectorParamsDiff(on_disk=profile["on_disk"])},
+        hnsw_config=qmodels.HnswConfigDiff(**profile["hnsw"]),
+        quantization_config=quantization,
+    )
+
+
+# --------------------------
+# Payload indexes
+# --------------------------
+# Every field a search filters on gets an index, so filtered HNSW search
+# stays fast as collections grow. project_id is the tenant key: Qdrant
+# co-locates each project's points, which suits project-focus searches.
+KEYWORD, BOOL, DATETIME, FLOAT = (
+    qmodels.PayloadSchemaType.KEYWORD, qmodels.PayloadSchemaType.BOOL,
+    qmodels.PayloadSchemaType.DATETIME, qmodels.PayloadSchemaType.FLOAT,
+)
+TENANT_KEYWORD = qmodels.KeywordIndexParams(type=qmodels.KeywordIndexType.KEYWORD, is_tenant=True)
+
+PAYLOAD_INDEXES = {
+    QDRANT_CONVERSATION_COLLECTION: {
+        "message_id": KEYWORD,
+        "project_id": TENANT_KEYWORD,
+        "thread_ids": KEYWORD,
+        "user_tags": KEYWORD,
+        "source": KEYWORD,
+        "is_hidden": BOOL,
+        "is_deleted": BOOL,
+        "is_private": BOOL,
+        "remembered": BOOL,
+        "timestamp": DATETIME,
+        "timestamp_epoch": FLOAT,
+    },
+    QDRANT_MEMORY_COLLECTION: {
+        "entry_id": KEYWORD,
+        "layer_id": KEYWORD,
+        "project_id": TENANT_KEYWORD,
+        "is_deleted": BOOL,
+        "is_pinned": BOOL,
+    },
+    QDRANT_ENTITY_COLLECTION: {
+        "entity_type": KEYWORD,
+    },
+    QDRANT_JOURNAL_COLLECTION: {
+        "entry_id": KEYWORD,
+        "entry_type": KEYWORD,
+    },
+}
+
+
+def _schema_type(schema):
+    return schema.type if isinstance(schema, qmodels.KeywordIndexParams) else schema
+
+
+def _index_matches(current: qmodels.PayloadIndexInfo, schema) -> bool:
+    if current.data_type != _schema_type(schema):
+        return False
+    if isinstance(schema, qmodels.KeywordIndexParams):
+        # Every param we ask for must be set on the index, so e.g. a plain
+        # keyword index on project_id gets upgraded to the tenant index
+        params = current.params
+        return params is not None and all(
+            getattr(params, name, None) == value for name, value in schema.model_dump(exclude_none=True).items()
+        )
+    return True
+
+
+def ensure_payload_indexes(collection_name: str, indexes_from: str | None = None) -> List[str]:
+    """
+    Create any payload index from PAYLOAD_INDEXES the collection is missing.
+    `indexes_from` names the PAYLOAD_INDEXES entry to use when it differs from
+    the collection (a physical collection behind an alias). Returns the
+    fields that were created.
+    """
+    wanted = PAYLOAD_INDEXES.get(indexes_from or collection_name)
+    if not wanted:
+        return []
+    existing = qdrant.get_collection(collection_name).payload_schema or {}
+    created = []
+    for field, schema in wanted.items():
+        current = existing.get(field)
+        if current is not None and _index_matches(current, schema):
+            continue
+        if current is not None:
+            # Same field indexed with another type or params (e.g. legacy string
+            # timestamps, project_id before the tenant flag): replace it
+            qdrant.delete_payload_index(collection_name=collection_name, field_name=field)
+        qdrant.create_payload_index(collection_name=collection_name, field_name=field, field_schema=schema)
+        created.append(field)
+    return created
+
+
+def provision_payload_indexes() -> Dict[str, List[str]]:
+    """
+    Startup hook: ensure payload indexes on every configured collection that exists.
+    """
+    existing = existing_collection_names()
+    report = {}
+    for collection_name in PAYLOAD_INDEXES:
+        if collection_name and collection_name in existing:
+            report[collection_name] = ensure_payload_indexes(collection_name)
+    return report
+
+
+# --------------------------
+# Timestamps
+# --------------------------
+def normalize_timestamp(ts):
+    """
+    Mongo hands back datetimes; older payloads carry ISO strings in several
+    shapes, sometimes epoch numbers. Returns (RFC 3339 UTC string, epoch seconds),
+    or (None, None) when ts is empty or unparseable.
+    """
+    if ts is None or ts == "":
+        return None, None
+    try:
+        if isinstance(ts, datetime):
+            dt = ts
+        elif isinstance(ts, (int, float)):
+            # Millisecond epochs show up from JS clients
+            dt = datetime.fromtimestamp(ts / 1000 if ts > 1e11 else ts, tz=timezone.utc)
+        else:
+            text = str(ts).strip()
+            try:
+                dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+            except ValueError:
+                dt = date_parser.parse(text)
+    except (ValueError, OverflowError, OSError, TypeError):
+        return None, None
+    dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+    return dt.isoformat(), dt.timestamp()
+
+
+def timestamp_range_condition(gte=None, lte=None, key: str = "timestamp") -> dict:
+    """
+    Filter condition for a timestamp window against the datetime payload index.
+    Raises ValueError for a bound that isn't a recognisable timestamp, rather
+    than sending Qdrant an open-ended (or null) range.
+    """
+    condition = {"key": key, "range": {}}
+    for name, bound in (("gte", gte), ("lte", lte)):
+        if bound is None:
+            continue
+        normalized = normalize_timestamp(bound)[0]
+        if normalized is None:
+            raise ValueError(f"Invalid timestamp for {key} {name}: {bound!r}")
+        condition["range"][name] = normalized
+    return condition
+
+
+# Points indexed before timestamps were normalized have no timestamp_epoch,
+# which a formula query would read as "now" (full recency weight). A
+# collection is marked once migrate_qdrant_timestamps.py has backfilled it,
+# or when it is created, since every point written since carries the field.
+TIMESTAMP_BACKFILLS_COLLECTION = "muse_timestamp_backfills"
+BACKFILL_STATE_TTL_SECONDS = 60.0
+
+_backfill_state: Dict[str, tuple] = {}
+
+
+def mark_timestamps_backfilled(collection_name: str):
+    connections.mongo_db(MONGO_SYSTEM_DB)[TIMESTAMP_BACKFILLS_COLLECTION].update_one(
+        {"_id": collection_name},
+        {"$setOnInsert": {"backfilled_on": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    _backfill_state[collection_name] = (True, time.monotonic())
+
+
+def timestamps_backfilled(collection_name: str) -> bool:
+    """
+    Whether every point in `collection_name` that has a parseable timestamp
+    also has timestamp_epoch. A "no" is re-read after BACKFILL_STATE_TTL_SECONDS,
+    so a finished migration is picked up without a restart.
+    """
+    cached = _backfill_state.get(collection_name)
+    now = time.monotonic()
+    if cached is not None and (cached[0] or now - cached[1] < BACKFILL_STATE_TTL_SECONDS):
+        return cached[0]
+    try:
+        doc = connections.mongo_db(MONGO_SYSTEM_DB)[TIMESTAMP_BACKFILLS_COLLECTION].find_one({"_id": collection_name})
+    except Exception as e:
+        print(f"[Qdrant] Could not read timestamp backfill state: {e}")
+        return False
+    _backfill_state[collection_name] = (doc is not None, now)
+    return doc is not None
+
+
+# --------------------------
+# Embedding model migrations
+# --------------------------
+# QDRANT_CONVERSATION_COLLECTION can be a Qdrant alias over a physical
+# collection per embedding model (see model_migration.py). While a migration
+# is open, writes go to both collections; the state doc in Mongo says which
+# model the alias currently serves and where the shadow copy lives.
+MODEL_MIGRATIONS_COLLECTION = "muse_model_migrations"
+MIGRATION_STATE_TTL_SECONDS = 2.0
+MIGRATION_SHADOWING = {"building", "ready"}
+MIGRATION_SERVING_NEW = {"flipped", "done"}
+
+_migration_state: Dict[str, tuple] = {}
+
+
+def get_model_migration(alias: str = QDRANT_CONVERSATION_COLLECTION, refresh: bool = False):
+    """
+    Migration state for `alias`, cached briefly so hot paths don't hit Mongo
+    on every call. Other processes see a flip within MIGRATION_STATE_TTL_SECONDS.
+    """
+    cached = _migration_state.get(alias)
+    now = time.monotonic()
+    if not refresh and cached is not None and now - cached[1] < MIGRATION_STATE_TTL_SECONDS:
+        return cached[0]
+    doc = connections.mongo_db(MONGO_SYSTEM_DB)[MODEL_MIGRATIONS_COLLECTION].find_one({"_id": alias})
+    _migration_state[alias] = (doc, now)
+    return doc
+
+
+def collection_model(collection_name: str) -> str:
+    """
+    Embedding model the vectors behind `collection_name` were built with.
+    """
+    if collection_name != QDRANT_CONVERSATION_COLLECTION:
+        return SENTENCE_TRANSFORMER_MODEL
+    state = get_model_migration(collection_name)
+    if not state:
+        return SENTENCE_TRANSFORMER_MODEL
+    return state["new_model"] if state["status"] in MIGRATION_SERVING_NEW else state["old_model"]
+
+
+def shadow_target(collection_name: str):
+    """
+    (collection, model) that writes to `collection_name` must be mirrored
+    into while a migration is open, or None.
+    """
+    if collection_name != QDRANT_CONVERSATION_COLLECTION:
+        return None
+    state = get_model_migration(collection_name)
+    if not state:
+        return None
+    if state["status"] in MIGRATION_SHADOWING:
+        return state["new_collection"], state["new_model"]
+    if state["status"] == "flipped" and not state.get("legacy_dropped"):
+        # Keep the old side current so a rollback loses nothing
+        return state["old_collection"], state["old_model"]
+    return None
+
+
+def _with_shadow(collection_name: str) -> List[str]:
+    shadow = shadow_target(collection_name)
+    return [collection_name] + ([shadow[0]] if shadow else [])
+
+
+def existing_collection_names() -> set:
+    """
+    Physical collections plus aliases: both are valid collection_name arguments.
+    """
+    names = {c.name for c in qdrant.get_collections().collections}
+    names |= {a.alias_name for a in qdrant.get_aliases().aliases}
+    return names
+
+
+def resolve_alias(name: str):
+    for a in qdrant.get_aliases().aliases:
+        if a.alias_name == name:
+            return a.collection_name
+    return None
+
+
+class QueryVectorCache:
+    """
+    Bounded LRU of query vectors keyed by (model, sha256(text)).
+    The same user text is searched once per memory layer, then again for
+    indexed memory and the journal; only the first lookup pays for an encode.
+    """
+
+    def __init__(self, max_size=QUERY_VECTOR_CACHE_SIZE, ttl_seconds=QUERY_VECTOR_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, model_name: str):
+        return model_name, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                vector, stored_at = item
+                if self.ttl_seconds <= 0 or now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, vector):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (vector, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+query_vector_cache = QueryVectorCache()
+
+
+def get_query_vector(search_query: str, model_name: str = SENTENCE_TRANSFORMER_MODEL):
+    """
+    Embed a search query, reusing a cached vector for repeated text.
+    """
+    key = QueryVectorCache.make_key(search_query, model_name)
+    vector = query_vector_cache.get(key)
+    if vector is None:
+        vector = embedding_batcher.encode(search_query, model_name=model_name)
+        query_vector_cache.put(key, vector)
+    return vector
+
+
+def get_query_vector_cache_stats():
+    return query_vector_cache.stats()
+
+
+class RecentVectorCache:
+    """
+    Ring buffer of the most recently indexed message vectors, per collection.
+    upsert_messages fills it, so the last few turns' vectors are on hand
+    without a Qdrant round trip. Entries remember the model that made them
+    and are ignored once the collection serves another model.
+    """
+
+    def __init__(self, max_size=RECENT_VECTOR_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put_many(self, collection: str, model_name: str, message_ids, vectors):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            for mid, vector in zip(message_ids, vectors):
+                if not mid:
+                    continue
+                key = (collection, mid)
+                self._entries[key] = (model_name, vector)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_many(self, collection: str, model_name: str, message_ids) -> Dict[str, Any]:
+        found = {}
+        with self._lock:
+            for mid in message_ids:
+                item = self._entries.get((collection, mid))
+                if item is not None and item[0] == model_name:
+                    found[mid] = item[1]
+            self.hits += len(found)
+            self.misses += len(message_ids) - len(found)
+        return found
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+recent_vectors = RecentVectorCache()
+RECENT_VECTOR_MAX_AGE_SECONDS = 24 * 3600
+
+
+def get_message_vectors(message_ids: Sequence[str], collection: str = QDRANT_CONVERSATION_COLLECTION) -> Dict[str, Any]:
+    """
+    Dense vectors for `message_ids`, from the recent-vector buffer where
+    possible; the rest are retrieved by their uuid5 point ids in one call
+    and buffered. Messages without a point are left out.
+    """
+    model_name = collection_model(collection)
+    found = recent_vectors.get_many(collection, model_name, message_ids)
+    missing = [mid for mid in message_ids if mid not in found]
+    if missing:
+        point_to_mid = {message_id_to_uuid(mid): mid for mid in missing}
+        points = _dense_vectors(qdrant.retrieve(
+            collection_name=collection,
+            ids=list(point_to_mid),
+            with_payload=False,
+            with_vectors=True,
+        ))
+        fetched = {point_to_mid[str(p.id)]: p.vector for p in points if p.vector is not None}
+        recent_vectors.put_many(collection, model_name, list(fetched), list(fetched.values()))
+        found.update(fetched)
+    return found
+
 def search_collection(
     collection_name,
     search_query: str | None = None,
@@ -27,13 +531,24 @@ def search_collection(
     query_filter=None,
     with_payload: bool = True,
     with_vectors: bool = False,
+    hybrid: bool = False,
+    score_formula: qmodels.FormulaQuery | None = None,
+    prefetch_limit: int | None = None,
 ):
+    """
+    Vector (or filter-only) search. hybrid adds BM25 candidates fused with
+    RRF where the collection has sparse vectors. With score_formula, the
+    best prefetch_limit dense candidates are re-ranked by the formula in
+    Qdrant and only the top `limit` come back. Fused RRF scores have to be
+    mapped onto the dense range before any boost applies (_hybrid_query),
+    so a formula can't rank hybrid candidates; rescore those client-side.
+    """
     client = get_qdrant_client()
 
     # Only auto-embed if we *need* a vector and don't have one yet
     if query_vector is None and search_query is not None:
         # semantic search from text
-        query_vector = model.encode(search_query)
+        query_vector = get_query_vector(search_query, model_name=collection_model(collection_name))
 
     # If we have neither a query vector nor text, we’re in filter-only mode.
     # In that case, require a filter so we don't accidentally scan the whole collection.
@@ -45,6 +560,28 @@ def search_collection(
         )
 
 
+    use_hybrid = hybrid and search_query and query_vector is not None and has_sparse_vectors(collection_name)
+
+    if score_formula is not None and query_vector is not None:
+        if use_hybrid:
+            raise ValueError("score_formula ranks dense candidates only; rescore hybrid results client-side")
+        search_params = get_search_params(collection_name)
+        prefetch = qmodels.Prefetch(query=_vector_list(query_vector), limit=prefetch_limit or limit,
+                                    filter=query_filter, params=search_params)
+        response = client.query_points(
+            collection_name=collection_name,
+            prefetch=prefetch,
+            query=score_formula,
+            limit=limit,
+            with_payload=with_payload,
+            with_vectors=with_vectors,
+        )
+        return _dense_vectors(response.points) if with_vectors else response.points
+
+    if use_hybrid:
+        return _hybrid_query(client, collection_name, search_query, query_vector, limit, query_filter,
+                             with_payload, with_vectors)
+
     response = client.query_points(
         collection_name=collection_name,
         query=query_vector,
@@ -52,8 +589,73 @@ def search_collection(
         query_filter=query_filter,
         with_payload=with_payload,
         with_vectors=with_vectors,
+        search_params=get_search_params(collection_name) if query_vector is not None else None,
     )
-    return response.points
+    return _dense_vectors(response.points) if with_vectors else response.points
+
+
+def _dense_vectors(points):
+    # Collections with a sparse vector return {"": dense, "bm25": sparse}; callers expect the dense list
+    for p in points:
+        if isinstance(p.vector, dict):
+            p.vector = p.vector.get("")
+    return points
+
+def _hybrid_prefetches(query_vector, search_query, limit, query_filter, search_params):
+    return [
+        qmodels.Prefetch(query=_vector_list(query_vector), limit=limit, filter=query_filter, params=search_params),
+        qmodels.Prefetch(query=encode_query(search_query), using=SPARSE_VECTOR_NAME, limit=limit,
+                         filter=query_filter),
+    ]
+
+
+def _hybrid_query(client, collection_name, search_query, query_vector, limit, query_filter,
+                  with_payload, with_vectors):
+    """
+    Dense + BM25 candidates fused with reciprocal rank fusion in Qdrant.
+    The dense-only ranking rides along in the same batch request: RRF
+    scores are rank-based (~1/rank), so they are mapped onto the dense
+    cosine range to keep callers' additive boosts meaningful.
+    """
+    search_params = get_search_params(collection_name)
+    dense_only, fused = client.query_batch_points(
+        collection_name=collection_name,
+        requests=[
+            qmodels.QueryRequest(
+                query=_vector_list(query_vector), limit=limit, filter=query_filter, params=search_params,
+                with_payload=False,
+            ),
+            qmodels.QueryRequest(
+                prefetch=_hybrid_prefetches(query_vector, search_query, limit, query_filter, search_params),
+                query=qmodels.FusionQuery(fusion=qmodels.Fusion.RRF),
+                limit=limit,
+                with_payload=with_payload,
+                with_vector=with_vectors,
+            ),
+        ],
+    )
+    points = _dense_vectors(fused.points) if with_vectors else fused.points
+    offset, factor = _rrf_scale(dense_only.points, points)
+    for p in points:
+        p.score = offset + factor * p.score
+    return points
+
+
+def _rrf_scale(dense_points, fused_points):
+    """
+    (offset, factor) mapping the fused RRF scores linearly onto the range
+    the dense-only ranking spans: best fused hit -> best cosine, worst -> worst.
+    """
+    if not fused_points or not dense_points:
+        return 0.0, 1.0
+    lo, hi = dense_points[-1].score, dense_points[0].score
+    fmin, fmax = fused_points[-1].score, fused_points[0].score
+    span = fmax - fmin
+    if not span:
+        return hi, 0.0
+    factor = (hi - lo) / span
+    return lo - factor * fmin, factor
+
 
 ## This function is for embedding the journal into its own collection
 def upsert_embedding(vector, metadata, collection, point_id=None):
@@ -70,6 +672,73 @@ def upsert_embedding(vector, metadata, collection, point_id=None):
         collection_name=collection,
         points=[point]
     )
+    index_generation.bump()
+
+# --------------------------
+# Sparse (BM25) vectors
+# --------------------------
+# The conversation collection (and every physical collection behind its
+# alias) carries a named sparse vector next to the unnamed dense one.
+# Qdrant applies the IDF half of BM25; see app/services/sparse_vectors.py.
+SPARSE_VECTOR_PARAMS = {SPARSE_VECTOR_NAME: qmodels.SparseVectorParams(modifier=qmodels.Modifier.IDF)}
+SPARSE_CONFIG_TTL_SECONDS = 30.0
+
+_sparse_support: Dict[str, tuple] = {}
+
+
+def _wants_sparse(collection_name: str) -> bool:
+    return collection_name == QDRANT_CONVERSATION_COLLECTION \
+        or collection_name.startswith(f"{QDRANT_CONVERSATION_COLLECTION}__")
+
+
+def has_sparse_vectors(collection_name: str) -> bool:
+    """
+    Whether `collection_name` was created with the BM25 sparse vector.
+    Collections created before it existed lack it until they are rebuilt
+    (migrate_embedding_model.py with the current model).
+    """
+    cached = _sparse_support.get(collection_name)
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < SPARSE_CONFIG_TTL_SECONDS:
+        return cached[0]
+    try:
+        sparse = qdrant.get_collection(collection_name).config.params.sparse_vectors or {}
+        supported = SPARSE_VECTOR_NAME in sparse
+    except Exception:
+        supported = False
+    _sparse_support[collection_name] = (supported, now)
+    return supported
+
+
+# --------------------------
+# Server capabilities
+# --------------------------
+FORMULA_QUERY_MIN_VERSION = (1, 14)
+
+_server_version: Dict[str, tuple] = {}
+
+
+def qdrant_server_version():
+    """
+    (major, minor) of the Qdrant server, cached per process; None if it can't be read.
+    """
+    if "version" not in _server_version:
+        try:
+            match = re.match(r"(\d+)\.(\d+)", get_qdrant_client().info().version or "")
+        except Exception as e:
+            print(f"[Qdrant] Could not read server version: {e}")
+            return None
+        if match is None:
+            return None
+        _server_version["version"] = tuple(int(part) for part in match.groups())
+    return _server_version["version"]
+
+
+def supports_formula_queries() -> bool:
+    version = qdrant_server_version()
+    # Unknown version: try it; search_indexed_memory falls back if the server rejects the query type
+    return version is None or version >= FORMULA_QUERY_MIN_VERSION
+
 
 def message_id_to_uuid(msgid):
     # Use a deterministic UUID (namespace + message_id)
@@ -80,11 +749,15 @@ def safe_str(val):
         return str(val)
     return val
 
-## build_index() calls this for embedding records.
-def upsert_single(entry, vector, collection=QDRANT_CONVERSATION_COLLECTION):
-    metadata = entry.get("metadata", {})
-    payload = {
-        "timestamp": entry.get("timestamp"),
+def build_message_payload(entry) -> dict:
+    """
+    Qdrant payload for a conversation message, flattening its metadata.
+    """
+    metadata = entry.get("metadata") or {}
+    timestamp, timestamp_epoch = normalize_timestamp(entry.get("timestamp"))
+    return {
+        "timestamp": timestamp,
+        "timestamp_epoch": timestamp_epoch,
         "role": entry.get("role"),
         "source": entry.get("source"),
         "message": entry.get("message"),
@@ -94,7 +767,7 @@ def upsert_single(entry, vector, collection=QDRANT_CONVERSATION_COLLECTION):
         "server": metadata.get("server"),
         "channel": metadata.get("channel"),
         "modality_hint": metadata.get("modality_hint"),
-        # Uncomment the next two lines if you want tags included:
+        # Uncomment the next line if you want tags included:
         # "auto_tags": entry.get("auto_tags", []),
         "user_tags": entry.get("user_tags", []),
         "is_private": entry.get("is_private", False),
@@ -104,85 +777,147 @@ def upsert_single(entry, vector, collection=QDRANT_CONVERSATION_COLLECTION):
         "thread_ids": entry.get("thread_ids", []),
         "remembered": entry.get("remembered", False)
     }
+
+
+def _vector_list(vector):
+    return vector.tolist() if hasattr(vector, "tolist") else list(vector)
+
+
+## Single-message upsert, kept for ad-hoc callers. build_index goes through upsert_messages.
+def upsert_single(entry, vector, collection=QDRANT_CONVERSATION_COLLECTION):
     ensure_qdrant_collection(vector_size=len(vector), collection_name=collection)
     qdrant.upsert(
         collection_name=collection,
         points=[
             qmodels.PointStruct(
                 id = message_id_to_uuid(entry.get("message_id")),
-                vector=vector.tolist(),
-                payload=payload
+                vector=_vector_list(vector),
+                payload=build_message_payload(entry)
             )
         ]
     )
+    index_generation.bump()
 
 
-def ensure_qdrant_collection(vector_size, collection_name=None):
-    collection_name = collection_name or QDRANT_CONVERSATION_COLLECTION
-    if collection_name not in [c.name for c in qdrant.get_collections().collections]:
-        qdrant.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=qmodels.VectorParams(size=vector_size, distance=qmodels.Distance.COSINE)
-        )
+# Collections we've already seen exist, so upserts don't pay a get_collections round trip each time
+_known_collections = set()
+_known_collections_lock = threading.Lock()
 
-# This method does not appear to be in use. Clean up.
-def index_to_qdrant(entries, vectors, batch_size=128):
-    ensure_qdrant_collection(vectors.shape[1])
-    points = []
-
-    for entry, vector in zip(entries, vectors):
-        metadata = entry.get("metadata", {})
-        payload = {
-            "timestamp": entry.get("timestamp"),
-            "role": entry.get("role"),
-            "source": entry.get("source"),
-            "message": entry.get("message"),
-            # Flatten metadata
-            "author_id": metadata.get("author_id"),
-            "author_name": metadata.get("author_name"),
-            "server": metadata.get("server"),
-            "channel": metadata.get("channel"),
-            "modality_hint": metadata.get("modality_hint"),
-            "user_tags": entry.get("user_tags", []),
-            "is_private": entry.get("is_private", False),
-            "is_hidden": entry.get("is_hidden", False),
-            "is_deleted": entry.get("is_deleted", False),
-            "project_id": safe_str(entry.get("project_id")),
-            "thread_ids": entry.get("thread_ids", []),
-            "remembered": entry.get("remembered", False)
-        }
 
-        points.append(
-            qmodels.PointStruct(
-                id=str(uuid.uuid4()),
-                vector=vector.tolist(),
-                payload=payload
+def ensure_qdrant_collection(vector_size, collection_name=None, profile_name=None):
+    collection_name = collection_name or QDRANT_CONVERSATION_COLLECTION
+    if collection_name in _known_collections:
+        return
+    with _known_collections_lock:
+        if collection_name in _known_collections:
+            return
+        if collection_name not in existing_collection_names():
+            profile = get_collection_profile(collection_name, profile_name)
+            qdrant.create_collection(
+                collection_name=collection_name,
+                vectors_config=qmodels.VectorParams(
+                    size=vector_size,
+                    distance=qmodels.Distance.COSINE,
+                    on_disk=profile["on_disk"],
+                ),
+                hnsw_config=qmodels.HnswConfigDiff(**profile["hnsw"]),
+                quantization_config=_quantization_config(profile),
+                sparse_vectors_config=SPARSE_VECTOR_PARAMS if _wants_sparse(collection_name) else None,
             )
-        )
+            ensure_payload_indexes(collection_name)
+            _sparse_support.pop(collection_name, None)
+            if _wants_sparse(collection_name):
+                # A conversation collection starts out with timestamp_epoch on every point
+                mark_timestamps_backfilled(collection_name)
+        _known_collections.add(collection_name)
+
+
+def drop_collection(collection_name):
+    """
+    Delete a collection and forget that it existed, so the next
+    ensure_qdrant_collection call recreates it.
+    """
+    with _known_collections_lock:
+        _known_collections.discard(collection_name)
+        _sparse_support.pop(collection_name, None)
+        qdrant.delete_collection(collection_name)
+
+
+def upsert_points(points: List[qmodels.PointStruct], collection: str, batch_size: int = BATCH_SIZE):
+    """
+    Upsert prepared points in batches of `batch_size`, one request per batch.
 
+    Every helper here that writes points bumps index_generation once it is
+    done, which invalidates cached search results in every process.
+    """
+    if not points:
+        return 0
+    dense = points[0].vector
+    ensure_qdrant_collection(vector_size=len(dense[""] if isinstance(dense, dict) else dense), collection_name=collection)
     for i in range(0, len(points), batch_size):
-        batch = points[i:i + batch_size]
-        qdrant.upsert(collection_name=QDRANT_CONVERSATION_COLLECTION, points=batch)
+        qdrant.upsert(collection_name=collection, points=points[i:i + batch_size])
+    index_generation.bump()
+    return len(points)
+
+
+def upsert_messages(entries, vectors, collection=QDRANT_CONVERSATION_COLLECTION, batch_size: int = BATCH_SIZE):
+    """
+    Batched counterpart of upsert_single. Point ids are derived from message_id,
+    so re-indexing a message overwrites its point instead of duplicating it.
+    """
+    sparse = has_sparse_vectors(collection)
+    points = [
+        qmodels.PointStruct(
+            id=message_id_to_uuid(entry.get("message_id")),
+            vector={"": _vector_list(vector), SPARSE_VECTOR_NAME: encode_document(entry.get("message"))}
+            if sparse else _vector_list(vector),
+            payload=build_message_payload(entry),
+        )
+        for entry, vector in zip(entries, vectors)
+    ]
+    written = upsert_points(points, collection, batch_size=batch_size)
+    # Only fresh messages go in the ring buffer, so a re-index or backfill of history can't flush it
+    cutoff = time.time() - RECENT_VECTOR_MAX_AGE_SECONDS
+    fresh = [(p.payload["message_id"], vector) for p, vector in zip(points, vectors)
+             if (p.payload.get("timestamp_epoch") or 0) >= cutoff]
+    if fresh:
+        recent_vectors.put_many(collection, collection_model(collection), *zip(*fresh))
+    return written
+
+
+def upsert_embeddings(vectors, metadatas, point_ids, collection, batch_size: int = BATCH_SIZE):
+    """
+    Batched counterpart of upsert_embedding.
+    """
+    points = [
+        qmodels.PointStruct(id=point_id, vector=_vector_list(vector), payload=metadata)
+        for vector, metadata, point_id in zip(vectors, metadatas, point_ids)
+    ]
+    return upsert_points(points, collection, batch_size=batch_size)
 
 def delete_point(point_id_str: str, collection_name: str):
-    point_id = message_id_to_uuid(point_id_str)
+    delete_points([message_id_to_uuid(point_id_str)], collection_name)
+
+
+def delete_points(point_ids: Sequence, collection_name: str):
     qdrant.delete(
         collection_name=collection_name,
-        points_selector=qmodels.PointIdsList(
-            points=[point_id]
-        )
+        points_selector=qmodels.PointIdsList(points=list(point_ids)),
     )
+    index_generation.bump()
 
 def delete_qdrant_message(message_id: str) -> bool:
     try:
         delete_id = message_id_to_uuid(message_id)
         selector = qmodels.PointIdsList(points=[delete_id])
 
-        qdrant.delete(
-            collection_name=QDRANT_CONVERSATION_COLLECTION,
-            points_selector=selector,
-            wait=True,
-        )
+        for target in _with_shadow(QDRANT_CONVERSATION_COLLECTION):
+            qdrant.delete(
+                collection_name=target,
+                points_selector=selector,
+                wait=True,
+            )
+        index_generation.bump()
 
         result = qdrant.retrieve(
             collection_name=QDRANT_CONVERSATION_COLLECTION,
@@ -200,20 +935,39 @@ def delete_qdrant_message(message_id: str) -> bool:
 def update_payload_for_messages(
     updates: List[Dict[str, Any]],
     collection: str = QDRANT_CONVERSATION_COLLECTION,
+    batch_size: int = BATCH_SIZE,
 ):
     """
     updates: list of {"message_id": str, "payload": {...}} dicts.
     Does NOT touch vectors, only payload.
+
+    Messages whose payloads are identical share one SetPayload operation,
+    and the operations go out through batch_update_points, so tagging a
+    whole selection costs a request or two instead of one per message.
+    Returns the number of requests sent.
     """
     if not updates:
-        return
+        return 0
 
+    groups: Dict[str, tuple] = {}
     for u in updates:
-        msg_id = u["message_id"]
-        payload = u["payload"]
+        key = json.dumps(u["payload"], sort_keys=True, default=str)
+        groups.setdefault(key, (u["payload"], []))[1].append(message_id_to_uuid(u["message_id"]))
 
-        qdrant.set_payload(
-            collection_name=collection,
-            payload=payload,  # single dict
-            points=[message_id_to_uuid(msg_id)],
-        )
\ No newline at end of file
+    operations = []
+    for payload, point_ids in groups.values():
+        for i in range(0, len(point_ids), batch_size):
+            operations.append(qmodels.SetPayloadOperation(
+                set_payload=qmodels.SetPayload(payload=payload, points=point_ids[i:i + batch_size])
+            ))
+
+    requests = 0
+    for target in _with_shadow(collection):
+        for i in range(0, len(operations), PAYLOAD_OPS_PER_REQUEST):
+            qdrant.batch_update_points(
+                collection_name=target,
+                update_operations=operations[i:i + PAYLOAD_OPS_PER_REQUEST],
+            )
+            requests += 1
+    index_generation.bump()
+    return requests
\ No newline at end of file
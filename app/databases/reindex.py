@@ -0,0 +1,364 @@
+# app/databases/reindex.py
+"""
+Parallel, resumable full re-index of conversations and memory entries.
+
+A run is planned once: each target collection is cut into timestamp-range
+partitions (conversations on `timestamp`, memory entries on
+`entries.created_on`), plus one catch-all partition for documents without a
+usable date. Every partition gets a checkpoint document in Mongo.
+
+Partitions are handed to a pool of worker processes. A worker walks its
+range in (timestamp, _id) keyset pages, re-embeds and re-upserts each page
+through the same helpers build_index / build_memory_index use, and saves the
+last key after every page. Re-running an interrupted run skips finished
+partitions and continues the rest from their last saved key.
+
+Throughput is throttled per worker (max_docs_per_sec is split evenly) so a
+rebuild can run beside live traffic. Each worker loads the embedding model
+itself unless EMBEDDING_SIDECAR_SOCKET points them at a shared sidecar.
+"""
+import asyncio
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, DESCENDING
+from app.config import MONGO_DB, MONGO_SYSTEM_DB, MONGO_CONVERSATION_COLLECTION, MONGO_MEMORY_COLLECTION
+from app.databases import memory_indexer, qdrant_connector
+from app.databases.connection_manager import connections
+
+RUNS_COLLECTION = "muse_reindex_runs"
+CHECKPOINTS_COLLECTION = "muse_reindex_checkpoints"
+
+TARGET_CONVERSATIONS = "conversations"
+TARGET_MEMORY = "memory"
+TARGETS = (TARGET_CONVERSATIONS, TARGET_MEMORY)
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+MEMORY_LAYER_TYPES = ["layer", "project_layer"]
+REPORT_SECONDS = 5
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _runs():
+    return connections.mongo_db(MONGO_SYSTEM_DB)[RUNS_COLLECTION]
+
+
+def _checkpoints():
+    return connections.mongo_db(MONGO_SYSTEM_DB)[CHECKPOINTS_COLLECTION]
+
+
+def _source(target: str):
+    name = MONGO_CONVERSATION_COLLECTION if target == TARGET_CONVERSATIONS else MONGO_MEMORY_COLLECTION
+    return connections.mongo_db(MONGO_DB)[name]
+
+
+# --------------------------
+# Partition queries
+# --------------------------
+def _conversation_match(cp: dict) -> dict:
+    if cp["start"] is None:
+        return {"timestamp": {"$not": {"$type": "date"}}}
+    upper = "$lte" if cp["last"] else "$lt"
+    return {"timestamp": {"$gte": cp["start"], upper: cp["end"]}}
+
+
+def _memory_match(cp: dict) -> dict:
+    if cp["start"] is None:
+        return {"entries.created_on": {"$not": {"$type": "date"}}}
+    upper = "$lte" if cp["last"] else "$lt"
+    return {"entries.created_on": {"$gte": cp["start"], upper: cp["end"]}}
+
+
+def _after(ts_field: str, id_field: str, last_key: Optional[dict], dated: bool) -> dict:
+    if not last_key:
+        return {}
+    if not dated:
+        return {id_field: {"$gt": last_key["id"]}}
+    return {"$or": [
+        {ts_field: {"$gt": last_key["ts"]}},
+        {ts_field: last_key["ts"], id_field: {"$gt": last_key["id"]}},
+    ]}
+
+
+def _conversation_page(cp: dict, last_key: Optional[dict], page_size: int) -> List[dict]:
+    dated = cp["start"] is not None
+    query = {"$and": [_conversation_match(cp), _after("timestamp", "_id", last_key, dated)]}
+    sort = [("timestamp", ASCENDING), ("_id", ASCENDING)] if dated else [("_id", ASCENDING)]
+    return list(_source(TARGET_CONVERSATIONS).find(
+        query, memory_indexer.MESSAGE_INDEX_PROJECTION, sort=sort, limit=page_size
+    ))
+
+
+def _memory_page(cp: dict, last_key: Optional[dict], page_size: int) -> List[dict]:
+    dated = cp["start"] is not None
+    sort = {"entries.created_on": 1, "entries.id": 1} if dated else {"entries.id": 1}
+    pipeline = [
+        {"$match": {"type": {"$in": MEMORY_LAYER_TYPES}}},
+        {"$project": {"id": 1, "project_id": 1, "entries": 1}},
+        {"$unwind": "$entries"},
+        {"$match": {"$and": [_memory_match(cp), _after("entries.created_on", "entries.id", last_key, dated)]}},
+        {"$sort": sort},
+        {"$limit": page_size},
+        {"$project": memory_indexer.MEMORY_ENTRY_PROJECTION},
+    ]
+    return list(_source(TARGET_MEMORY).aggregate(pipeline))
+
+
+def _page_key(target: str, doc: dict) -> dict:
+    if target == TARGET_CONVERSATIONS:
+        return {"ts": doc.get("timestamp"), "id": doc["_id"]}
+    return {"ts": doc.get("created_on"), "id": doc.get("entry_id")}
+
+
+# --------------------------
+# Planning
+# --------------------------
+def _date_bounds(target: str):
+    coll = _source(target)
+    if target == TARGET_CONVERSATIONS:
+        dated = {"timestamp": {"$type": "date"}}
+        first = coll.find_one(dated, {"timestamp": 1}, sort=[("timestamp", ASCENDING)])
+        last = coll.find_one(dated, {"timestamp": 1}, sort=[("timestamp", DESCENDING)])
+        return (first["timestamp"], last["timestamp"]) if first and last else (None, None)
+    rows = list(coll.aggregate([
+        {"$match": {"type": {"$in": MEMORY_LAYER_TYPES}}},
+        {"$unwind": "$entries"},
+        {"$match": {"entries.created_on": {"$type": "date"}}},
+        {"$group": {"_id": None, "lo": {"$min": "$entries.created_on"}, "hi": {"$max": "$entries.created_on"}}},
+    ]))
+    return (rows[0]["lo"], rows[0]["hi"]) if rows else (None, None)
+
+
+def _partition_size(target: str, cp: dict) -> int:
+    if target == TARGET_CONVERSATIONS:
+        return _source(target).count_documents(_conversation_match(cp))
+    rows = list(_source(target).aggregate([
+        {"$match": {"type": {"$in": MEMORY_LAYER_TYPES}}},
+        {"$unwind": "$entries"},
+        {"$match": _memory_match(cp)},
+        {"$count": "n"},
+    ]))
+    return rows[0]["n"] if rows else 0
+
+
+def plan_run(targets=TARGETS, partitions: int = 16, page_size: int = qdrant_connector.BATCH_SIZE,
+             max_docs_per_sec: float = 0, dryrun: bool = False) -> str:
+    """
+    Create a run and its partition checkpoints. Returns the run id.
+    """
+    run_id = "reindex-" + _now().strftime("%Y%m%d-%H%M%S")
+    checkpoints = []
+    for target in targets:
+        lo, hi = _date_bounds(target)
+        ranges = []
+        if lo is not None:
+            count = max(1, partitions) if hi > lo else 1
+            step = (hi - lo) / count
+            for i in range(count):
+                start = lo + step * i
+                end = hi if i == count - 1 else lo + step * (i + 1)
+                ranges.append((start, end, i == count - 1))
+        ranges.append((None, None, True))  # documents without a usable date
+
+        for i, (start, end, last) in enumerate(ranges):
+            cp = {
+                "_id": f"{run_id}:{target}:{i:03d}",
+                "run_id": run_id,
+                "target": target,
+                "index": i,
+                "start": start,
+                "end": end,
+                "last": last,
+                "status": STATUS_PENDING,
+                "last_key": None,
+                "processed": 0,
+                "indexed": 0,
+            }
+            cp["expected"] = _partition_size(target, cp)
+            if cp["expected"]:
+                checkpoints.append(cp)
+
+    _runs().insert_one({
+        "_id": run_id,
+        "targets": list(targets),
+        "page_size": page_size,
+        "max_docs_per_sec": max_docs_per_sec,
+        "dryrun": dryrun,
+        "created_on": _now(),
+        "status": STATUS_PENDING,
+        "expected": sum(cp["expected"] for cp in checkpoints),
+    })
+    if checkpoints:
+        _checkpoints().insert_many(checkpoints)
+    return run_id
+
+
+def latest_unfinished_run() -> Optional[str]:
+    doc = _runs().find_one({"status": {"$ne": STATUS_DONE}}, sort=[("created_on", DESCENDING)])
+    return doc["_id"] if doc else None
+
+
+def run_status(run_id: str) -> dict:
+    run = _runs().find_one({"_id": run_id})
+    if run is None:
+        raise ValueError(f"No reindex run {run_id!r}")
+    parts = list(_checkpoints().find({"run_id": run_id}, {"target": 1, "status": 1, "processed": 1, "expected": 1}))
+    by_status: Dict[str, int] = {}
+    for cp in parts:
+        by_status[cp["status"]] = by_status.get(cp["status"], 0) + 1
+    return {
+        "run_id": run_id,
+        "status": run["status"],
+        "targets": run["targets"],
+        "partitions": by_status,
+        "processed": sum(cp.get("processed", 0) for cp in parts),
+        "expected": run.get("expected", 0),
+    }
+
+
+# --------------------------
+# Worker side
+# --------------------------
+class Throttle:
+    """
+    Keeps a worker at or under `docs_per_sec` by sleeping between pages.
+    """
+
+    def __init__(self, docs_per_sec: float):
+        self.docs_per_sec = docs_per_sec
+        self.started = time.monotonic()
+        self.done = 0
+
+    async def wait(self, n: int):
+        self.done += n
+        if self.docs_per_sec <= 0:
+            return
+        ahead = self.done / self.docs_per_sec - (time.monotonic() - self.started)
+        if ahead > 0:
+            await asyncio.sleep(ahead)
+
+
+async def reindex_partition(checkpoint_id: str, page_size: int, docs_per_sec: float, dryrun: bool) -> int:
+    checkpoints = _checkpoints()
+    cp = checkpoints.find_one({"_id": checkpoint_id})
+    if cp is None or cp["status"] == STATUS_DONE:
+        return 0
+    checkpoints.update_one(
+        {"_id": checkpoint_id},
+        {"$set": {"status": STATUS_RUNNING, "worker": f"{socket.gethostname()}:{os.getpid()}", "started_on": _now()}},
+    )
+
+    target = cp["target"]
+    coll = _source(target)
+    fetch = _conversation_page if target == TARGET_CONVERSATIONS else _memory_page
+    index_page = memory_indexer._index_message_page if target == TARGET_CONVERSATIONS \
+        else memory_indexer._index_memory_page
+    throttle = Throttle(docs_per_sec)
+    last_key = cp.get("last_key")
+    processed = 0
+
+    try:
+        while True:
+            page = fetch(cp, last_key, page_size)
+            if not page:
+                break
+            indexed = await index_page(coll, page, dryrun)
+            last_key = _page_key(target, page[-1])
+            checkpoints.update_one(
+                {"_id": checkpoint_id},
+                {"$set": {"last_key": last_key, "updated_on": _now()},
+                 "$inc": {"processed": len(page), "indexed": indexed}},
+            )
+            processed += len(page)
+            if len(page) < page_size:
+                break
+            await throttle.wait(len(page))
+    except Exception as e:
+        checkpoints.update_one({"_id": checkpoint_id}, {"$set": {"status": STATUS_FAILED, "error": str(e)}})
+        raise
+
+    checkpoints.update_one({"_id": checkpoint_id}, {"$set": {"status": STATUS_DONE, "finished_on": _now()}})
+    return processed
+
+
+def _run_partition_process(checkpoint_id: str, page_size: int, docs_per_sec: float, dryrun: bool) -> int:
+    # Entry point inside a worker process: fresh event loop, fresh pooled clients
+    try:
+        return asyncio.run(reindex_partition(checkpoint_id, page_size, docs_per_sec, dryrun))
+    finally:
+        connections.close()
+
+
+# --------------------------
+# Coordinator
+# --------------------------
+def run_reindex(run_id: str, workers: int = 2, max_docs_per_sec: Optional[float] = None) -> dict:
+    """
+    Work through every unfinished partition of `run_id` with `workers`
+    processes, printing docs/s as it goes. Safe to call again after an
+    interruption.
+    """
+    run = _runs().find_one({"_id": run_id})
+    if run is None:
+        raise ValueError(f"No reindex run {run_id!r}")
+    workers = max(1, workers)
+    rate = run["max_docs_per_sec"] if max_docs_per_sec is None else max_docs_per_sec
+    per_worker_rate = rate / workers if rate else 0
+
+    pending = [cp["_id"] for cp in _checkpoints().find(
+        {"run_id": run_id, "status": {"$ne": STATUS_DONE}}, {"_id": 1}, sort=[("target", ASCENDING), ("index", ASCENDING)]
+    )]
+    _runs().update_one({"_id": run_id}, {"$set": {"status": STATUS_RUNNING, "resumed_on": _now()}})
+    print(f"[Reindex] {run_id}: {len(pending)} partitions to go, {workers} workers"
+          + (f", throttled to {rate:g} docs/s" if rate else ""))
+
+    baseline = run_status(run_id)["processed"]
+    started = time.perf_counter()
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        futures = {
+            pool.submit(_run_partition_process, cp_id, run["page_size"], per_worker_rate, run["dryrun"]): cp_id
+            for cp_id in pending
+        }
+        remaining = set(futures)
+        while remaining:
+            try:
+                for fut in as_completed(list(remaining), timeout=REPORT_SECONDS):
+                    remaining.discard(fut)
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        failures.append((futures[fut], str(e)))
+                        print(f"[Reindex] Partition {futures[fut]} failed: {e}")
+            except TimeoutError:
+                pass
+            _print_progress(run_id, baseline, started)
+
+    status = STATUS_FAILED if failures else STATUS_DONE
+    _runs().update_one({"_id": run_id}, {"$set": {"status": status, "finished_on": _now()}})
+    summary = run_status(run_id)
+    summary["failures"] = failures
+    summary["elapsed_s"] = round(time.perf_counter() - started, 1)
+    return summary
+
+
+def _print_progress(run_id: str, baseline: int, started: float):
+    status = run_status(run_id)
+    done = status["processed"] - baseline
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    left = max(0, status["expected"] - status["processed"])
+    eta = f", ETA {left / rate:.0f}s" if rate > 0 else ""
+    print(f"[Reindex] {status['processed']}/{status['expected']} docs, {rate:.1f} docs/s{eta} "
+          f"partitions={status['partitions']}")
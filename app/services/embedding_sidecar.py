@@ -0,0 +1,190 @@
+# app/services/embedding_sidecar.py
+"""
+Shared embedding sidecar over a Unix domain socket.
+
+The API, the Continuity Engine and the Discord client each import the
+embedding stack. Without a sidecar every one of them loads its own copy of
+each model. With EMBEDDING_SIDECAR_SOCKET set, they send texts to one
+sidecar process that holds the models, and fall back to in-process
+encoding whenever the sidecar is unreachable.
+
+Wire format (both directions): 4-byte big-endian length + JSON header.
+Successful encode replies are followed by a second frame holding the raw
+float32 vectors (n * dim * 4 bytes).
+
+Run the sidecar with:  python run_embedding_sidecar.py
+"""
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Sequence
+import numpy as np
+from app.config import EMBEDDING_SIDECAR_SOCKET, EMBEDDING_SIDECAR_TIMEOUT
+
+_LEN = struct.Struct(">I")
+RETRY_AFTER_SECONDS = 30
+
+
+def _pack(payload: bytes) -> bytes:
+    return _LEN.pack(len(payload)) + payload
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding sidecar closed the connection")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (n,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    return _recv_exact(sock, n)
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (n,) = _LEN.unpack(await reader.readexactly(_LEN.size))
+    return await reader.readexactly(n)
+
+
+class SidecarClient:
+    """
+    Blocking client, one connection per thread. Returns None from every call
+    when the sidecar is disabled or down, so callers can fall back in-process.
+    """
+
+    def __init__(self, socket_path: str | None = EMBEDDING_SIDECAR_SOCKET, timeout: float = EMBEDDING_SIDECAR_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.socket_path)
+
+    def disable(self):
+        self.socket_path = None
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _request(self, header: dict):
+        if not self.enabled or time.monotonic() < self._down_until:
+            return None
+        try:
+            sock = self._connection()
+            sock.sendall(_pack(json.dumps(header).encode("utf-8")))
+            reply = json.loads(_recv_frame(sock))
+            if not reply.get("ok"):
+                # The sidecar is up but this request failed there (e.g. a model
+                # that won't load); only this call falls back
+                self._drop_connection()
+                print(f"[EmbeddingSidecar] Request failed in sidecar ({reply.get('error', 'unknown error')}); "
+                      f"encoding in-process")
+                return None
+            if header["op"] == "encode":
+                raw = _recv_frame(sock)
+                reply["vectors"] = np.frombuffer(raw, dtype=np.float32).reshape(reply["n"], reply["dim"])
+            return reply
+        except (OSError, ConnectionError) as e:
+            self._drop_connection()
+            self._down_until = time.monotonic() + RETRY_AFTER_SECONDS
+            print(f"[EmbeddingSidecar] Unreachable at {self.socket_path} ({e}); encoding in-process")
+            return None
+        except (ValueError, KeyError) as e:
+            # A malformed frame (JSONDecodeError is a ValueError) leaves the stream
+            # out of step, so the connection can't be reused
+            self._drop_connection()
+            print(f"[EmbeddingSidecar] Bad reply from {self.socket_path} ({e!r}); encoding in-process")
+            return None
+
+    def encode_batch(self, texts: Sequence[str], model_name: str):
+        reply = self._request({"op": "encode", "model": model_name, "texts": list(texts)})
+        return None if reply is None else reply["vectors"]
+
+    def dimension(self, model_name: str):
+        reply = self._request({"op": "dim", "model": model_name})
+        return None if reply is None else reply["dim"]
+
+
+sidecar_client = SidecarClient()
+
+
+# --------------------------
+# Sidecar server
+# --------------------------
+async def _handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    from app.services.embeddings import embedding_batcher, embedding_registry
+
+    try:
+        while True:
+            try:
+                request = json.loads(await _read_frame(reader))
+            except asyncio.IncompleteReadError:
+                break
+
+            try:
+                model_name = request.get("model") or embedding_registry.default_model
+                if request.get("op") == "dim":
+                    dim = await asyncio.to_thread(embedding_registry.dimension, model_name)
+                    writer.write(_pack(json.dumps({"ok": True, "dim": dim}).encode("utf-8")))
+                elif request.get("op") == "encode":
+                    texts = request.get("texts") or []
+                    # Every text goes through the batcher, so requests from
+                    # different processes share forward passes
+                    vectors = await asyncio.gather(
+                        *(embedding_batcher.encode_async(t, model_name=model_name) for t in texts)
+                    )
+                    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+                    header = {"ok": True, "n": matrix.shape[0], "dim": matrix.shape[1]}
+                    writer.write(_pack(json.dumps(header).encode("utf-8")))
+                    writer.write(_pack(matrix.tobytes()))
+                else:
+                    raise ValueError(f"unknown op: {request.get('op')!r}")
+            except Exception as e:
+                writer.write(_pack(json.dumps({"ok": False, "error": str(e)}).encode("utf-8")))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str | None = EMBEDDING_SIDECAR_SOCKET, preload: Sequence[str] = ()):
+    from app.services.embeddings import embedding_registry
+
+    if not socket_path:
+        raise ValueError("EMBEDDING_SIDECAR_SOCKET is not set")
+
+    # The sidecar itself must never call out to a sidecar
+    sidecar_client.disable()
+
+    for model_name in preload:
+        await asyncio.to_thread(embedding_registry.get_model, model_name)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(_handle_client, path=socket_path)
+    print(f"[EmbeddingSidecar] Listening on {socket_path}")
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,190 @@
+# app/services/embedding_store.py
+import json
+import hashlib
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from app.config import EMBEDDING_STORE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: single-process use only
+    fcntl = None
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Content-addressed, append-only vector store for a single model.
+
+    Layout under <EMBEDDING_STORE_DIR>/<model slug>/:
+      - meta.json    {"model": ..., "dim": ...}
+      - vectors.f32  raw float32 rows, read through np.memmap
+      - keys.txt     one sha256 per line; line number == row number
+
+    Vectors are written before their key, so a crash mid-append leaves at
+    most an orphan row that is ignored on the next load. Appends hold an
+    exclusive file lock, and each process picks up rows written by others
+    by tailing keys.txt.
+    """
+
+    def __init__(self, model_name: str, root: Path | str = EMBEDDING_STORE_DIR):
+        self.model_name = model_name
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_")
+        self.path = Path(root) / slug
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.path / "meta.json"
+        self.vectors_path = self.path / "vectors.f32"
+        self.keys_path = self.path / "keys.txt"
+        self.lock_path = self.path / ".lock"
+
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._count = 0
+        self._keys_offset = 0
+        self._dim: Optional[int] = None
+        self._mmap: Optional[np.memmap] = None
+        with self._lock, self._file_lock():
+            self._repair_tail()
+            self._refresh()
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stored_rows(self) -> int:
+        if not self._dim or not self.vectors_path.exists():
+            return 0
+        return self.vectors_path.stat().st_size // (self._dim * 4)
+
+    def _repair_tail(self):
+        """
+        Drop any half-written tail so new rows line up with new keys.
+        Must be called under the file lock.
+        """
+        if self.meta_path.exists():
+            self._dim = json.loads(self.meta_path.read_text()).get("dim")
+        if not self._dim or not self.keys_path.exists():
+            return
+
+        stored_rows = self._stored_rows()
+        with open(self.keys_path, "r", encoding="utf-8") as f:
+            keys = f.read().splitlines()
+
+        valid = min(len(keys), stored_rows)
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size != valid * self._dim * 4:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(valid * self._dim * 4)
+        if len(keys) > valid:
+            with open(self.keys_path, "w", encoding="utf-8") as f:
+                f.write("".join(k + "\n" for k in keys[:valid]))
+
+    def _refresh(self):
+        """
+        Pick up keys appended since we last looked (possibly by another process).
+        """
+        if self._dim is None and self.meta_path.exists():
+            self._dim = json.loads(self.meta_path.read_text()).get("dim")
+        if not self.keys_path.exists() or self.keys_path.stat().st_size <= self._keys_offset:
+            return
+
+        stored_rows = self._stored_rows()
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            for raw in f:
+                if not raw.endswith(b"\n") or self._count >= stored_rows:
+                    break
+                self._rows.setdefault(raw.decode("utf-8").strip(), self._count)
+                self._count += 1
+                self._keys_offset += len(raw)
+
+    def _vectors(self) -> Optional[np.memmap]:
+        if not self._count or not self._dim:
+            return None
+        if self._mmap is None or self._mmap.shape[0] < self._count:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._count, self._dim))
+        return self._mmap
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, text: str):
+        return text_hash(text) in self._rows
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [text_hash(t) for t in texts]
+        with self._lock:
+            if any(k not in self._rows for k in keys):
+                self._refresh()
+            vectors = self._vectors()
+            out = []
+            for key in keys:
+                row = self._rows.get(key)
+                out.append(np.array(vectors[row]) if row is not None else None)
+            return out
+
+    def put(self, text: str, vector):
+        self.put_many([text], [vector])
+
+    def put_many(self, texts: Sequence[str], vectors):
+        with self._lock, self._file_lock():
+            self._refresh()
+            new_keys, new_rows, seen = [], [], set()
+            for text, vector in zip(texts, vectors):
+                key = text_hash(text)
+                if key in self._rows or key in seen:
+                    continue
+                vec = np.asarray(vector, dtype=np.float32).reshape(-1)
+                if self._dim is None:
+                    self._dim = int(vec.shape[0])
+                    self.meta_path.write_text(json.dumps({"model": self.model_name, "dim": self._dim}))
+                if vec.shape[0] != self._dim:
+                    raise ValueError(
+                        f"EmbeddingStore({self.model_name}): expected dim {self._dim}, got {vec.shape[0]}"
+                    )
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(vec)
+
+            if not new_keys:
+                return
+
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack(new_rows).tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write("".join(k + "\n" for k in new_keys).encode("utf-8"))
+
+            self._refresh()
+            self._mmap = None
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(model_name: str) -> EmbeddingStore:
+    store = _stores.get(model_name)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(model_name)
+            if store is None:
+                store = EmbeddingStore(model_name)
+                _stores[model_name] = store
+    return store
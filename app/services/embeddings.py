@@ -0,0 +1,319 @@
+# app/services/embeddings.py
+import asyncio
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Sequence
+from sentence_transformers import SentenceTransformer
+from app.config import SENTENCE_TRANSFORMER_MODEL, SENTENCE_TRANSFORMER_ENTITY_MODEL, EMBEDDING_BATCH_MAX_SIZE, \
+    EMBEDDING_BATCH_MAX_WAIT_MS, EMBEDDING_BACKEND, EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_QUANTIZATION, \
+    EMBEDDING_LOCAL_FILES_ONLY
+from app.services.embedding_store import get_embedding_store
+from app.services.embedding_sidecar import sidecar_client
+
+BACKEND_TORCH = "torch"
+BACKEND_ONNX_INT8 = "onnx-int8"
+
+# Only the main and entity models are swapped to ONNX; helper models stay on torch
+ONNX_ELIGIBLE_MODELS = {SENTENCE_TRANSFORMER_MODEL, SENTENCE_TRANSFORMER_ENTITY_MODEL}
+
+
+def _load_sentence_transformer(model_name: str, **kwargs) -> SentenceTransformer:
+    """
+    Load from the local Hugging Face cache, so a host that already has the
+    model never waits on (or fails against) the hub. Only an uncached model
+    is downloaded, and not at all with EMBEDDING_LOCAL_FILES_ONLY.
+    """
+    try:
+        return SentenceTransformer(model_name, local_files_only=True, **kwargs)
+    except OSError:
+        if EMBEDDING_LOCAL_FILES_ONLY:
+            raise
+        print(f"[Embeddings] {model_name} is not cached locally; downloading")
+        return SentenceTransformer(model_name, **kwargs)
+
+
+def _load_onnx_int8(model_name: str) -> SentenceTransformer:
+    """
+    Export `model_name` to ONNX once, quantize it to int8 (dynamic), cache it under
+    EMBEDDING_ONNX_DIR, and load it on the onnxruntime CPU provider.
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    local_dir = Path(EMBEDDING_ONNX_DIR) / re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_")
+    # avx2 quantizes to uint8 (model_quint8_avx2.onnx), the others to int8 (model_qint8_*.onnx)
+    pattern = f"model_q*int8_{EMBEDDING_ONNX_QUANTIZATION}.onnx"
+    quantized = sorted((local_dir / "onnx").glob(pattern))
+
+    if not quantized:
+        print(f"[Embeddings] Exporting {model_name} to int8 ONNX at {local_dir}")
+        exported = _load_sentence_transformer(model_name, backend="onnx", device="cpu")
+        exported.save_pretrained(str(local_dir))
+        export_dynamic_quantized_onnx_model(
+            exported,
+            quantization_config=EMBEDDING_ONNX_QUANTIZATION,
+            model_name_or_path=str(local_dir),
+        )
+        quantized = sorted((local_dir / "onnx").glob(pattern))
+
+    return SentenceTransformer(
+        str(local_dir),
+        backend="onnx",
+        device="cpu",
+        model_kwargs={"file_name": f"onnx/{quantized[0].name}", "provider": "CPUExecutionProvider"},
+    )
+
+
+def load_embedding_model(model_name: str, backend: str = BACKEND_TORCH) -> SentenceTransformer:
+    if backend == BACKEND_ONNX_INT8:
+        return _load_onnx_int8(model_name)
+    if backend != BACKEND_TORCH:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend!r}")
+    return _load_sentence_transformer(model_name)
+
+
+class EmbeddingRegistry:
+    """
+    One registry per process, keyed by model name.
+
+    Models are loaded lazily on first use and then shared by every caller,
+    so importing a module never pays for a model load and the same weights
+    are never resident twice.
+    """
+
+    def __init__(self, default_model: str | None = SENTENCE_TRANSFORMER_MODEL, backend: str = EMBEDDING_BACKEND):
+        self.default_model = default_model
+        self.backend = backend
+        self._models: Dict[str, SentenceTransformer] = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, model_name: str | None = None) -> SentenceTransformer:
+        model_name = model_name or self.default_model
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # Another thread may have finished loading while we waited
+            model = self._models.get(model_name)
+            if model is None:
+                backend = self.backend_for(model_name)
+                print(f"[Embeddings] Loading model: {model_name} ({backend})")
+                model = load_embedding_model(model_name, backend)
+                self._models[model_name] = model
+        return model
+
+    def backend_for(self, model_name: str | None = None) -> str:
+        model_name = model_name or self.default_model
+        if self.backend == BACKEND_ONNX_INT8 and model_name in ONNX_ELIGIBLE_MODELS:
+            return BACKEND_ONNX_INT8
+        return BACKEND_TORCH
+
+    def storage_key(self, model_name: str | None = None) -> str:
+        """
+        Name to key persisted vectors by. Quantized vectors are close to, but not
+        identical with, torch ones, so they live in their own store.
+        """
+        model_name = model_name or self.default_model
+        backend = self.backend_for(model_name)
+        return model_name if backend == BACKEND_TORCH else f"{model_name}@{backend}"
+
+    def encode(self, text: str, model_name: str | None = None, **kwargs):
+        """
+        Embed a single string. Returns whatever SentenceTransformer.encode
+        returns for a single input (ndarray by default, tensor with convert_to_tensor).
+        """
+        return self.get_model(model_name).encode(text, **kwargs)
+
+    def encode_batch(self, texts: Sequence[str], model_name: str | None = None, batch_size: int = 64, **kwargs):
+        """
+        Embed many strings in one forward pass per batch.
+        Returns one vector per input, in input order.
+        """
+        kwargs.setdefault("show_progress_bar", False)
+        return self.get_model(model_name).encode(list(texts), batch_size=batch_size, **kwargs)
+
+    def dimension(self, model_name: str | None = None) -> int:
+        return self.get_model(model_name).get_sentence_embedding_dimension()
+
+    def loaded_models(self) -> List[str]:
+        return list(self._models.keys())
+
+
+embedding_registry = EmbeddingRegistry()
+
+
+def embed_texts(texts: Sequence[str], model_name: str | None = None):
+    """
+    Embed a list of texts as float32 rows, via the shared sidecar when one is
+    configured and reachable, otherwise with the in-process registry.
+    """
+    model_name = model_name or embedding_registry.default_model
+    vectors = sidecar_client.encode_batch(texts, model_name)
+    if vectors is None:
+        vectors = embedding_registry.encode_batch(texts, model_name=model_name)
+    return vectors
+
+
+def embedding_dimension(model_name: str | None = None) -> int:
+    model_name = model_name or embedding_registry.default_model
+    dim = sidecar_client.dimension(model_name)
+    return dim if dim is not None else embedding_registry.dimension(model_name)
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching front door for single-string encodes.
+
+    Callers submit one text and get a Future back. A worker thread gathers
+    requests for up to `max_wait_ms` (or until `max_batch_size` are waiting),
+    runs one batched forward pass per model, and resolves each caller's Future.
+
+    Sync callers block on the Future; async callers await it, which also keeps
+    inference off the event loop thread.
+    """
+
+    def __init__(
+        self,
+        registry: EmbeddingRegistry,
+        max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+        max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS,
+    ):
+        self.registry = registry
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "batches": 0, "max_batch": 0}
+
+    def submit(self, text: str, model_name: str | None = None) -> Future:
+        self._ensure_worker()
+        fut: Future = Future()
+        self._queue.put((model_name or self.registry.default_model, text, fut))
+        return fut
+
+    def encode(self, text: str, model_name: str | None = None):
+        return self.submit(text, model_name=model_name).result()
+
+    async def encode_async(self, text: str, model_name: str | None = None):
+        return await asyncio.wrap_future(self.submit(text, model_name=model_name))
+
+    def encode_many(self, texts: Sequence[str], model_name: str | None = None) -> list:
+        """
+        Submit several texts at once and wait for all of them. They ride along
+        with whatever else is queued, so they usually land in a single batch.
+        """
+        futures = [self.submit(t, model_name=model_name) for t in texts]
+        return [f.result() for f in futures]
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        by_model: Dict[str, list] = {}
+        for model_name, text, fut in batch:
+            if fut.set_running_or_notify_cancel():
+                by_model.setdefault(model_name, []).append((text, fut))
+
+        for model_name, items in by_model.items():
+            texts = [text for text, _ in items]
+            try:
+                vectors = embed_texts(texts, model_name=model_name)
+            except Exception as e:
+                for _, fut in items:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), vector in zip(items, vectors):
+                fut.set_result(vector)
+
+            self.stats["requests"] += len(items)
+            self.stats["batches"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(items))
+
+
+embedding_batcher = EmbeddingBatcher(embedding_registry)
+
+
+def encode_stored(texts: Sequence[str], model_name: str | None = None) -> list:
+    """
+    Embed document texts, reusing vectors from the on-disk store and only
+    running the model for content it has never seen.
+    """
+    model_name = model_name or embedding_registry.default_model
+    store = get_embedding_store(embedding_registry.storage_key(model_name))
+    vectors = store.get_many(texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        fresh = embed_texts([texts[i] for i in missing], model_name=model_name)
+        store.put_many([texts[i] for i in missing], fresh)
+        for i, vector in zip(missing, fresh):
+            vectors[i] = vector
+    return vectors
+
+
+async def encode_stored_async(text: str, model_name: str | None = None):
+    """
+    Single-document variant of encode_stored that routes misses through the batcher.
+    """
+    return (await encode_stored_many_async([text], model_name=model_name))[0]
+
+
+async def encode_stored_many_async(texts: Sequence[str], model_name: str | None = None) -> list:
+    """
+    Async encode_stored for a page of documents. Misses are encoded off the
+    event loop: a lone miss joins the batcher, larger pages go straight to
+    embed_texts in a worker thread as one batch.
+    """
+    model_name = model_name or embedding_registry.default_model
+    store = get_embedding_store(embedding_registry.storage_key(model_name))
+    vectors = store.get_many(texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if not missing:
+        return vectors
+
+    missing_texts = [texts[i] for i in missing]
+    if len(missing_texts) == 1:
+        fresh = [await embedding_batcher.encode_async(missing_texts[0], model_name=model_name)]
+    else:
+        fresh = await asyncio.to_thread(embed_texts, missing_texts, model_name)
+    store.put_many(missing_texts, fresh)
+    for i, vector in zip(missing, fresh):
+        vectors[i] = vector
+    return vectors
+
+
+def get_embedding_model(model_name: str | None = None) -> SentenceTransformer:
+    return embedding_registry.get_model(model_name)
+
+
+def encode(text: str, model_name: str | None = None, **kwargs):
+    return embedding_registry.encode(text, model_name=model_name, **kwargs)
+
+
+def encode_batch(texts: Sequence[str], model_name: str | None = None, batch_size: int = 64, **kwargs):
+    return embedding_registry.encode_batch(texts, model_name=model_name, batch_size=batch_size, **kwargs)
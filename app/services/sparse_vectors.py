@@ -0,0 +1,72 @@
+# app/services/sparse_vectors.py
+"""
+BM25-style sparse vectors, computed locally so no extra model is needed.
+
+Documents get the BM25 term-frequency part of each term's weight
+(saturated by k1, normalized by length with b). The IDF part depends on
+the whole corpus, so Qdrant applies it server-side: the sparse vector is
+created with Modifier.IDF (see qdrant_connector.SPARSE_VECTOR_PARAMS).
+Queries are plain term sets with weight 1.
+
+Terms are hashed to stable 32-bit ids, so every process maps a term the
+same way without a shared vocabulary. Identifiers are kept whole and also
+split into their parts, so "get_message_by_id" and "MemoryMuse" match both
+exactly and by their words.
+"""
+import hashlib
+import re
+from collections import Counter
+from typing import Dict, List
+from qdrant_client.http import models as qmodels
+from app.config import SPARSE_BM25_K1, SPARSE_BM25_B, SPARSE_BM25_AVG_DOC_LEN
+
+SPARSE_VECTOR_NAME = "bm25"
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.\-]*[A-Za-z0-9_]|[A-Za-z0-9]")
+_PART_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+_STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just me more most my no nor not now of off on once only or other our ours out
+over own same she should so some such than that the their theirs them then there these they this those through
+to too under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms of `text`: whole identifiers plus their snake/camel/dotted parts.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text or ""):
+        lowered = token.lower()
+        parts = [p.lower() for p in _PART_RE.findall(token)]
+        if lowered not in _STOPWORDS and (len(parts) != 1 or len(lowered) > 1):
+            terms.append(lowered)
+        if len(parts) > 1:
+            terms.extend(p for p in parts if p not in _STOPWORDS and len(p) > 1)
+    return terms
+
+
+def term_id(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def _to_sparse(weights: Dict[int, float]) -> qmodels.SparseVector:
+    indices = sorted(weights)
+    return qmodels.SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+
+def encode_document(text: str) -> qmodels.SparseVector:
+    terms = tokenize(text)
+    length_norm = 1 - SPARSE_BM25_B + SPARSE_BM25_B * len(terms) / SPARSE_BM25_AVG_DOC_LEN
+    weights: Dict[int, float] = {}
+    for term, tf in Counter(terms).items():
+        tid = term_id(term)
+        # Two terms hashing to one id just add up, like a repeated term
+        weights[tid] = weights.get(tid, 0.0) + tf * (SPARSE_BM25_K1 + 1) / (tf + SPARSE_BM25_K1 * length_norm)
+    return _to_sparse(weights)
+
+
+def encode_query(text: str) -> qmodels.SparseVector:
+    return _to_sparse({term_id(term): 1.0 for term in set(tokenize(text))})
@@ -0,0 +1,54 @@
+"""
+bench_embedding_backends.py
+
+Latency and throughput of each embedding backend on this machine, so a
+deployment can pick EMBEDDING_BACKEND.
+Run with:  python bench_embedding_backends.py [model_name] [n_texts]
+"""
+import sys
+import time
+import statistics
+from app.config import SENTENCE_TRANSFORMER_MODEL
+from app.services.embeddings import load_embedding_model, BACKEND_TORCH, BACKEND_ONNX_INT8
+from bench_embeddings import make_corpus
+
+BATCH_SIZES = [1, 8, 32, 64]
+
+
+def bench_backend(model_name, backend, texts):
+    start = time.perf_counter()
+    model = load_embedding_model(model_name, backend)
+    load_s = time.perf_counter() - start
+    model.encode(texts[:8])  # warm up
+
+    # Single-text latency, as seen by a query
+    latencies = []
+    for text in texts[:200]:
+        t0 = time.perf_counter()
+        model.encode(text)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+
+    print(f"\n[{backend}] load {load_s:.1f}s  single-text p50 {p50:.2f}ms  p95 {p95:.2f}ms")
+
+    # Batch throughput, as seen by the indexer
+    for batch_size in BATCH_SIZES:
+        t0 = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+        elapsed = time.perf_counter() - t0
+        print(f"  batch {batch_size:>3}: {len(texts) / elapsed:9.1f} texts/s")
+
+
+def main():
+    model_name = sys.argv[1] if len(sys.argv) > 1 else SENTENCE_TRANSFORMER_MODEL
+    n_texts = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    texts = make_corpus(n_texts)
+    print(f"Model: {model_name}  texts={n_texts}")
+    for backend in (BACKEND_TORCH, BACKEND_ONNX_INT8):
+        bench_backend(model_name, backend, texts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+bench_embeddings.py
+
+Throughput of single-string encodes under concurrent load, with and without
+the micro-batching dispatcher.
+Run with:  python bench_embeddings.py [concurrency] [requests]
+"""
+import sys
+import time
+import asyncio
+from app.config import SENTENCE_TRANSFORMER_MODEL
+from app.services.embeddings import embedding_registry, embedding_batcher
+
+
+SAMPLE_TEXTS = [
+    "Can you remind me to take out the trash tomorrow at 8pm?",
+    "What did we decide about the Qdrant collection layout last week?",
+    "The journal entry about the thunderstorm was lovely.",
+    "Let's refactor the prompt builder so memory layers load lazily.",
+    "I think the reminder cron expression is off by an hour.",
+    "Summarize the thread about the Raspberry Pi speaker.",
+    "How is the discovery feed ranking articles right now?",
+    "Remember that my sister's birthday is in March.",
+]
+
+
+def make_corpus(n):
+    return [f"{SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} ({i})" for i in range(n)]
+
+
+async def run_direct(texts, concurrency):
+    # Each caller encodes its own string in a worker thread, like today
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with sem:
+            return await asyncio.to_thread(
+                embedding_registry.encode, text, SENTENCE_TRANSFORMER_MODEL
+            )
+
+    return await asyncio.gather(*(one(t) for t in texts))
+
+
+async def run_batched(texts, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with sem:
+            return await embedding_batcher.encode_async(text, model_name=SENTENCE_TRANSFORMER_MODEL)
+
+    return await asyncio.gather(*(one(t) for t in texts))
+
+
+def timed(label, coro_fn, texts, concurrency):
+    start = time.perf_counter()
+    asyncio.run(coro_fn(texts, concurrency))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(texts):>6} texts  {elapsed:8.3f}s  {len(texts) / elapsed:9.1f} texts/s")
+    return elapsed
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    n_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+
+    # Warm up so model load time doesn't skew the first run
+    embedding_registry.encode("warm up", model_name=SENTENCE_TRANSFORMER_MODEL)
+
+    texts = make_corpus(n_requests)
+    print(f"Model: {SENTENCE_TRANSFORMER_MODEL}  concurrency={concurrency}")
+    direct = timed("direct", run_direct, texts, concurrency)
+    batched = timed("batched", run_batched, texts, concurrency)
+
+    stats = embedding_batcher.stats
+    avg_batch = stats["requests"] / stats["batches"] if stats["batches"] else 0
+    print(f"Speedup: {direct / batched:.2f}x  (avg batch {avg_batch:.1f}, max batch {stats['max_batch']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+bench_qdrant_profiles.py
+
+Recall@k vs. latency for each Qdrant collection profile.
+Samples real vectors from the conversation collection (random unit vectors
+if it is empty), loads them into a scratch collection per profile, and
+compares approximate results against exact search.
+
+Run with:  python bench_qdrant_profiles.py [n_points] [n_queries] [k]
+Scratch collections (bench_profile_*) are deleted afterwards.
+"""
+import sys
+import time
+import statistics
+import numpy as np
+from qdrant_client.http import models as qmodels
+from app.config import QDRANT_CONVERSATION_COLLECTION
+from app.databases.qdrant_connector import qdrant, COLLECTION_PROFILES, BATCH_SIZE, ensure_qdrant_collection, \
+    drop_collection
+
+
+def sample_vectors(n_points):
+    vectors = []
+    offset = None
+    existing = {c.name for c in qdrant.get_collections().collections}
+    if QDRANT_CONVERSATION_COLLECTION in existing:
+        while len(vectors) < n_points:
+            points, offset = qdrant.scroll(
+                collection_name=QDRANT_CONVERSATION_COLLECTION,
+                limit=min(1000, n_points - len(vectors)),
+                offset=offset,
+                with_payload=False,
+                with_vectors=[""],
+            )
+            vectors.extend(p.vector[""] if isinstance(p.vector, dict) else p.vector for p in points)
+            if offset is None:
+                break
+    if not vectors:
+        print("Conversation collection empty; using random unit vectors (dim 384)")
+        rng = np.random.default_rng(0)
+        raw = rng.normal(size=(n_points, 384))
+        return raw / np.linalg.norm(raw, axis=1, keepdims=True)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def wait_for_indexing(collection_name, timeout=600):
+    start = time.time()
+    while time.time() - start < timeout:
+        info = qdrant.get_collection(collection_name)
+        if info.status == qmodels.CollectionStatus.GREEN:
+            return
+        time.sleep(1)
+
+
+def bench_profile(profile_name, vectors, queries, k):
+    collection_name = f"bench_profile_{profile_name}"
+    if collection_name in {c.name for c in qdrant.get_collections().collections}:
+        drop_collection(collection_name)
+    ensure_qdrant_collection(vectors.shape[1], collection_name, profile_name=profile_name)
+
+    for i in range(0, len(vectors), BATCH_SIZE):
+        batch = vectors[i:i + BATCH_SIZE]
+        qdrant.upsert(
+            collection_name=collection_name,
+            points=qmodels.Batch(ids=list(range(i, i + len(batch))), vectors=batch.tolist()),
+            wait=True,
+        )
+    wait_for_indexing(collection_name)
+
+    profile = COLLECTION_PROFILES[profile_name]
+    quantization = None
+    if profile["quantization"]:
+        quantization = qmodels.QuantizationSearchParams(rescore=True, oversampling=profile["oversampling"])
+    params = qmodels.SearchParams(hnsw_ef=profile["hnsw_ef"], quantization=quantization)
+
+    latencies, recalls = [], []
+    for q in queries:
+        exact = qdrant.query_points(
+            collection_name=collection_name, query=q.tolist(), limit=k,
+            search_params=qmodels.SearchParams(exact=True),
+        ).points
+        t0 = time.perf_counter()
+        approx = qdrant.query_points(
+            collection_name=collection_name, query=q.tolist(), limit=k, search_params=params,
+        ).points
+        latencies.append((time.perf_counter() - t0) * 1000)
+        truth = {p.id for p in exact}
+        recalls.append(len(truth & {p.id for p in approx}) / max(1, len(truth)))
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{profile_name:<15} recall@{k} {statistics.mean(recalls):.3f}  "
+        f"p50 {statistics.median(latencies):6.2f}ms  p95 {p95:6.2f}ms"
+    )
+    drop_collection(collection_name)
+
+
+def main():
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    vectors = sample_vectors(n_points)
+    rng = np.random.default_rng(1)
+    picks = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    # Perturb sampled points so queries are near, but not on, stored vectors
+    queries = picks + rng.normal(scale=0.05, size=picks.shape)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print(f"points={len(vectors)} dim={vectors.shape[1]} queries={len(queries)}")
+    for profile_name in COLLECTION_PROFILES:
+        bench_profile(profile_name, vectors, queries, k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+bench_rescoring.py
+
+Rescoring cost of search_indexed_memory's candidate set: the old per-hit
+dict + Python passes versus the columnar NumPy stage (app/core/rescoring.py).
+Also checks that both produce the same ranking.
+
+Run with:  python bench_rescoring.py [candidates ...]   (default: 500 5000)
+"""
+import sys
+import time
+import random
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from app.core.rescoring import rescore_hits
+
+PARAMS = dict(
+    projects_in_focus=["p1", "p2"], blend_ratio=0.5, thread_id="t3",
+    excluded_project_ids=["p9"], excluded_thread_ids=["t9"],
+    bias_source="discord", penalize_muse=True, recency_half_life=48,
+)
+TOP_K = 10
+REPEATS = 50
+
+
+def make_hits(n, now, seed=7):
+    rng = random.Random(seed)
+    hits = []
+    for i in range(n):
+        epoch = now - rng.uniform(0, 90 * 86400)
+        payload = {
+            "message_id": f"msg{i:06d}",
+            "timestamp": datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat(),
+            "timestamp_epoch": epoch,
+            "role": rng.choice(["user", "muse"]),
+            "source": rng.choice(["frontend", "discord", "chatgpt"]),
+            "message": "lorem ipsum " * 20,
+            "user_tags": ["x"] if rng.random() < 0.2 else [],
+            "remembered": rng.random() < 0.05,
+            "project_id": rng.choice([None, "p1", "p2", "p3"]),
+            "project_ids": rng.choice([None, [], ["p9"], ["p1", "p9"]]),
+            "thread_ids": rng.choice([[], ["t3"], ["t9"], ["t1", "t3"]]),
+        }
+        hits.append(SimpleNamespace(score=rng.uniform(0.2, 0.9), payload=payload))
+    return hits
+
+
+def legacy_rescore(hits, top_k, now, projects_in_focus, blend_ratio, thread_id, excluded_project_ids,
+                   excluded_thread_ids, bias_source, penalize_muse, recency_half_life,
+                   score_boost=0.1, source_boost=0.1, muse_penalty=0.05, tag_boost=1.2, muse_boost=1.15,
+                   remembered_boost=2.0, project_boost=1.25, non_project_penalty=0.2, thread_boost=1.25):
+    # The loop search_indexed_memory ran before the columnar stage, minus its prints
+    results = []
+    for hit in hits:
+        p = hit.payload
+        entry = {
+            "timestamp": p.get("timestamp"), "message_id": p.get("message_id"), "role": p.get("role"),
+            "source": p.get("source"), "message": p.get("message"), "metadata": p.get("metadata", {}),
+            "score": hit.score, "user_tags": p.get("user_tags"), "muse_tags": p.get("muse_tags"),
+            "remembered": p.get("remembered", False), "project_id": p.get("project_id"),
+            "project_ids": p.get("project_ids"), "thread_ids": p.get("thread_ids"),
+        }
+        if bias_source and entry.get("source") == bias_source:
+            entry["score"] += source_boost
+        if penalize_muse and entry.get("role") == "muse":
+            entry["score"] -= muse_penalty
+        ts = datetime.fromisoformat(entry["timestamp"]).timestamp()
+        entry["score"] *= 2 ** (-((now - ts) / 3600) / recency_half_life)
+        w = 1.0
+        if entry.get("user_tags"):
+            w *= tag_boost
+        if entry.get("muse_tags"):
+            w *= muse_boost
+        if entry.get("remembered"):
+            w *= remembered_boost
+        if entry.get("project_id"):
+            w *= project_boost
+        entry["score"] *= w
+        results.append(entry)
+    filtered = []
+    for e in results:
+        pids, tids = e.get("project_ids"), e.get("thread_ids")
+        if pids and all(pid in excluded_project_ids for pid in pids):
+            continue
+        if tids and all(tid in excluded_thread_ids for tid in tids):
+            continue
+        filtered.append(e)
+    for e in filtered:
+        if thread_id in (e.get("thread_ids") or []):
+            e["score"] *= thread_boost
+    for e in filtered:
+        in_focus = e.get("project_id") in projects_in_focus or any(
+            pid in projects_in_focus for pid in (e.get("project_ids") or []))
+        e["score"] *= (1 + blend_ratio * project_boost) if in_focus else (1 - blend_ratio * non_project_penalty)
+    return sorted(filtered, key=lambda x: x["score"], reverse=True)[:top_k]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        out = fn()
+    return (time.perf_counter() - start) / REPEATS * 1000, out
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [500, 5000]
+    now = time.time()
+    for n in sizes:
+        hits = make_hits(n, now)
+        legacy_ms, legacy = timed(lambda: legacy_rescore(hits, TOP_K, now, **PARAMS))
+        columnar_ms, columnar = timed(lambda: rescore_hits(hits, TOP_K, now=now, **PARAMS))
+        same = [e["message_id"] for e in legacy] == [e["message_id"] for e in columnar]
+        print(f"{n:>6} candidates: legacy {legacy_ms:7.2f} ms   columnar {columnar_ms:7.2f} ms   "
+              f"speedup {legacy_ms / columnar_ms:4.1f}x   same top-{TOP_K}: {same}")
@@ -0,0 +1,127 @@
+"""
+eval_hybrid_search.py
+
+Offline recall@k and latency for dense-only vs hybrid (dense + BM25, RRF)
+retrieval on the conversation collection.
+
+Without a query file, queries are generated from sampled messages and the
+message itself is the one relevant hit:
+  identifier  the message's identifier-like terms (snake_case, CamelCase,
+              dotted, with digits), else its two longest words
+  snippet     a random 8-word window of the message
+Labeled queries can be given instead as JSONL: {"query": ..., "message_ids": [...]}.
+
+Scores are Qdrant's raw ranking (no search_indexed_memory rescoring), at
+each mode's own overfetch: dense pulls k*5, hybrid k*HYBRID_OVERFETCH.
+
+Run with:
+    python eval_hybrid_search.py [--samples 200] [--k 10] [--mode identifier|snippet] [--queries FILE]
+"""
+import sys
+import json
+import time
+import random
+import statistics
+from app.config import MONGO_URI, MONGO_DB, MONGO_CONVERSATION_COLLECTION, QDRANT_CONVERSATION_COLLECTION, \
+    HYBRID_OVERFETCH
+from app.databases.connection_manager import connections
+from app.databases.qdrant_connector import search_collection, has_sparse_vectors, get_query_vector, collection_model
+from app.services.sparse_vectors import _TOKEN_RE, _PART_RE
+
+DENSE_OVERFETCH = 5
+QUERY_FILTER = {
+    "must_not": [
+        {"key": "is_hidden", "match": {"value": True}},
+        {"key": "is_deleted", "match": {"value": True}},
+    ]
+}
+
+
+def _arg(name, default):
+    return type(default)(sys.argv[sys.argv.index(name) + 1]) if name in sys.argv else default
+
+
+def identifier_query(text, rng):
+    tokens = _TOKEN_RE.findall(text)
+    identifiers = [t for t in tokens if len(_PART_RE.findall(t)) > 1 or any(c in t for c in "_.")]
+    if identifiers:
+        return " ".join(rng.sample(identifiers, min(2, len(identifiers))))
+    return " ".join(sorted(set(tokens), key=len, reverse=True)[:2])
+
+
+def snippet_query(text, rng):
+    words = text.split()
+    start = rng.randrange(max(1, len(words) - 8))
+    return " ".join(words[start:start + 8])
+
+
+def sample_queries(samples, mode, seed=13):
+    rng = random.Random(seed)
+    coll = connections.mongo(MONGO_URI)[MONGO_DB][MONGO_CONVERSATION_COLLECTION]
+    docs = coll.aggregate([
+        {"$match": {"is_hidden": {"$ne": True}, "is_deleted": {"$ne": True}, "message": {"$regex": r"\S{4,}.*\s.*\S{4,}"}}},
+        {"$sample": {"size": samples}},
+        {"$project": {"_id": 0, "message_id": 1, "message": 1}},
+    ])
+    make = identifier_query if mode == "identifier" else snippet_query
+    queries = []
+    for doc in docs:
+        query = make(doc["message"], rng)
+        if query.strip():
+            queries.append({"query": query, "message_ids": [doc["message_id"]]})
+    return queries
+
+
+def evaluate(queries, k, hybrid):
+    model_name = collection_model(QDRANT_CONVERSATION_COLLECTION)
+    limit = k * (HYBRID_OVERFETCH if hybrid else DENSE_OVERFETCH)
+    latencies, hits_at = [], {1: 0, 5: 0, k: 0}
+    for q in queries:
+        vector = get_query_vector(q["query"], model_name=model_name)  # cached; embedding cost excluded
+        start = time.perf_counter()
+        points = search_collection(
+            collection_name=QDRANT_CONVERSATION_COLLECTION,
+            search_query=q["query"],
+            query_vector=vector,
+            limit=limit,
+            query_filter=QUERY_FILTER,
+            hybrid=hybrid,
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        ranked = [p.payload.get("message_id") for p in points]
+        relevant = set(q["message_ids"])
+        for cutoff in hits_at:
+            if relevant & set(ranked[:cutoff]):
+                hits_at[cutoff] += 1
+    latencies.sort()
+    return {
+        **{f"recall@{cutoff}": hits / len(queries) for cutoff, hits in hits_at.items()},
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "candidates": limit,
+    }
+
+
+if __name__ == "__main__":
+    if not has_sparse_vectors(QDRANT_CONVERSATION_COLLECTION):
+        raise SystemExit(
+            f"{QDRANT_CONVERSATION_COLLECTION} has no BM25 sparse vector yet. Rebuild it with\n"
+            f"  python migrate_embedding_model.py start <current model>  (then backfill, flip)"
+        )
+    k = _arg("--k", 10)
+    if "--queries" in sys.argv:
+        with open(_arg("--queries", "")) as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = sample_queries(_arg("--samples", 200), _arg("--mode", "identifier"))
+    if not queries:
+        raise SystemExit("No queries to evaluate.")
+
+    for q in queries:  # warm the query-vector cache so both modes time search only
+        get_query_vector(q["query"], model_name=collection_model(QDRANT_CONVERSATION_COLLECTION))
+    print(f"{len(queries)} queries, k={k}")
+    for label, hybrid in (("dense", False), ("hybrid", True)):
+        r = evaluate(queries, k, hybrid)
+        recalls = "  ".join(f"{name} {r[name]:.3f}" for name in r if name.startswith("recall@"))
+        print(f"  {label:<7} {recalls}   p50 {r['p50_ms']:6.2f} ms   p95 {r['p95_ms']:6.2f} ms   "
+              f"({r['candidates']} candidates)")
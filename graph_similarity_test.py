@@ -1,9 +1,10 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-from pymongo import MongoClient
+from app.config import MONGO_URI
+from app.databases.connection_manager import connections
 
 # --- connect and load ---
-client = MongoClient("mongodb://localhost:27017/")
+client = connections.mongo(MONGO_URI)
 db = client["muse_memory"]
 collection = db["similarity_tests"]
 
@@ -1,11 +1,10 @@
-import pymongo
-from gqlalchemy import Memgraph
 import glob
 import json
 import os
+from app.config import MONGO_URI
+from app.databases.connection_manager import connections
 
 # ---- CONFIG ----
-MONGO_URI = "mongodb://localhost:27017"
 CORTEX_DB = "muse_memory"
 CORTEX_COLLECTION = "muse_cortex"
 MEMGRAPH_HOST = "localhost"
@@ -15,9 +14,9 @@
 LOG_DIRS = ["./logs/muse/", "./logs/chatgpt/"]
 
 # ---- CONNECT ----
-mongo_client = pymongo.MongoClient(MONGO_URI)
+mongo_client = connections.mongo(MONGO_URI)
 cortex_col = mongo_client[CORTEX_DB][CORTEX_COLLECTION]
-mg = Memgraph(MEMGRAPH_HOST, MEMGRAPH_PORT)
+mg = connections.memgraph(MEMGRAPH_HOST, MEMGRAPH_PORT)
 try:
     list(mg.execute_and_fetch("RETURN 1;"))
     print("Memgraph connection: OK")
@@ -0,0 +1,62 @@
+"""
+migrate_embedding_model.py
+
+Move the conversation collection to a new embedding model without taking
+recall down. See app/databases/model_migration.py for how it works.
+
+Run with:
+    python migrate_embedding_model.py start <model>       # new collection + dual-writes
+    python migrate_embedding_model.py backfill            # embed history (resumable)
+    python migrate_embedding_model.py flip [--drop-legacy] [--force]
+    python migrate_embedding_model.py rollback
+    python migrate_embedding_model.py finish [--drop-old]
+    python migrate_embedding_model.py abort
+    python migrate_embedding_model.py status
+
+After finish, set SENTENCE_TRANSFORMER_MODEL to the new model so the next
+migration starts from it.
+"""
+import sys
+import asyncio
+from app.databases import model_migration
+
+
+def main():
+    args = sys.argv[1:]
+    if not args:
+        raise SystemExit(__doc__)
+    command = args[0]
+
+    try:
+        if command == "start":
+            if len(args) < 2:
+                raise SystemExit("Usage: python migrate_embedding_model.py start <model>")
+            result = model_migration.start(args[1])
+            print(f"Created {result['new_collection']} for {result['new_model']}; new messages are dual-written.")
+            print("Next: python migrate_embedding_model.py backfill")
+        elif command == "backfill":
+            done = asyncio.run(model_migration.backfill())
+            print(f"Backfilled {done} messages. Next: python migrate_embedding_model.py flip")
+        elif command == "flip":
+            result = model_migration.flip(drop_legacy="--drop-legacy" in args, force="--force" in args)
+            print(f"Alias {result['_id']} now serves {result['new_collection']} ({result['new_model']}).")
+        elif command == "rollback":
+            result = model_migration.rollback()
+            print(f"Alias {result['_id']} is back on {result['old_collection']} ({result['old_model']}).")
+        elif command == "finish":
+            result = model_migration.finish(drop_old="--drop-old" in args)
+            print(f"Migration to {result['new_model']} finished; dual-writes stopped.")
+        elif command == "abort":
+            result = model_migration.abort()
+            print(f"Dropped {result['new_collection']}; {result['_id']} stays on {result['old_model']}.")
+        elif command == "status":
+            for key, value in model_migration.status().items():
+                print(f"{key}: {value}")
+        else:
+            raise SystemExit(f"Unknown command '{command}'.\n{__doc__}")
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
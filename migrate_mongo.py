@@ -1,11 +1,11 @@
-import pymongo
 import hashlib
 from datetime import datetime, timezone
 import time
 from app import config
+from app.databases.connection_manager import connections
 from app.services.openai_client import get_openai_autotags  # You may need to adjust the import
 
-MONGO_URI = "mongodb://localhost:27017/"
+MONGO_URI = config.MONGO_URI
 DB_NAME = "muse_memory"
 COLLECTION = "muse_conversations"
 OPENAI_MODEL = "gpt-4.1-mini"  # or whatever your nano model is
@@ -40,7 +40,7 @@ def get_autotags_via_openai(text):
         print(f"Auto-tagging failed: {e}")
         return []
 
-client = pymongo.MongoClient(MONGO_URI)
+client = connections.mongo(MONGO_URI)
 coll = client[DB_NAME][COLLECTION]
 
 #total = coll.count_documents({})
@@ -0,0 +1,57 @@
+"""
+migrate_qdrant_profiles.py
+
+Apply the configured storage/quantization profile to existing Qdrant collections.
+Qdrant rebuilds quantized vectors and moves storage in the background, so
+search keeps working while it runs.
+
+Run with:
+    python migrate_qdrant_profiles.py --dry-run
+    python migrate_qdrant_profiles.py [--profile scalar_ondisk] [collection ...]
+"""
+import sys
+from app.databases.qdrant_connector import qdrant, COLLECTION_PROFILE_ASSIGNMENTS, COLLECTION_PROFILES, \
+    get_collection_profile, apply_collection_profile
+
+
+def describe(collection_name):
+    info = qdrant.get_collection(collection_name)
+    params = info.config.params.vectors
+    hnsw = info.config.hnsw_config
+    quant = info.config.quantization_config
+    quant_name = type(quant).__name__ if quant else "none"
+    return (
+        f"points={info.points_count} on_disk={getattr(params, 'on_disk', None)} "
+        f"m={hnsw.m} ef_construct={hnsw.ef_construct} quantization={quant_name}"
+    )
+
+
+def main():
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    profile_name = None
+    if "--profile" in args:
+        profile_name = args[args.index("--profile") + 1]
+        if profile_name not in COLLECTION_PROFILES:
+            raise SystemExit(f"Unknown profile '{profile_name}'. Choose from: {', '.join(COLLECTION_PROFILES)}")
+    named = [a for a in args if not a.startswith("--") and a != profile_name]
+
+    existing = {c.name for c in qdrant.get_collections().collections}
+    targets = named or [c for c in COLLECTION_PROFILE_ASSIGNMENTS if c]
+
+    for collection_name in targets:
+        if collection_name not in existing:
+            print(f"[skip] {collection_name}: does not exist")
+            continue
+        wanted = profile_name or COLLECTION_PROFILE_ASSIGNMENTS.get(collection_name, "plain")
+        profile = get_collection_profile(collection_name, wanted)
+        print(f"[{collection_name}] current: {describe(collection_name)}")
+        print(f"[{collection_name}] target:  profile={wanted} {profile}")
+        if dry_run:
+            continue
+        apply_collection_profile(collection_name, wanted)
+        print(f"[{collection_name}] updated: {describe(collection_name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+migrate_qdrant_timestamps.py
+
+Normalize conversation point timestamps to an RFC 3339 UTC `timestamp`
+(datetime-indexed) plus a float `timestamp_epoch`, then provision the
+payload indexes. Older points carry whatever Mongo or the importer handed
+over (naive ISO strings, "Z" suffixes, epoch numbers), which a datetime
+index cannot range over reliably.
+
+Only payloads change; vectors are untouched and search keeps working.
+When it finishes, the collection is marked as backfilled, which lets
+search_indexed_memory rank in Qdrant with a formula query (QDRANT_FORMULA_SCORING);
+until then it rescores client-side, where string timestamps still decay.
+
+Run with:
+    python migrate_qdrant_timestamps.py --dry-run
+    python migrate_qdrant_timestamps.py [collection]
+"""
+import sys
+import time
+from qdrant_client.http import models as qmodels
+from app.config import QDRANT_CONVERSATION_COLLECTION
+from app.databases.qdrant_connector import qdrant, normalize_timestamp, ensure_payload_indexes, \
+    mark_timestamps_backfilled
+
+SCROLL_PAGE = 2000
+OPS_PER_REQUEST = 256
+
+
+def main():
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    named = [a for a in args if not a.startswith("--")]
+    collection_name = named[0] if named else QDRANT_CONVERSATION_COLLECTION
+
+    scanned = changed = unparseable = 0
+    pending = []
+    started = time.perf_counter()
+
+    def flush():
+        if pending and not dry_run:
+            qdrant.batch_update_points(collection_name=collection_name, update_operations=list(pending))
+        pending.clear()
+
+    offset = None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=collection_name,
+            limit=SCROLL_PAGE,
+            offset=offset,
+            with_payload=qmodels.PayloadSelectorInclude(include=["timestamp", "timestamp_epoch"]),
+            with_vectors=False,
+        )
+        for p in points:
+            scanned += 1
+            payload = p.payload or {}
+            timestamp, epoch = normalize_timestamp(payload.get("timestamp"))
+            if timestamp is None:
+                unparseable += 1
+                continue
+            if payload.get("timestamp") == timestamp and payload.get("timestamp_epoch") == epoch:
+                continue
+            changed += 1
+            pending.append(qmodels.SetPayloadOperation(set_payload=qmodels.SetPayload(
+                payload={"timestamp": timestamp, "timestamp_epoch": epoch}, points=[p.id]
+            )))
+            if len(pending) >= OPS_PER_REQUEST:
+                flush()
+        print(f"[{collection_name}] scanned {scanned}, to normalize {changed}, unparseable {unparseable}")
+        if offset is None:
+            break
+    flush()
+
+    elapsed = time.perf_counter() - started
+    verb = "would normalize" if dry_run else "normalized"
+    print(f"[{collection_name}] {verb} {changed}/{scanned} timestamps in {elapsed:.1f}s "
+          f"({unparseable} unparseable, left as-is)")
+
+    if dry_run:
+        return
+    created = ensure_payload_indexes(collection_name)
+    print(f"[{collection_name}] payload indexes created: {', '.join(created) or 'none (already present)'}")
+    mark_timestamps_backfilled(collection_name)
+    print(f"[{collection_name}] marked as backfilled; formula scoring can now be used")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,12 @@
 import os
-from pymongo import MongoClient
-from qdrant_client import QdrantClient
 from qdrant_client.http.models import PointIdsList
 from qdrant_client.http import models as qmodels
-from gqlalchemy import Memgraph
 import time
 from app.databases.qdrant_connector import message_id_to_uuid
+from app.config import MONGO_URI
+from app.databases.connection_manager import connections
 
 # --- CONFIG ---
-MONGO_URI = "mongodb://localhost:27017/"
 QDRANT_HOST = "localhost"
 QDRANT_PORT = 6333
 QDRANT_COLLECTION = "muse_memory"  # Adjust if needed
@@ -22,11 +20,11 @@
 FAILED_LOG = "failed_message_ids.txt"
 
 # --- CONNECTIONS ---
-mongo_client = MongoClient(MONGO_URI)
+mongo_client = connections.mongo(MONGO_URI)
 db = mongo_client[DB_NAME]
 collection = db[COLLECTION]
-qdrant = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
-memgraph = Memgraph(host=MEMGRAPH_HOST, port=MEMGRAPH_PORT)
+qdrant = connections.qdrant(QDRANT_HOST, QDRANT_PORT)
+memgraph = connections.memgraph(MEMGRAPH_HOST, MEMGRAPH_PORT)
 
 # --- STEP 1: FIND IS_DELETED MESSAGES ---
 deleted_msgs = list(collection.find({"is_deleted": True}))
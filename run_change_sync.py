@@ -0,0 +1,9 @@
+import asyncio
+from app.databases.change_sync import ChangeSyncDaemon
+
+if __name__ == "__main__":
+    # Needs MongoDB running as a replica set (a single node is fine), see README
+    try:
+        asyncio.run(ChangeSyncDaemon().run())
+    except KeyboardInterrupt:
+        print("[ChangeSync] Stopped.")
@@ -0,0 +1,27 @@
+import sys
+import json
+import asyncio
+from app.databases.consistency_audit import audit, repair, format_report
+
+if __name__ == "__main__":
+    # Dry run by default: prints the drift report only.
+    #   --repair        fix the drift in batches
+    #   --no-memgraph   audit Mongo <-> Qdrant only
+    #   --json PATH     also write the full report (with sample ids) to PATH
+    include_memgraph = "--no-memgraph" not in sys.argv
+    result = audit(include_memgraph=include_memgraph)
+    report = result["report"]
+    print(format_report(report))
+
+    if "--repair" in sys.argv:
+        memgraph_ok = include_memgraph and not (report.get("memgraph") or {}).get("error")
+        report["repaired"] = asyncio.run(repair(result["drift"], include_memgraph=memgraph_ok))
+        print(f"Repaired: {report['repaired']}")
+    else:
+        print("Dry run; pass --repair to fix.")
+
+    if "--json" in sys.argv:
+        path = sys.argv[sys.argv.index("--json") + 1]
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {path}")
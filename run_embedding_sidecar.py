@@ -0,0 +1,11 @@
+import asyncio
+from app.config import SENTENCE_TRANSFORMER_MODEL, SENTENCE_TRANSFORMER_ENTITY_MODEL
+from app.services.embedding_sidecar import serve
+
+if __name__ == "__main__":
+    # Load the models up front so the first request from each process is fast
+    preload = [m for m in {SENTENCE_TRANSFORMER_MODEL, SENTENCE_TRANSFORMER_ENTITY_MODEL} if m]
+    try:
+        asyncio.run(serve(preload=preload))
+    except KeyboardInterrupt:
+        print("[EmbeddingSidecar] Stopped.")
@@ -1,5 +1,7 @@
+import sys
 import asyncio
 from app.databases.memory_indexer import build_index
 
 if __name__ == "__main__":
-    asyncio.run(build_index(dryrun=False))
\ No newline at end of file
+    # --all: re-upsert every message; vectors come from the embedding store where possible
+    asyncio.run(build_index(dryrun=False, reindex_all="--all" in sys.argv))
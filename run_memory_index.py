@@ -1,5 +1,7 @@
+import sys
 import asyncio
 from app.databases.memory_indexer import build_memory_index
 
 if __name__ == "__main__":
-    asyncio.run(build_memory_index(dryrun=False))
\ No newline at end of file
+    # --all: re-upsert every memory entry; vectors come from the embedding store where possible
+    asyncio.run(build_memory_index(dryrun=False, reindex_all="--all" in sys.argv))
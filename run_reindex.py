@@ -0,0 +1,65 @@
+"""
+run_reindex.py
+
+Full, parallel re-index of conversations and memory entries into Qdrant.
+Runs are checkpointed in Mongo, so an interrupted run picks up where it
+stopped.
+
+Run with:
+    python run_reindex.py [--target conversations|memory] [--workers 4] [--partitions 16]
+                          [--page-size 128] [--max-docs-per-sec 200] [--dry-run]
+    python run_reindex.py --resume [RUN_ID] [--workers 4] [--max-docs-per-sec 200]
+    python run_reindex.py --status [RUN_ID]
+"""
+import sys
+from app.databases.reindex import TARGETS, plan_run, run_reindex, run_status, latest_unfinished_run
+
+
+def option(args, name, default, cast=str):
+    if name not in args:
+        return default
+    return cast(args[args.index(name) + 1])
+
+
+def positional_after(args, name):
+    i = args.index(name)
+    return args[i + 1] if i + 1 < len(args) and not args[i + 1].startswith("--") else None
+
+
+def main():
+    args = sys.argv[1:]
+    workers = option(args, "--workers", 2, int)
+    rate = option(args, "--max-docs-per-sec", None, float)
+
+    if "--status" in args:
+        run_id = positional_after(args, "--status") or latest_unfinished_run()
+        if not run_id:
+            raise SystemExit("No unfinished reindex run.")
+        print(run_status(run_id))
+        return
+
+    if "--resume" in args:
+        run_id = positional_after(args, "--resume") or latest_unfinished_run()
+        if not run_id:
+            raise SystemExit("No unfinished reindex run to resume.")
+    else:
+        target = option(args, "--target", None)
+        if target is not None and target not in TARGETS:
+            raise SystemExit(f"Unknown target '{target}'. Choose from: {', '.join(TARGETS)}")
+        run_id = plan_run(
+            targets=[target] if target else TARGETS,
+            partitions=option(args, "--partitions", 16, int),
+            page_size=option(args, "--page-size", 128, int),
+            max_docs_per_sec=rate or 0,
+            dryrun="--dry-run" in args,
+        )
+        print(f"[Reindex] Planned {run_id}: {run_status(run_id)}")
+
+    summary = run_reindex(run_id, workers=workers, max_docs_per_sec=rate)
+    print(f"[Reindex] Finished: {summary}")
+    if summary["failures"]:
+        print(f"[Reindex] Resume with: python run_reindex.py --resume {run_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+test_durable_queue.py
+
+DurableJobQueue against an in-memory Mongo (mongomock), no services needed:
+  - POST /api/messages/purge answers with JSON-safe job ids
+  - a job whose lease runs out on its last attempt is dead-lettered, not re-claimed
+  - a failed write-behind index batch goes back on the queue job by job
+Run with:  python -m pytest -q test_durable_queue.py  (skipped unless mongomock is installed)
+"""
+import asyncio
+import os
+import time
+from unittest import mock
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+for name, value in {
+    "MONGO_DB": "muse_memory",
+    "MONGO_SYSTEM_DB": "muse_system",
+    "MONGO_CONVERSATION_COLLECTION": "muse_conversations",
+    "MONGO_USER_SETTINGS_COLLECTION": "user_settings",
+    "MONGO_LOGS_COLLECTION": "muse_logs",
+    "ADMIN_MONGO_DB": "admin_db",
+    "ADMIN_MONGO_COLLECTION": "admin",
+    "OPENAI_API_KEY": "unused",
+}.items():
+    os.environ.setdefault(name, value)
+
+_mongo = mongomock.MongoClient()
+with mock.patch("app.databases.connection_manager.MongoClient", return_value=_mongo):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api.routers import messages_api
+    from app.api.queues import purge_queue
+    from app.databases import memory_indexer
+    from app.databases.job_queue import DurableJobQueue, jobs_collection, STATUS_DEAD, STATUS_DONE, STATUS_PENDING
+    from app.config import admin_config
+
+# write_system_log needs a verbosity setting to compare against
+admin_config.set("controls", "LOG_VERBOSITY", "debug")
+
+
+def test_purge_endpoint_returns_job_ids():
+    app = FastAPI()
+    app.include_router(messages_api.router)
+    response = TestClient(app).post("/api/messages/purge", json={"message_ids": ["purge-a", "purge-a", "purge-b"]})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    job_ids = [r["purge_job"] for r in results]
+    assert all(isinstance(job_id, str) for job_id in job_ids)
+    # The repeated id collapses into the job already pending
+    assert job_ids[0] == job_ids[1] != job_ids[2]
+    assert purge_queue.job_status(job_ids[0])["status"] == STATUS_PENDING
+
+
+def test_expired_lease_on_last_attempt_is_dead_lettered():
+    queue = DurableJobQueue(f"test_leases_{time.time_ns()}", lease_seconds=0, max_attempts=2)
+    job_id = queue.put_nowait({"task": "crashes its worker"})
+
+    # Each claim's worker "dies": the zero-length lease expires without ack or fail
+    assert queue.claim().attempts == 1
+    time.sleep(0.01)
+    assert queue.claim().attempts == 2
+    time.sleep(0.01)
+    assert queue.claim() is None
+
+    status = queue.job_status(job_id)
+    assert status["status"] == STATUS_DEAD
+    assert status["attempts"] == 2
+    assert queue.stats()["counters"]["dead"] == 1
+
+
+def test_write_behind_retries_failed_batch_job_by_job():
+    calls = []
+
+    async def flaky_build_index(message_id=None, message_ids=None):
+        calls.append(message_ids or [message_id])
+        if message_ids or message_id == "bad":
+            raise RuntimeError("qdrant unavailable")
+
+    async def scenario():
+        queue = DurableJobQueue(f"test_index_{time.time_ns()}", backoff_base_seconds=60)
+        write_behind = memory_indexer.IndexWriteBehind(queue, max_wait_ms=20)
+        write_behind.enqueue("good")
+        write_behind.enqueue("bad")
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if write_behind.stats["indexed"] + write_behind.stats["failed"] == 2:
+                break
+        write_behind._task.cancel()
+        return queue, write_behind
+
+    with mock.patch.object(memory_indexer, "build_index", flaky_build_index):
+        queue, write_behind = asyncio.run(scenario())
+
+    assert calls == [["good", "bad"], ["good"], ["bad"]]
+    assert write_behind.stats["indexed"] == 1 and write_behind.stats["failed"] == 1
+    # The failed id waits for its retry instead of being dropped
+    jobs = {doc["payload"]: doc for doc in jobs_collection().find({"queue": queue.name})}
+    assert jobs["good"]["status"] == STATUS_DONE
+    assert jobs["bad"]["status"] == STATUS_PENDING
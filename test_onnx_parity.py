@@ -0,0 +1,86 @@
+"""
+test_onnx_parity.py
+
+Parity check between the torch and int8 ONNX embedding backends.
+Encodes a fixed corpus with both and compares cosine similarity per text,
+plus whether nearest-neighbour rankings agree.
+Run with:  python test_onnx_parity.py [model_name]
+Exits non-zero if agreement falls below the thresholds.
+"""
+import sys
+import numpy as np
+from app.config import SENTENCE_TRANSFORMER_MODEL
+from app.services.embeddings import load_embedding_model, BACKEND_TORCH, BACKEND_ONNX_INT8
+
+MIN_COSINE = 0.98       # worst single text
+MIN_MEAN_COSINE = 0.995
+MIN_TOP1_AGREEMENT = 0.95
+
+
+def get_corpus():
+    """
+    Fixed corpus: chat turns, code, tags, and short identifiers, since those
+    are what we actually embed.
+    """
+    return [
+        "Hey Iris, can you remind me to take out the trash tomorrow at 8pm?",
+        "What did we decide about the Qdrant collection layout last week?",
+        "The thunderstorm last night was incredible, the whole sky lit up.",
+        "def build_index(dryrun=False, message_id=None):",
+        "Let's refactor the prompt builder so memory layers load lazily.",
+        "I think the reminder cron expression is off by an hour.",
+        "Summarize the thread about the Raspberry Pi smart speaker.",
+        "How is the discovery feed ranking articles right now?",
+        "Remember that my sister's birthday is in March.",
+        "MemoryMuse",
+        "search_indexed_memory",
+        "project: gpt-echo",
+        "I'm feeling a bit tired today, long week at work.",
+        "Can you explain how reciprocal rank fusion works?",
+        "The journal entry about the ocean was lovely.",
+        "Mnemosyne extracted three new entities from that conversation.",
+        "Time skip: pick up where we left off yesterday morning.",
+        "Write a haiku about autumn leaves and old code.",
+        "Why does the Discord client reconnect every hour?",
+        "Set the TTS voice back to the default ElevenLabs voice.",
+    ]
+
+
+def normalize(m):
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+def main():
+    model_name = sys.argv[1] if len(sys.argv) > 1 else SENTENCE_TRANSFORMER_MODEL
+    corpus = get_corpus()
+
+    torch_vecs = normalize(np.asarray(load_embedding_model(model_name, BACKEND_TORCH).encode(corpus)))
+    onnx_vecs = normalize(np.asarray(load_embedding_model(model_name, BACKEND_ONNX_INT8).encode(corpus)))
+
+    cosines = np.sum(torch_vecs * onnx_vecs, axis=1)
+
+    # Nearest neighbour of each text within the corpus, excluding itself
+    torch_sim = torch_vecs @ torch_vecs.T
+    onnx_sim = onnx_vecs @ onnx_vecs.T
+    np.fill_diagonal(torch_sim, -np.inf)
+    np.fill_diagonal(onnx_sim, -np.inf)
+    top1_agreement = float(np.mean(torch_sim.argmax(axis=1) == onnx_sim.argmax(axis=1)))
+
+    print(f"Model: {model_name}")
+    for text, cos in sorted(zip(corpus, cosines), key=lambda x: x[1])[:5]:
+        print(f"  {cos:.4f}  {text[:60]}")
+    print(f"min cosine:      {cosines.min():.4f}  (>= {MIN_COSINE})")
+    print(f"mean cosine:     {cosines.mean():.4f}  (>= {MIN_MEAN_COSINE})")
+    print(f"top-1 agreement: {top1_agreement:.2%}  (>= {MIN_TOP1_AGREEMENT:.0%})")
+
+    ok = (
+        cosines.min() >= MIN_COSINE
+        and cosines.mean() >= MIN_MEAN_COSINE
+        and top1_agreement >= MIN_TOP1_AGREEMENT
+    )
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
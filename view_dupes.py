@@ -1,12 +1,12 @@
-from pymongo import MongoClient
+from app.config import MONGO_URI
+from app.databases.connection_manager import connections
 
 # Config
-MONGO_URI = "mongodb://localhost:27017/"
 DB_NAME = "muse_memory"
 COLLECTION_NAME = "muse_conversations"
 PAIR_LIST_FILE = "dupe_pairs.txt"  # Your export (from the previous script)
 
-client = MongoClient(MONGO_URI)
+client = connections.mongo(MONGO_URI)
 collection = client[DB_NAME][COLLECTION_NAME]
 
 def parse_pair_line(line):